@@ -28,6 +28,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'library.middleware.HealthCheckMiddleware',  # /healthz and /readyz, must stay first
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For serving static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -114,6 +115,50 @@ else:
         }
     }
 
+# Health checks (/healthz, /readyz)
+HEALTHCHECK_TIMEOUT_MS = config('HEALTHCHECK_TIMEOUT_MS', default=2000, cast=int)
+HEALTHCHECK_CACHE_SECONDS = config('HEALTHCHECK_CACHE_SECONDS', default=5, cast=int)
+
+# Caches. 'search' holds book_list result-id lists (library.searchcache) and evicts
+# least recently used entries past SEARCH_CACHE_ENTRIES. It is per worker by default;
+# point SEARCH_CACHE_BACKEND/LOCATION at a shared server (e.g. Redis with an LRU
+# maxmemory-policy) to share results between workers.
+SEARCH_CACHE_ENTRIES = config('SEARCH_CACHE_ENTRIES', default=5000, cast=int)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': config('SEARCH_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('SEARCH_CACHE_LOCATION', default='search-results'),
+        # LocMemCache culls 1/CULL_FREQUENCY of its entries, least recently used first
+        'OPTIONS': {'MAX_ENTRIES': SEARCH_CACHE_ENTRIES, 'CULL_FREQUENCY': 20},
+    },
+}
+SEARCH_CACHE_SECONDS = config('SEARCH_CACHE_SECONDS', default=600, cast=int)
+# Longer result lists keep only their head; pages past it are read from the database
+SEARCH_CACHE_MAX_IDS = config('SEARCH_CACHE_MAX_IDS', default=2000, cast=int)
+
+# Typeahead suggestions (/suggest): per-worker in-memory prefix index
+SUGGEST_MAX_ENTRIES = config('SUGGEST_MAX_ENTRIES', default=2_000_000, cast=int)
+SUGGEST_KEY_LENGTH = config('SUGGEST_KEY_LENGTH', default=80, cast=int)
+SUGGEST_REFRESH_SECONDS = config('SUGGEST_REFRESH_SECONDS', default=5, cast=int)
+SUGGEST_REBUILD_SECONDS = config('SUGGEST_REBUILD_SECONDS', default=3600, cast=int)
+# Full builds on a background thread; off makes the request that finds the index due build it
+SUGGEST_BACKGROUND_BUILD = config('SUGGEST_BACKGROUND_BUILD', default=True, cast=bool)
+
+# "Readers also borrowed" (library.recommendations)
+RECOMMENDATION_NEIGHBOURS = config('RECOMMENDATION_NEIGHBOURS', default=12, cast=int)
+RECOMMENDATION_CACHE_SECONDS = config('RECOMMENDATION_CACHE_SECONDS', default=600, cast=int)
+
+# Returned loans older than this move from BorrowRecord to BorrowArchive (manage.py archive_borrows)
+BORROW_ARCHIVE_AFTER_DAYS = config('BORROW_ARCHIVE_AFTER_DAYS', default=180, cast=int)
+
+# Circulation events (library.events) are buffered per process and written with one
+# bulk INSERT every CIRCULATION_EVENT_BATCH_SIZE events or CIRCULATION_EVENT_FLUSH_MS
+CIRCULATION_EVENT_BATCH_SIZE = config('CIRCULATION_EVENT_BATCH_SIZE', default=200, cast=int)
+CIRCULATION_EVENT_FLUSH_MS = config('CIRCULATION_EVENT_FLUSH_MS', default=1000, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -145,6 +190,38 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized WebP/JPEG variants generated for cover images and profile pictures
+IMAGE_VARIANT_WIDTHS = [160, 320, 640]
+IMAGE_VARIANT_QUALITY = 80
+
+# Uploads always stream to a temp file; bytes past max_bytes are discarded and
+# images over max_pixels are rejected from their header before any decode
+FILE_UPLOAD_HANDLERS = ['library.uploads.BoundedTemporaryFileUploadHandler']
+UPLOAD_LIMITS = {
+    'default': {'max_bytes': 5 * 1024 * 1024, 'max_pixels': 25_000_000},
+    'cover_image': {'max_bytes': 5 * 1024 * 1024, 'max_pixels': 25_000_000},
+    'profile_picture': {'max_bytes': 2 * 1024 * 1024, 'max_pixels': 16_000_000},
+}
+
+# Email (due-date reminders and overdue notices)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='library@localhost')
+LOAN_REMINDER_DAYS = 2
+# Days a returned copy is kept for the next holder before passing down the queue
+HOLD_PICKUP_DAYS = config('HOLD_PICKUP_DAYS', default=3, cast=int)
+
+# Tables above this many rows report planner estimates instead of COUNT(*) (PostgreSQL only)
+ESTIMATED_COUNT_THRESHOLD = 50_000
+
+# Background jobs (manage.py run_worker)
+JOB_RETENTION_DAYS = 7
+JOB_STALE_AFTER_SECONDS = 600
+
 # WhiteNoise configuration for static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
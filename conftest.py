@@ -8,4 +8,17 @@ from django.conf import settings
 @pytest.fixture(scope='session', autouse=True)
 def disable_password_validators():
     """Disable password validators for testing"""
-    settings.AUTH_PASSWORD_VALIDATORS = []
\ No newline at end of file
+    settings.AUTH_PASSWORD_VALIDATORS = []
+
+
+@pytest.fixture(scope='session', autouse=True)
+def build_suggestions_inline():
+    """A build thread has its own connection and can't see a test's uncommitted rows"""
+    settings.SUGGEST_BACKGROUND_BUILD = False
+
+
+@pytest.fixture(autouse=True)
+def clear_search_cache():
+    """Cached search results are keyed on CatalogChange ids, which restart when a test rolls back"""
+    from django.core.cache import caches
+    caches['search'].clear()
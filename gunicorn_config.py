@@ -31,3 +31,15 @@ tmp_upload_dir = None
 # SSL (if needed)
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
+
+
+def post_worker_init(worker):
+    """Start this worker's suggestion index build before it takes requests"""
+    from library.suggest import suggester
+    suggester.refresh()
+
+
+def worker_exit(server, worker):
+    """Write circulation events still buffered in this worker before it exits"""
+    from library.events import buffer
+    buffer.flush()
@@ -1,42 +1,239 @@
 """
 Admin configuration for Library Management System
 """
-from django.contrib import admin
-from .models import Author, Category, Book, BorrowRecord, UserProfile
+import time
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import models
+from django.db.models import Count
+from django.urls import reverse
+from .forms import BoundedImageField
+from . import circulation, events
+from .models import (
+    Author, Category, Book, BorrowArchive, BorrowRecord, CirculationEvent, Hold, UserProfile, Job,
+)
+from .pagination import EstimatedCountPaginator
+
+# Admin uploads go through the same byte/pixel limits as the public forms
+bounded_image_overrides = {models.ImageField: {'form_class': BoundedImageField}}
+
+
+class AutocompleteListFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter for a foreign key that renders only the selected value;
+    other values are searched through the JSON autocomplete endpoint.
+    """
+    template = 'admin/library/autocomplete_filter.html'
+    related_model = None
+    autocomplete_url_name = None
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if value and value.isdigit():
+            obj = self.related_model.objects.filter(pk=value).first()
+            if obj is not None:
+                return [(value, str(obj))]
+        return []
+
+    def has_output(self):
+        # lookups() is empty until a value is picked; the autocomplete box must still render
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{f'{self.parameter_name}_id': value})
+        return queryset
+
+    def choices(self, changelist):
+        yield from super().choices(changelist)
+        yield {
+            'autocomplete_url': reverse(self.autocomplete_url_name),
+            'url_template': changelist.get_query_string({self.parameter_name: '__value__'}),
+        }
+
+
+class AuthorFilter(AutocompleteListFilter):
+    title = 'author'
+    parameter_name = 'author'
+    related_model = Author
+    autocomplete_url_name = 'autocomplete_authors'
+
+
+class BookFilter(AutocompleteListFilter):
+    title = 'book'
+    parameter_name = 'book'
+    related_model = Book
+    autocomplete_url_name = 'autocomplete_books'
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for big tables: planner-estimated totals instead of
+    COUNT(*), no second "full result" count, and deferred-join paging
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BookCountMixin:
+    """Annotate the book count in the changelist query instead of one COUNT per row"""
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(book_count=Count('books', distinct=True))
+
+    @admin.display(description='Books', ordering='book_count')
+    def book_count(self, obj):
+        return obj.book_count
+
+
+class TimedActionsMixin:
+    """Report rows affected and elapsed time for set-based admin actions"""
+    def run_timed(self, request, fn, describe):
+        started = time.monotonic()
+        result = fn()
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.message_user(request, f'{describe(result)} in {elapsed_ms:.0f} ms.', messages.SUCCESS)
+        return result
+
+
+class BookActionForm(ActionForm):
+    """Extra inputs shown next to the Book action dropdown"""
+    copies_delta = forms.IntegerField(required=False, label='Copies +/-')
+    category = forms.ModelChoiceField(Category.objects.all(), required=False)
 
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
-    list_display = ['name', 'nationality', 'birth_date', 'get_book_count', 'created_at']
+class AuthorAdmin(BookCountMixin, LargeTableAdmin):
+    list_display = ['name', 'nationality', 'birth_date', 'book_count', 'created_at']
     search_fields = ['name', 'nationality']
     list_filter = ['nationality', 'created_at']
     date_hierarchy = 'created_at'
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'get_book_count', 'created_at']
+class CategoryAdmin(BookCountMixin, admin.ModelAdmin):
+    list_display = ['name', 'book_count', 'created_at']
     search_fields = ['name']
     list_filter = ['created_at']
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(TimedActionsMixin, LargeTableAdmin):
     list_display = ['title', 'author', 'isbn', 'available_copies', 'total_copies', 'publication_date', 'is_available']
+    list_select_related = ['author']
     search_fields = ['title', 'isbn', 'author__name']
-    list_filter = ['categories', 'author', 'publication_date', 'created_at']
-    filter_horizontal = ['categories']
+    list_filter = ['categories', AuthorFilter, 'publication_date', 'created_at']
+    autocomplete_fields = ['author', 'categories']
     date_hierarchy = 'created_at'
     readonly_fields = ['created_at', 'updated_at']
+    formfield_overrides = bounded_image_overrides
+    action_form = BookActionForm
+    actions = ['adjust_copies', 'add_category', 'replace_categories']
+
+    @admin.action(description='Adjust total and available copies by "Copies +/-"')
+    def adjust_copies(self, request, queryset):
+        delta = request.POST.get('copies_delta', '').strip()
+        if not delta.lstrip('-').isdigit() or int(delta) == 0:
+            self.message_user(request, 'Enter a non-zero whole number in "Copies +/-".', messages.ERROR)
+            return
+        self.run_timed(
+            request, lambda: circulation.adjust_copies(queryset, int(delta), actor=request.user),
+            lambda result: f'Adjusted copies on {result[0]} books ({result[1]} skipped: not enough available copies)',
+        )
+
+    def _category_from_post(self, request):
+        category = Category.objects.filter(pk=request.POST.get('category') or None).first()
+        if category is None:
+            self.message_user(request, 'Choose a category first.', messages.ERROR)
+        return category
+
+    @admin.action(description='Add the chosen category')
+    def add_category(self, request, queryset):
+        category = self._category_from_post(request)
+        if category is not None:
+            self.run_timed(
+                request, lambda: circulation.set_category(queryset, category),
+                lambda count: f'Added "{category}" to {count} books',
+            )
+
+    @admin.action(description='Replace categories with the chosen category')
+    def replace_categories(self, request, queryset):
+        category = self._category_from_post(request)
+        if category is not None:
+            self.run_timed(
+                request, lambda: circulation.set_category(queryset, category, replace=True),
+                lambda count: f'Set category of {count} books to "{category}"',
+            )
 
 
 @admin.register(BorrowRecord)
-class BorrowRecordAdmin(admin.ModelAdmin):
+class BorrowRecordAdmin(TimedActionsMixin, LargeTableAdmin):
     list_display = ['user', 'book', 'borrow_date', 'due_date', 'return_date', 'status', 'is_overdue']
+    list_select_related = ['user', 'book', 'book__author']
     search_fields = ['user__username', 'book__title']
-    list_filter = ['status', 'borrow_date', 'due_date']
-    date_hierarchy = 'borrow_date'
+    list_filter = ['status', BookFilter, 'borrow_date', 'due_date']
+    autocomplete_fields = ['user', 'book']
     readonly_fields = ['borrow_date']
+    actions = ['mark_returned', 'mark_overdue']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            events.record(CirculationEvent.LOAN_EDITED, [(obj.book_id, obj.user_id, obj.pk)], request.user)
+
+    @admin.action(description='Mark selected loans returned')
+    def mark_returned(self, request, queryset):
+        self.run_timed(
+            request, lambda: circulation.return_loans(queryset, actor=request.user),
+            lambda result: f'Returned {result[0]} loans and restocked {result[1]} books',
+        )
+
+    @admin.action(description='Mark selected past-due loans overdue')
+    def mark_overdue(self, request, queryset):
+        self.run_timed(
+            request, lambda: circulation.mark_overdue(queryset, actor=request.user),
+            lambda count: f'Marked {count} loans overdue',
+        )
+
+
+@admin.register(Hold)
+class HoldAdmin(LargeTableAdmin):
+    list_display = ['id', 'user', 'book', 'status', 'created_at', 'expires_at', 'notified_at']
+    list_select_related = ['user', 'book']
+    search_fields = ['user__username', 'book__title']
+    list_filter = ['status', BookFilter]
+    autocomplete_fields = ['user', 'book']
+    readonly_fields = ['ready_at', 'expires_at', 'notified_at']
+
+
+@admin.register(BorrowArchive)
+class BorrowArchiveAdmin(LargeTableAdmin):
+    """Read-only: rows are written by manage.py archive_borrows"""
+    list_display = ['id', 'user', 'book', 'borrow_date', 'return_date', 'archived_at']
+    list_select_related = ['user', 'book']
+    search_fields = ['user__username', 'book__title']
+    list_filter = [BookFilter, 'borrow_date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CirculationEvent)
+class CirculationEventAdmin(LargeTableAdmin):
+    """Read-only: rows are written by library.events"""
+    list_display = ['id', 'occurred_at', 'kind', 'book_id', 'user_id', 'loan_id', 'actor_id', 'delta']
+    list_filter = ['kind', 'occurred_at']
+    search_fields = ['=book_id', '=user_id', '=loan_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(UserProfile)
@@ -44,3 +241,12 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone_number', 'created_at']
     search_fields = ['user__username', 'phone_number']
     list_filter = ['created_at']
+    formfield_overrides = bounded_image_overrides
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'started_at', 'finished_at', 'locked_by']
+    search_fields = ['name']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'locked_by', 'last_error']
@@ -0,0 +1,82 @@
+"""
+Loan history archival for Library Management System
+Returned loans older than BORROW_ARCHIVE_AFTER_DAYS move from BorrowRecord to
+BorrowArchive in batches (copy and delete in one transaction per batch), so
+the hot table holds active loans plus recent returns. Archived loans are
+counted onto UserProfile.archived_loans as they move.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Value, When
+from django.utils import timezone
+
+from .models import BorrowArchive, BorrowRecord, StatsCursor, UserProfile
+from .recommendations import RECOMMENDATION_CURSOR
+from .stats import ROLLUP_CURSOR
+
+ARCHIVE_BATCH_SIZE = 2000
+# Incremental jobs read new loans past these high-water marks on BorrowRecord;
+# a loan is only archived once every one of them has seen it
+FOLDED_CURSORS = (ROLLUP_CURSOR, RECOMMENDATION_CURSOR)
+
+
+def archive_ceiling():
+    """Highest loan id every incremental job has folded (0 until they have all run)"""
+    marks = StatsCursor.objects.filter(name__in=FOLDED_CURSORS).aggregate(lowest=Min('last_id'), n=Count('pk'))
+    return marks['lowest'] if marks['n'] == len(FOLDED_CURSORS) else 0
+
+
+def archivable(before=None):
+    """Returned loans old enough to archive, up to the folded ceiling"""
+    before = before or timezone.now() - timedelta(days=settings.BORROW_ARCHIVE_AFTER_DAYS)
+    return BorrowRecord.objects.filter(status='returned', return_date__lt=before, pk__lte=archive_ceiling())
+
+
+def _count_archived(per_user):
+    """Add {user id: n} to UserProfile.archived_loans with one UPDATE ... CASE"""
+    UserProfile.objects.bulk_create([UserProfile(user_id=pk) for pk in per_user], ignore_conflicts=True)
+    UserProfile.objects.filter(user_id__in=per_user).update(archived_loans=F('archived_loans') + Case(
+        *[When(user_id=pk, then=Value(n)) for pk, n in per_user.items()], default=0,
+    ))
+
+
+def archive_batch(queryset, after_id=0, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move the next `batch_size` loans of `queryset` with id above `after_id`
+    into the archive. Returns (loans moved, last id looked at or None when done).
+    """
+    archived_at = timezone.now()
+    with transaction.atomic():
+        # Row locks: a concurrent run waits here instead of copying the same loans
+        loans = list(
+            queryset.filter(pk__gt=after_id).select_for_update().order_by('pk')
+            .only('pk', 'user_id', 'book_id', 'borrow_date', 'due_date', 'return_date', 'notes')[:batch_size]
+        )
+        if not loans:
+            return 0, None
+        BorrowArchive.objects.bulk_create([
+            BorrowArchive(
+                id=loan.pk, user_id=loan.user_id, book_id=loan.book_id, borrow_date=loan.borrow_date,
+                due_date=loan.due_date, return_date=loan.return_date, notes=loan.notes, archived_at=archived_at,
+            )
+            for loan in loans
+        ], ignore_conflicts=True)
+        # Cascades to the loans' LoanNotices with one DELETE
+        BorrowRecord.objects.filter(pk__in=[loan.pk for loan in loans]).delete()
+        _count_archived(Counter(loan.user_id for loan in loans))
+    return len(loans), loans[-1].pk
+
+
+def archive_borrows(before=None, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """Archive every eligible loan batch by batch; returns loans moved"""
+    queryset = archivable(before)
+    moved, after_id = 0, 0
+    while after_id is not None:
+        count, after_id = archive_batch(queryset, after_id, batch_size)
+        moved += count
+        if count and progress:
+            progress(moved)
+    return moved
@@ -0,0 +1,358 @@
+"""
+Bulk catalog import for Library Management System
+Streams CSV, JSON Lines or MARC text (.mrk) records in batches. Authors and
+categories are resolved through in-memory name maps, books are upserted by
+ISBN (on PostgreSQL: COPY into a temporary staging table, then one
+INSERT ... ON CONFLICT), and category links go in with one bulk insert.
+Bulk writes skip model signals, so each batch logs its own CatalogChange rows.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import islice
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .isbn import is_isbn_shaped, normalize_isbn
+from .models import Author, Book, CatalogChange, Category
+
+FORMATS = ('csv', 'jsonl', 'marc')
+IMPORT_BATCH_SIZE = 1000
+# Updated on an existing ISBN; copy counts are left alone so loan accounting holds
+UPDATE_FIELDS = ['title', 'author', 'description', 'publication_date', 'pages', 'updated_at']
+STAGING_TABLE = 'library_book_import'
+STAGING_COLUMNS = 'isbn, title, author_id, description, publication_date, pages, copies'
+# COPY's csv format reads an unquoted empty field as NULL; the text columns are NOT NULL
+STAGING_COPY = (
+    f'COPY {STAGING_TABLE} ({STAGING_COLUMNS}) FROM STDIN '
+    f'WITH (FORMAT csv, FORCE_NOT_NULL (isbn, title, description))'
+)
+# pages and copies are IntegerFields: 32-bit signed on every backend
+MAX_NUMBER = 2 ** 31 - 1
+_CATEGORY_SEPARATORS = re.compile(r'\s*[;|]\s*')
+_SPACES = re.compile(r'\s+')
+
+
+class RejectedRow(ValueError):
+    """A record that can't be imported; the message is reported with its line number"""
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    authors_created: int = 0
+    categories_created: int = 0
+    batches: int = 0
+    rejects: list = field(default_factory=list)
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+def detect_format(path):
+    """Format from the file extension: .csv, .jsonl/.ndjson or .mrk"""
+    extension = path.rsplit('.', 1)[-1].lower()
+    formats = {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl', 'mrk': 'marc', 'marc': 'marc'}
+    if extension not in formats:
+        raise ValueError(f'Cannot tell the format of {path!r}; pass --format')
+    return formats[extension]
+
+
+def _read_csv(fh):
+    reader = csv.DictReader(fh)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_jsonl(fh):
+    for line_no, line in enumerate(fh, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, RejectedRow('invalid JSON')
+            continue
+        yield line_no, record if isinstance(record, dict) else RejectedRow('not a JSON object')
+
+
+def _marc_subfields(content):
+    """'14$aThe hobbit /$cJ.R.R. Tolkien.' -> [('a', 'The hobbit /'), ('c', 'J.R.R. Tolkien.')]"""
+    return [(part[0], part[1:]) for part in content[2:].split('$')[1:] if part]
+
+
+def _marc_value(value):
+    return value.strip().rstrip(' /:;,').strip()
+
+
+def _marc_author(values):
+    # "Tolkien, J. R. R." -> "J. R. R. Tolkien", the form the catalog uses
+    last, _, first = values['a'].partition(', ')
+    return f'{first} {last}' if first else last
+
+
+def _marc_match(pattern, value):
+    match = re.search(pattern, value)
+    return match.group() if match else None
+
+
+# tag: (record key, subfield it needs, value); the first occurrence of a tag wins
+_MARC_FIELDS = {
+    '020': ('isbn', 'a', lambda values: values['a'].split()[0]),
+    '100': ('author', 'a', _marc_author),
+    '245': ('title', 'a', lambda values: ' '.join(filter(None, [values['a'], values.get('b')]))),
+    '260': ('publication_date', 'c', lambda values: _marc_match(r'\d{4}', values['c'])),
+    '264': ('publication_date', 'c', lambda values: _marc_match(r'\d{4}', values['c'])),
+    '300': ('pages', 'a', lambda values: _marc_match(r'\d+', values['a'])),
+    '520': ('description', 'a', lambda values: values['a']),
+}
+
+
+def parse_marc_record(fields):
+    """Map MARC tags (020 ISBN, 100 author, 245 title, 260/264 date, 300 pages, 520 summary, 650 subjects)"""
+    record = {'categories': []}
+    for tag, content in fields:
+        values = {}
+        for code, value in _marc_subfields(content):
+            values.setdefault(code, _marc_value(value))
+        if tag == '650' and 'a' in values:
+            record['categories'].append(values['a'].rstrip('.'))
+        elif tag in _MARC_FIELDS:
+            key, code, extract = _MARC_FIELDS[tag]
+            if code in values and record.get(key) is None:
+                record[key] = extract(values)
+    return record
+
+
+def _read_marc(fh):
+    """MARCMaker text: one '=TAG  content' line per field, records start at =LDR or after a blank line"""
+    fields, start = [], None
+    for line_no, line in enumerate(fh, start=1):
+        line = line.rstrip('\r\n')
+        if (not line.strip() or line.startswith('=LDR')) and fields:
+            yield start, parse_marc_record(fields)
+            fields = []
+        if line.startswith('=') and len(line) > 4:
+            if not fields:
+                start = line_no
+            fields.append((line[1:4], line[6:]))
+    if fields:
+        yield start, parse_marc_record(fields)
+
+
+def read_records(fh, fmt):
+    """(line number, raw record dict or RejectedRow) for every record in `fh`"""
+    readers = {'csv': _read_csv, 'jsonl': _read_jsonl, 'marc': _read_marc}
+    return readers[fmt](fh)
+
+
+def _text(raw, key, max_length=None):
+    value = raw.get(key)
+    value = _SPACES.sub(' ', str(value)).strip() if value is not None else ''
+    if max_length and len(value) > max_length:
+        raise RejectedRow(f'{key} longer than {max_length} characters')
+    return value
+
+
+def _number(raw, key, default):
+    value = _text(raw, key)
+    if not value:
+        return default
+    # isdigit() also takes '²'; int() would then raise outside the reject path
+    if not (value.isascii() and value.isdecimal()):
+        raise RejectedRow(f'{key} {value!r} is not a whole number')
+    number = int(value)
+    if number > MAX_NUMBER:
+        raise RejectedRow(f'{key} {value!r} is larger than {MAX_NUMBER}')
+    return number
+
+
+def _publication_date(value):
+    try:
+        if re.fullmatch(r'\d{4}', value):
+            return date(int(value), 1, 1)
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RejectedRow(f'publication_date {value!r} is not YYYY or YYYY-MM-DD')
+
+
+def clean_record(raw):
+    """Validated import row, or RejectedRow with the reason"""
+    isbn = _text(raw, 'isbn')
+    if not is_isbn_shaped(isbn):
+        raise RejectedRow(f'ISBN {isbn!r} is not 10 or 13 characters' if isbn else 'missing ISBN')
+    title = _text(raw, 'title', Book._meta.get_field('title').max_length)
+    author = _text(raw, 'author', Author._meta.get_field('name').max_length)
+    published = _text(raw, 'publication_date')
+    for name, value in (('title', title), ('author', author), ('publication_date', published)):
+        if not value:
+            raise RejectedRow(f'missing {name}')
+    categories = raw.get('categories') or []
+    if isinstance(categories, str):
+        categories = _CATEGORY_SEPARATORS.split(categories)
+    categories = list(dict.fromkeys(_SPACES.sub(' ', str(name)).strip() for name in categories))
+    max_category = Category._meta.get_field('name').max_length
+    if any(len(name) > max_category for name in categories):
+        raise RejectedRow(f'category name longer than {max_category} characters')
+    return {
+        'isbn': normalize_isbn(isbn),
+        'title': title,
+        'author': author,
+        'categories': [name for name in categories if name],
+        'publication_date': _publication_date(published),
+        'pages': _number(raw, 'pages', 0),
+        'copies': max(1, _number(raw, 'copies', 1)),
+        'description': _text(raw, 'description'),
+    }
+
+
+def staging_csv(rows):
+    """Cleaned rows as CSV in STAGING_COLUMNS order, ready for STAGING_COPY"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row['isbn'], row['title'], row['author_id'], row['description'],
+                         row['publication_date'].isoformat(), row['pages'], row['copies']])
+    buffer.seek(0)
+    return buffer
+
+
+class CatalogImporter:
+    """
+    Batch upserter. Name maps for authors and categories are loaded once and
+    grow as batches create rows, so resolving a name never queries per row.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, dry_run=False, use_copy=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.result = ImportResult()
+        # Same-named authors: the oldest row wins, as the admin lists them
+        self.authors = dict(Author.objects.order_by('-id').values_list('name', 'id'))
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+
+    def run(self, records, progress=None):
+        """Import (line, raw) records; `progress(result)` is called after each batch"""
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.batch_size))
+            if not chunk:
+                return self.result
+            batch = {}
+            for line_no, raw in chunk:
+                self.result.rows += 1
+                try:
+                    if isinstance(raw, RejectedRow):
+                        raise raw
+                    row = clean_record(raw)
+                except RejectedRow as exc:
+                    self.result.rejects.append((line_no, str(exc)))
+                    continue
+                # A repeated ISBN in one batch: the later record wins
+                batch[row['isbn']] = row
+            if batch:
+                self._flush(list(batch.values()))
+            self.result.batches += 1
+            if progress:
+                progress(self.result)
+
+    def _resolve(self, model, names, known, kind=None):
+        """{name: id} for `names`, creating the missing rows in one bulk insert"""
+        missing = sorted({name for name in names if name not in known})
+        if not missing:
+            return []
+        if self.dry_run:
+            known.update(dict.fromkeys(missing))
+            return missing
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        created = dict(
+            model.objects.filter(name__in=missing).order_by('-id').values_list('name', 'id')
+        )
+        known.update(created)
+        if kind:
+            CatalogChange.objects.bulk_create([CatalogChange(kind=kind, object_id=pk) for pk in created.values()])
+        return missing
+
+    def _flush(self, rows):
+        result = self.result
+        with transaction.atomic():
+            result.authors_created += len(self._resolve(Author, [row['author'] for row in rows], self.authors, 'author'))
+            result.categories_created += len(self._resolve(
+                Category, [name for row in rows for name in row['categories']], self.categories,
+            ))
+            if self.dry_run:
+                existing = set(Book.objects.filter(isbn__in=[row['isbn'] for row in rows]).values_list('isbn', flat=True))
+                result.updated += len(existing)
+                result.created += len(rows) - len(existing)
+                return
+            for row in rows:
+                row['author_id'] = self.authors[row['author']]
+            upsert = self._upsert_copy if self.use_copy else self._upsert_orm
+            book_ids = upsert(rows)
+            created = sum(1 for _, was_created in book_ids.values() if was_created)
+            result.created += created
+            result.updated += len(book_ids) - created
+
+            through = Book.categories.through
+            through.objects.bulk_create([
+                through(book_id=book_ids[row['isbn']][0], category_id=self.categories[name])
+                for row in rows for name in row['categories']
+            ], ignore_conflicts=True)
+            CatalogChange.objects.bulk_create([
+                CatalogChange(kind='book', object_id=pk) for pk, _ in book_ids.values()
+            ])
+
+    def _upsert_orm(self, rows):
+        """bulk_create(update_conflicts=True); returns {isbn: (id, created?)}"""
+        isbns = [row['isbn'] for row in rows]
+        existing = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+        Book.objects.bulk_create([
+            Book(isbn=row['isbn'], title=row['title'], author_id=row['author_id'],
+                 description=row['description'], publication_date=row['publication_date'], pages=row['pages'],
+                 available_copies=row['copies'], total_copies=row['copies'])
+            for row in rows
+        ], update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS)
+        return {
+            isbn: (pk, isbn not in existing)
+            for isbn, pk in Book.objects.filter(isbn__in=isbns).values_list('isbn', 'id')
+        }
+
+    def _upsert_copy(self, rows):
+        """
+        PostgreSQL: COPY the batch into a temporary staging table, then one
+        INSERT ... SELECT ... ON CONFLICT whose RETURNING tells inserts
+        (xmax = 0) from updates. Returns {isbn: (id, created?)}
+        """
+        now = timezone.now()
+        buffer = staging_csv(rows)
+        table = connection.ops.quote_name(Book._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ('
+                'isbn varchar(13), title varchar(300), author_id bigint, description text, '
+                'publication_date date, pages integer, copies integer)'
+            )
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+            cursor.copy_expert(STAGING_COPY, buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (isbn, title, author_id, description, publication_date, pages, '
+                f'available_copies, total_copies, created_at, updated_at) '
+                f'SELECT isbn, title, author_id, description, publication_date, pages, copies, copies, %s, %s '
+                f'FROM {STAGING_TABLE} '
+                f'ON CONFLICT (isbn) DO UPDATE SET title = EXCLUDED.title, author_id = EXCLUDED.author_id, '
+                f'description = EXCLUDED.description, publication_date = EXCLUDED.publication_date, '
+                f'pages = EXCLUDED.pages, updated_at = EXCLUDED.updated_at '
+                f'RETURNING isbn, id, (xmax = 0)',
+                [now, now],
+            )
+            return {isbn: (pk, inserted) for isbn, pk, inserted in cursor.fetchall()}
@@ -0,0 +1,252 @@
+"""
+Set-based circulation operations for Library Management System
+Each operation runs a fixed number of statements regardless of how many
+loans or books it touches, and keeps Book.available_copies in step.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import events, holds
+from .models import Book, BorrowRecord, CatalogChange, CirculationEvent, Hold
+
+# Books per UPDATE ... CASE statement when applying per-book deltas
+CASE_BATCH_SIZE = 500
+LOAN_PERIOD = timedelta(days=14)
+# Books per checkout or return at the circulation desk
+MAX_BATCH_ITEMS = 50
+RESULT_LABELS = {
+    'borrowed': 'Checked out',
+    'returned': 'Returned',
+    'already_borrowed': 'Already on loan',
+    'unavailable': 'No copy available',
+    'not_borrowed': 'Not on loan',
+    'not_found': 'Not found',
+}
+
+
+def _case_update(values, field, relative):
+    book_ids = list(values)
+    updated = 0
+    for start in range(0, len(book_ids), CASE_BATCH_SIZE):
+        batch = book_ids[start:start + CASE_BATCH_SIZE]
+        case = Case(*[When(pk=pk, then=Value(values[pk])) for pk in batch], default=F(field) if not relative else 0)
+        updated += Book.objects.filter(pk__in=batch).update(**{field: F(field) + case if relative else case})
+    return updated
+
+
+def apply_copy_deltas(deltas, field='available_copies'):
+    """
+    Add {book_id: delta} to `field` using one UPDATE ... CASE per batch of books.
+    Returns the number of book rows updated.
+    """
+    return _case_update(deltas, field, relative=True)
+
+
+def set_copy_counts(counts, field='available_copies'):
+    """Set {book_id: value} on `field` using one UPDATE ... CASE per batch of books"""
+    return _case_update(counts, field, relative=False)
+
+
+def return_loans(queryset, when=None, actor=None):
+    """
+    Mark every active loan in `queryset` returned and give the copies back,
+    aggregated per book: to the heads of hold queues first, then the shelf.
+    Returns (loans returned, books updated).
+    """
+    when = when or timezone.now()
+    with transaction.atomic():
+        active = queryset.filter(status__in=BorrowRecord.ACTIVE_STATUSES)
+        # Lock the loans so a concurrent return can't release the same copy twice
+        loans = list(active.select_for_update().values_list('book_id', 'user_id', 'pk'))
+        if not loans:
+            return 0, 0
+        loan_ids = [pk for _, _, pk in loans]
+        deltas = Counter(book_id for book_id, _, _ in loans)
+        returned = BorrowRecord.objects.filter(pk__in=loan_ids).update(status='returned', return_date=when)
+        deltas = {pk: n for pk, n in holds.allocate_copies(deltas, when).items() if n}
+        books = apply_copy_deltas(deltas) if deltas else 0
+        events.record(CirculationEvent.RETURNED, loans, actor, when)
+    return returned, books
+
+
+def checkout_books(user, book_ids, now=None, actor=None):
+    """
+    Lend `book_ids` to `user` in one transaction and a fixed number of
+    statements: lock the books, skip ones already on loan to the user or with
+    no copy left, take one copy of each of the rest with a single UPDATE and
+    insert their loans with one bulk INSERT. A copy set aside for the user's
+    ready hold is lent without touching the shelf, and the hold is fulfilled.
+    Returns {book_id: result}, in request order, with 'borrowed',
+    'already_borrowed', 'unavailable' or 'not_found'.
+    """
+    now = now or timezone.now()
+    book_ids = list(dict.fromkeys(book_ids))
+    with transaction.atomic():
+        available = dict(
+            Book.objects.select_for_update().filter(pk__in=book_ids).values_list('pk', 'available_copies')
+        )
+        held = set(
+            BorrowRecord.objects.filter(user=user, book_id__in=available, status__in=BorrowRecord.ACTIVE_STATUSES)
+            .values_list('book_id', flat=True)
+        )
+        open_holds = dict(
+            Hold.objects.filter(user=user, book_id__in=available, status__in=Hold.OPEN_STATUSES)
+            .values_list('book_id', 'status')
+        )
+        results = {}
+        for pk in book_ids:
+            if pk not in available:
+                results[pk] = 'not_found'
+            elif pk in held:
+                results[pk] = 'already_borrowed'
+            elif available[pk] < 1 and open_holds.get(pk) != 'ready':
+                results[pk] = 'unavailable'
+            else:
+                results[pk] = 'borrowed'
+        lent = [pk for pk, result in results.items() if result == 'borrowed']
+        from_shelf = [pk for pk in lent if open_holds.get(pk) != 'ready']
+        if from_shelf:
+            Book.objects.filter(pk__in=from_shelf).update(available_copies=F('available_copies') - 1)
+        if open_holds.keys() & set(lent):
+            Hold.objects.filter(user=user, book_id__in=lent, status__in=Hold.OPEN_STATUSES).update(status='fulfilled')
+        if lent:
+            loans = BorrowRecord.objects.bulk_create([
+                BorrowRecord(user=user, book_id=pk, borrow_date=now, due_date=now + LOAN_PERIOD, status='borrowed')
+                for pk in lent
+            ])
+            events.record(CirculationEvent.BORROWED, [(loan.book_id, user.pk, loan.pk) for loan in loans], actor, now)
+    return results
+
+
+def return_books(user, book_ids, when=None, actor=None):
+    """
+    Return `user`'s active loans of `book_ids` in one transaction (see
+    return_loans). Returns {book_id: result}, in request order, with
+    'returned' or 'not_borrowed'.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    with transaction.atomic():
+        loans = BorrowRecord.objects.filter(
+            user=user, book_id__in=book_ids, status__in=BorrowRecord.ACTIVE_STATUSES,
+        ).select_for_update()
+        on_loan = set(loans.values_list('book_id', flat=True))
+        if on_loan:
+            return_loans(loans, when, actor)
+    return {pk: 'returned' if pk in on_loan else 'not_borrowed' for pk in book_ids}
+
+
+def mark_overdue(queryset, now=None, actor=None):
+    """Flag borrowed loans in `queryset` that are past due; copies are unaffected"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        loans = list(
+            queryset.filter(status='borrowed', due_date__lt=now).select_for_update()
+            .values_list('book_id', 'user_id', 'pk')
+        )
+        if not loans:
+            return 0
+        updated = BorrowRecord.objects.filter(pk__in=[pk for _, _, pk in loans]).update(status='overdue')
+        events.record(CirculationEvent.OVERDUE, loans, actor, now)
+    return updated
+
+
+def adjust_copies(queryset, delta, actor=None):
+    """
+    Add `delta` to both total and available copies of every book in `queryset`.
+    Added copies go to the heads of hold queues first, then the shelf.
+    Books that would drop below zero available copies are skipped.
+    Returns (books updated, books skipped).
+    """
+    with transaction.atomic():
+        book_ids = list(queryset.values_list('pk', flat=True))
+        eligible = Book.objects.filter(pk__in=book_ids)
+        if delta < 0:
+            eligible = eligible.filter(available_copies__gte=-delta, total_copies__gte=-delta)
+        adjusted = list(eligible.select_for_update().values_list('pk', flat=True))
+        if delta > 0:
+            updated = Book.objects.filter(pk__in=adjusted).update(total_copies=F('total_copies') + delta)
+            holds.release_copies({pk: delta for pk in adjusted})
+        else:
+            updated = Book.objects.filter(pk__in=adjusted).update(
+                total_copies=F('total_copies') + delta,
+                available_copies=F('available_copies') + delta,
+            )
+        events.record(CirculationEvent.COPIES_ADJUSTED, [(pk, None, None) for pk in adjusted], actor, delta=delta)
+    return updated, len(book_ids) - updated
+
+
+def set_category(queryset, category, replace=False):
+    """
+    Add `category` to every book in `queryset` with one bulk through-table insert,
+    or make it their only category when replace=True. Returns the number of books.
+    """
+    through = Book.categories.through
+    book_ids = list(queryset.values_list('pk', flat=True))
+    with transaction.atomic():
+        if replace:
+            through.objects.filter(book_id__in=book_ids).exclude(category=category).delete()
+        through.objects.bulk_create(
+            [through(book_id=pk, category_id=category.pk) for pk in book_ids],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        # Bulk writes send no m2m_changed; bump the catalog version for cached searches
+        CatalogChange.objects.bulk_create([CatalogChange(kind='book', object_id=pk) for pk in book_ids], batch_size=1000)
+    return len(book_ids)
+
+
+def with_expected_availability(queryset):
+    """
+    Annotate books with `active_loans`, `ready_holds` and `expected_available`
+    (total_copies minus active loans and copies set aside for holds, never
+    below zero) in one grouped query
+    """
+    ready_holds = (
+        Hold.objects.filter(book=OuterRef('pk'), status='ready')
+        .order_by().values('book').annotate(n=Count('pk')).values('n')
+    )
+    return queryset.annotate(
+        active_loans=Count('borrow_records', filter=Q(borrow_records__status__in=BorrowRecord.ACTIVE_STATUSES)),
+        ready_holds=Coalesce(Subquery(ready_holds), Value(0)),
+    ).annotate(
+        expected_available=Greatest(F('total_copies') - F('active_loans') - F('ready_holds'), Value(0)),
+    )
+
+
+def inventory_drift(queryset=None):
+    """Books whose available_copies disagrees with total_copies minus active loans"""
+    queryset = Book.objects.all() if queryset is None else queryset
+    return (
+        with_expected_availability(queryset.order_by())
+        .exclude(available_copies=F('expected_available'))
+        .values('pk', 'title', 'available_copies', 'total_copies', 'active_loans', 'expected_available')
+        .order_by('pk')
+    )
+
+
+def fix_inventory(book_ids):
+    """
+    Recompute and store available_copies for `book_ids` under row locks,
+    so loans taken while the drift report was running are not lost. Copies
+    found missing from the shelf go to the heads of hold queues first.
+    Returns the number of books corrected.
+    """
+    with transaction.atomic():
+        list(Book.objects.select_for_update().filter(pk__in=book_ids).values_list('pk', flat=True))
+        drift = list(
+            with_expected_availability(Book.objects.filter(pk__in=book_ids).order_by())
+            .exclude(available_copies=F('expected_available'))
+            .values_list('pk', 'available_copies', 'expected_available')
+        )
+        gains = {pk: expected - current for pk, current, expected in drift if expected > current}
+        leftover = holds.allocate_copies(gains) if gains else {}
+        counts = {
+            pk: current + leftover[pk] if pk in gains else expected
+            for pk, current, expected in drift
+        }
+        return set_copy_counts(counts) if counts else 0
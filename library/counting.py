@@ -0,0 +1,67 @@
+"""
+Estimated row counts for large tables
+On PostgreSQL, exact COUNT(*) is a full scan. Above ESTIMATED_COUNT_THRESHOLD
+rows we read planner statistics instead: pg_class.reltuples for a whole table,
+or the planner's row estimate (EXPLAIN) for a filtered queryset. Small tables
+and other backends (SQLite) always get an exact count.
+"""
+import json
+
+from django.conf import settings
+from django.db import connections
+
+
+def table_estimate(model, using='default'):
+    """Planner row estimate for the model's table, or None if never analyzed"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 (PostgreSQL 14+) or 0 until the table is first analyzed
+    if row is None or row[0] <= 0:
+        return None
+    return int(row[0])
+
+
+def plan_estimate(queryset):
+    """Row estimate from EXPLAIN for an arbitrary (filtered) queryset"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _is_unfiltered(queryset):
+    query = queryset.query
+    return not query.where and not query.distinct and query.low_mark == 0 and query.high_mark is None
+
+
+def count_with_estimate_flag(queryset, threshold=None):
+    """(count, is_estimate): exact COUNT for small results, planner estimate for big ones"""
+    threshold = settings.ESTIMATED_COUNT_THRESHOLD if threshold is None else threshold
+    if _is_unfiltered(queryset):
+        estimate = table_estimate(queryset.model, using=queryset.db)
+    else:
+        estimate = plan_estimate(queryset)
+    if estimate is None or estimate < threshold:
+        return queryset.count(), False
+    return estimate, True
+
+
+def estimated_count(queryset, threshold=None):
+    """
+    COUNT for small results, planner estimate for big ones.
+    Returns an int either way; callers that must be exact should use .count().
+    """
+    return count_with_estimate_flag(queryset, threshold)[0]
@@ -0,0 +1,131 @@
+"""
+Circulation event log for Library Management System
+Circulation operations pass their events to record() inside their own
+transaction. Once it commits, the events join a per-process buffer that is
+written with one bulk INSERT every CIRCULATION_EVENT_BATCH_SIZE events or
+CIRCULATION_EVENT_FLUSH_MS milliseconds, so borrow and return never wait on
+the log. The buffer is flushed again when the process exits.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import CirculationEvent
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_SIZE = 2000
+
+
+def _write(events):
+    CirculationEvent.objects.bulk_create(events, batch_size=1000)
+
+
+class EventBuffer:
+    """
+    Thread-safe list of unsaved events. The write happens outside the lock, on
+    the thread that filled the batch or on a timer thread for a partial one.
+    A failed write is logged and the batch dropped rather than failing a loan.
+    """
+
+    def __init__(self, writer=_write, max_events=None, max_delay_ms=None):
+        self.writer = writer
+        self.max_events = max_events
+        self.max_delay_ms = max_delay_ms
+        self._pending = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, events):
+        max_events = self.max_events or settings.CIRCULATION_EVENT_BATCH_SIZE
+        with self._lock:
+            self._pending.extend(events)
+            if len(self._pending) < max_events:
+                if self._timer is None:
+                    delay_ms = settings.CIRCULATION_EVENT_FLUSH_MS if self.max_delay_ms is None else self.max_delay_ms
+                    self._timer = threading.Timer(delay_ms / 1000, self._flush_from_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            batch = self._take()
+        self._write(batch)
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _write(self, batch):
+        try:
+            self.writer(batch)
+        except Exception:
+            logger.exception('Dropped %d circulation events', len(batch))
+
+    def flush(self):
+        """Write everything pending now; returns events written"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+        return len(batch)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own connection; don't leave it behind
+            connections.close_all()
+
+
+buffer = EventBuffer()
+# Gunicorn workers and run_worker exit through sys.exit, which runs this
+atexit.register(buffer.flush)
+
+
+def record(kind, rows, actor=None, when=None, delta=0):
+    """
+    Queue one `kind` event per (book id, user id, loan id) in `rows`. They reach
+    the buffer only if the current transaction commits.
+    """
+    when = when or timezone.now()
+    actor_id = getattr(actor, 'pk', actor)
+    events = [
+        CirculationEvent(occurred_at=when, kind=kind, book_id=book_id, user_id=user_id, loan_id=loan_id,
+                         actor_id=actor_id, delta=delta)
+        for book_id, user_id, loan_id in rows
+    ]
+    if events:
+        transaction.on_commit(lambda: buffer.add(events))
+
+
+def replay(since=None, until=None, book=None, kinds=None, after_id=0, chunk_size=REPLAY_CHUNK_SIZE):
+    """
+    Stream events in id order (the order buffers wrote them, close to but not
+    strictly occurred_at order across processes), one keyset chunk per query,
+    so a replay of any length holds one chunk in memory and no open cursor.
+    Resume an interrupted replay with after_id=<last id seen>.
+    """
+    queryset = CirculationEvent.objects.all()
+    if since is not None:
+        queryset = queryset.filter(occurred_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(occurred_at__lt=until)
+    if book is not None:
+        queryset = queryset.filter(book_id=getattr(book, 'pk', book))
+    if kinds is not None:
+        queryset = queryset.filter(kind__in=kinds)
+    while True:
+        chunk = list(queryset.filter(pk__gt=after_id).order_by('pk')[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after_id = chunk[-1].pk
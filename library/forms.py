@@ -4,7 +4,53 @@ Forms for Library Management System
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
 from .models import Book, Author, Category, BorrowRecord, UserProfile
+from .circulation import MAX_BATCH_ITEMS
+from .reports import MAX_REPORT_DAYS, default_range
+from .isbn import is_isbn_shaped, isbn_lookup_keys, normalize_isbn
+from .uploads import image_dimensions, upload_limits
+from .widgets import AutocompleteSelect, AutocompleteSelectMultiple
+
+# Book ids are BigAutoField; anything larger can't be one (and overflows the lookup)
+MAX_BOOK_ID = 2 ** 63 - 1
+
+
+class BoundedImageField(forms.ImageField):
+    """
+    ImageField that enforces per-field byte and pixel limits (settings.UPLOAD_LIMITS)
+    before Pillow verifies the image, so oversized or decompression-bomb files
+    are rejected from the header alone.
+    """
+    def __init__(self, *args, limits=None, **kwargs):
+        self.limits_key = limits
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        limits = upload_limits(self.limits_key)
+        size = getattr(data, 'received_size', data.size)
+        if getattr(data, 'upload_truncated', False) or size > limits['max_bytes']:
+            raise forms.ValidationError(
+                'File is too large (%(size)s). The limit is %(limit)s.',
+                code='file_too_large',
+                params={'size': filesizeformat(size), 'limit': filesizeformat(limits['max_bytes'])},
+            )
+        try:
+            width, height = image_dimensions(data)
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+            raise forms.ValidationError('Image dimensions are too large.', code='image_too_large')
+        except Exception:
+            raise forms.ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+        if width * height > limits['max_pixels']:
+            raise forms.ValidationError(
+                'Image is %(width)s×%(height)s pixels; at most %(limit)s megapixels are allowed.',
+                code='image_too_large',
+                params={'width': width, 'height': height, 'limit': limits['max_pixels'] // 1_000_000},
+            )
+        return super().to_python(data)
 
 
 class UserRegisterForm(UserCreationForm):
@@ -20,15 +66,27 @@ class UserRegisterForm(UserCreationForm):
 
 class BookForm(forms.ModelForm):
     """Form for creating and updating books"""
+    isbn = forms.CharField(max_length=17, label='ISBN', help_text='10 or 13 digits, hyphens optional')
+    cover_image = BoundedImageField(limits='cover_image', required=False)
+
     class Meta:
         model = Book
         fields = ['title', 'author', 'categories', 'isbn', 'description', 
                   'publication_date', 'pages', 'available_copies', 'total_copies', 'cover_image']
         widgets = {
+            'author': AutocompleteSelect('autocomplete_authors'),
+            'categories': AutocompleteSelectMultiple('autocomplete_categories'),
             'publication_date': forms.DateInput(attrs={'type': 'date'}),
             'description': forms.Textarea(attrs={'rows': 4}),
         }
 
+    def clean_isbn(self):
+        """Normalize before the unique check so '978-0-306-40615-7' matches '9780306406157'"""
+        isbn = self.cleaned_data['isbn']
+        if not is_isbn_shaped(isbn):
+            raise forms.ValidationError('Enter a 10 or 13 character ISBN (hyphens are allowed).')
+        return normalize_isbn(isbn)
+
 
 class AuthorForm(forms.ModelForm):
     """Form for creating and updating authors"""
@@ -53,6 +111,11 @@ class CategoryForm(forms.ModelForm):
 
 class BorrowRecordForm(forms.ModelForm):
     """Form for creating borrow records"""
+    book = forms.ModelChoiceField(
+        queryset=Book.objects.select_related('author'),
+        widget=AutocompleteSelect('autocomplete_books'),
+    )
+
     class Meta:
         model = BorrowRecord
         fields = ['book', 'due_date', 'notes']
@@ -64,6 +127,8 @@ class BorrowRecordForm(forms.ModelForm):
 
 class UserProfileForm(forms.ModelForm):
     """Form for updating user profile"""
+    profile_picture = BoundedImageField(limits='profile_picture', required=False)
+
     class Meta:
         model = UserProfile
         fields = ['phone_number', 'address', 'date_of_birth', 'profile_picture']
@@ -71,3 +136,80 @@ class UserProfileForm(forms.ModelForm):
             'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
             'address': forms.Textarea(attrs={'rows': 3}),
         }
+
+
+class BatchCirculationForm(forms.Form):
+    """Circulation desk: check out or return a stack of books for one patron"""
+    ACTION_CHOICES = [
+        ('borrow', 'Check out'),
+        ('return', 'Return'),
+    ]
+
+    username = forms.CharField(max_length=150, label='Patron username')
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    items = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 8, 'class': 'form-control', 'autofocus': True}),
+        help_text=f'One scanned ISBN or book id per line, up to {MAX_BATCH_ITEMS}',
+    )
+
+    def clean_username(self):
+        user = User.objects.filter(username=self.cleaned_data['username'], is_active=True).first()
+        if user is None:
+            raise forms.ValidationError('No active patron with that username.')
+        return user
+
+    def clean_items(self):
+        """
+        The entries as {entry: book id, or None for an unknown ISBN or an id
+        out of range}, resolving all ISBNs in one query
+        """
+        entries = list(dict.fromkeys(line.strip() for line in self.cleaned_data['items'].splitlines() if line.strip()))
+        if len(entries) > MAX_BATCH_ITEMS:
+            raise forms.ValidationError(f'At most {MAX_BATCH_ITEMS} books per batch.')
+        # ISBN-shaped entries with a bad check digit still match a stored ISBN exactly
+        keys = {
+            entry: (isbn_lookup_keys(entry) or [normalize_isbn(entry)]) if is_isbn_shaped(entry) else []
+            for entry in entries
+        }
+        wanted = set().union(*keys.values())
+        by_isbn = dict(Book.objects.filter(isbn__in=wanted).values_list('isbn', 'pk')) if wanted else {}
+        resolved = {}
+        for entry, isbns in keys.items():
+            if isbns:
+                resolved[entry] = next((by_isbn[isbn] for isbn in isbns if isbn in by_isbn), None)
+            elif entry.isascii() and entry.isdecimal():
+                resolved[entry] = int(entry) if int(entry) <= MAX_BOOK_ID else None
+            else:
+                raise forms.ValidationError(f'"{entry}" is neither an ISBN nor a book id.')
+        return resolved
+
+
+class ReportRangeForm(forms.Form):
+    """Date range and bucket size for the staff circulation reports"""
+    PERIOD_CHOICES = [
+        ('day', 'Per day'),
+        ('week', 'Per week'),
+    ]
+
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    period = forms.ChoiceField(choices=PERIOD_CHOICES, required=False,
+                               widget=forms.Select(attrs={'class': 'form-select'}))
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = default_range(cleaned.get('end'))
+        cleaned['end'] = end
+        cleaned['start'] = cleaned.get('start') or start
+        cleaned['period'] = cleaned.get('period') or 'day'
+        if cleaned['start'] > cleaned['end']:
+            raise forms.ValidationError('The start date must be on or before the end date.')
+        if (cleaned['end'] - cleaned['start']).days >= MAX_REPORT_DAYS:
+            raise forms.ValidationError(f'Reports cover at most {MAX_REPORT_DAYS} days.')
+        return cleaned
+
+    def range_or_default(self):
+        """(start, end, period) from valid input, else the last REPORT_DAYS days per day"""
+        if self.is_valid():
+            return self.cleaned_data['start'], self.cleaned_data['end'], self.cleaned_data['period']
+        return (*default_range(), 'day')
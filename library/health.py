@@ -0,0 +1,103 @@
+"""
+Liveness and readiness probes for Library Management System
+Served by HealthCheckMiddleware ahead of session, messages and CSRF handling
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_readiness = {'checked_at': None, 'ok': False, 'checks': {}}
+_migrations_applied = False
+
+
+def _check_database(connection):
+    """Run a trivial query through the (pooled) connection with a short timeout"""
+    timeout_ms = settings.HEALTHCHECK_TIMEOUT_MS
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL statement_timeout = %s', [timeout_ms])
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+
+def _check_migrations(connection):
+    """Fail while migrations are pending; once applied the result is kept for the process lifetime"""
+    global _migrations_applied
+    if _migrations_applied:
+        return
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f'{len(plan)} unapplied migration(s)')
+    _migrations_applied = True
+
+
+def _check_cache():
+    """Round-trip a key through the default cache"""
+    key = 'health:readyz'
+    token = str(time.monotonic())
+    cache.set(key, token, timeout=settings.HEALTHCHECK_CACHE_SECONDS + 1)
+    if cache.get(key) != token:
+        raise RuntimeError('cache round-trip failed')
+
+
+def run_readiness_checks():
+    """Run all readiness checks and return (ok, {name: 'ok' | error})"""
+    connection = connections[DEFAULT_DB_ALIAS]
+    checks = {}
+    for name, check in (
+        ('database', lambda: _check_database(connection)),
+        ('migrations', lambda: _check_migrations(connection)),
+        ('cache', _check_cache),
+    ):
+        try:
+            check()
+            checks[name] = 'ok'
+        except Exception as exc:
+            logger.warning('Readiness check %s failed: %s', name, exc)
+            checks[name] = str(exc) or exc.__class__.__name__
+            if name == 'database':
+                # Migrations cannot be inspected without a working connection
+                checks['migrations'] = 'skipped'
+                break
+    ok = all(value == 'ok' for value in checks.values())
+    return ok, checks
+
+
+def healthz(request):
+    """Liveness probe - the process is up and serving requests, no DB work"""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """Readiness probe - DB, migrations and cache, cached for HEALTHCHECK_CACHE_SECONDS"""
+    now = time.monotonic()
+    with _lock:
+        checked_at = _readiness['checked_at']
+        if checked_at is None or now - checked_at >= settings.HEALTHCHECK_CACHE_SECONDS:
+            ok, checks = run_readiness_checks()
+            _readiness.update(checked_at=now, ok=ok, checks=checks)
+        ok, checks = _readiness['ok'], dict(_readiness['checks'])
+
+    return JsonResponse(
+        {'status': 'ok' if ok else 'unavailable', 'checks': checks},
+        status=200 if ok else 503,
+    )
+
+
+def reset_readiness_cache():
+    """Forget the cached readiness result (used by tests)"""
+    global _migrations_applied
+    with _lock:
+        _readiness.update(checked_at=None, ok=False, checks={})
+        _migrations_applied = False
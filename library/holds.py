@@ -0,0 +1,120 @@
+"""
+Hold queues for Library Management System
+A returned copy goes to the head of its book's queue inside the return
+transaction (one grouped probe of hold_queue_idx per batch of books) instead
+of back on the shelf. Holders are emailed in batches by a job
+(notifications.send_hold_notices), never on the return path.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import circulation
+from .models import Book, Hold
+
+
+def allocate_copies(copies, now=None):
+    """
+    Set aside up to copies[book_id] copies for the heads of those books'
+    queues, marking them ready for pickup. Call inside the transaction that
+    frees the copies. Returns {book_id: copies left over for the shelf}.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(days=settings.HOLD_PICKUP_DAYS)
+    leftover = dict(copies)
+    while True:
+        wanted = [pk for pk, n in leftover.items() if n > 0]
+        if not wanted:
+            break
+        heads = (
+            Hold.objects.filter(book_id__in=wanted, status='waiting').order_by()
+            .values('book_id').annotate(head=Min('id')).values_list('head', flat=True)
+        )
+        # Re-checked under the row lock: a concurrent return may have taken a head
+        claimed = list(
+            Hold.objects.select_for_update().filter(pk__in=list(heads), status='waiting').values_list('pk', 'book_id')
+        )
+        if not claimed:
+            break
+        Hold.objects.filter(pk__in=[pk for pk, _ in claimed]).update(
+            status='ready', ready_at=now, expires_at=expires_at, notified_at=None,
+        )
+        for _, book_id in claimed:
+            leftover[book_id] -= 1
+    return leftover
+
+
+def release_copies(copies, now=None):
+    """Give {book_id: n} copies to waiting holders first, then back to the shelf"""
+    leftover = {pk: n for pk, n in allocate_copies(copies, now).items() if n}
+    if leftover:
+        circulation.apply_copy_deltas(leftover)
+
+
+def place_hold(user, book):
+    """
+    Join `book`'s queue; returns (hold, created). A copy still on the shelf is
+    set aside straight away, so the hold doesn't wait for the next return.
+    """
+    existing = Hold.objects.filter(user=user, book=book, status__in=Hold.OPEN_STATUSES).first()
+    if existing is not None:
+        return existing, False
+    try:
+        with transaction.atomic():
+            hold = Hold.objects.create(user=user, book=book)
+            if Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+                    available_copies=F('available_copies') - 1):
+                allocate_copies({book.pk: 1})
+                hold.refresh_from_db()
+    except IntegrityError:
+        # Another request from the same user got there first
+        return Hold.objects.get(user=user, book=book, status__in=Hold.OPEN_STATUSES), False
+    return hold, True
+
+
+def cancel_hold(hold):
+    """Leave the queue; a copy set aside for this hold passes to the next holder"""
+    with transaction.atomic():
+        status = Hold.objects.select_for_update().filter(pk=hold.pk).values_list('status', flat=True).first()
+        if status not in Hold.OPEN_STATUSES:
+            return False
+        Hold.objects.filter(pk=hold.pk).update(status='cancelled')
+        if status == 'ready':
+            release_copies({hold.book_id: 1})
+    return True
+
+
+def expire_holds(now=None):
+    """Expire ready holds not picked up in time and pass their copies on; returns holds expired"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            Hold.objects.select_for_update().filter(status='ready', expires_at__lt=now).values_list('pk', 'book_id')
+        )
+        if not expired:
+            return 0
+        Hold.objects.filter(pk__in=[pk for pk, _ in expired]).update(status='expired')
+        release_copies(Counter(book_id for _, book_id in expired), now)
+    return len(expired)
+
+
+def queue_positions(user):
+    """
+    The user's open holds, each annotated with `ahead`: waiting holds before
+    it, counted from the index range below its id rather than the whole queue
+    """
+    ahead = (
+        Hold.objects.filter(book=OuterRef('book'), status='waiting', id__lt=OuterRef('id'))
+        .order_by().values('book').annotate(n=Count('pk')).values('n')
+    )
+    return (
+        Hold.objects.filter(user=user, status__in=Hold.OPEN_STATUSES)
+        .select_related('book', 'book__author')
+        .annotate(ahead=Coalesce(Subquery(ahead), Value(0)))
+        .order_by('id')
+    )
@@ -0,0 +1,117 @@
+"""
+Image variant pipeline for Library Management System
+Generates resized WebP/JPEG copies of cover images and profile pictures
+next to the original upload, and builds srcset strings for templates
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import jobs
+
+# extension -> Pillow format
+VARIANT_FORMATS = {
+    'webp': 'WEBP',
+    'jpg': 'JPEG',
+}
+
+CACHE_TIMEOUT = 60 * 60 * 24
+# A queued set is looked for again after this long, and requeued if still missing
+PENDING_TIMEOUT = 60 * 5
+
+
+def variant_name(name, width, ext):
+    """book_covers/dune.png -> book_covers/dune_320w.webp"""
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{ext}'
+
+
+def _cache_key(name):
+    return f'imgvariants:{name}'
+
+
+def _to_rgb(image):
+    """Flatten transparency onto white so JPEG and WebP variants match"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(name, storage=default_storage, force=False):
+    """
+    Write every width/format variant of ``name`` to ``storage``.
+    Images are only ever downscaled. Returns the number of files written.
+    """
+    widths = settings.IMAGE_VARIANT_WIDTHS
+    if not force and cache.get(_cache_key(name)):
+        return 0
+    # The largest JPEG is written last, so its presence means the set is complete
+    if not force and storage.exists(variant_name(name, widths[-1], 'jpg')):
+        cache.set(_cache_key(name), True, CACHE_TIMEOUT)
+        return 0
+
+    with storage.open(name, 'rb') as fh:
+        image = Image.open(fh)
+        image.draft('RGB', (widths[-1], widths[-1] * 2))
+        image = _to_rgb(ImageOps.exif_transpose(image))
+
+    written = 0
+    for width in widths:
+        resized = image
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        for ext in ('webp', 'jpg'):
+            buffer = BytesIO()
+            resized.save(buffer, VARIANT_FORMATS[ext], quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+            target = variant_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+
+    cache.set(_cache_key(name), True, CACHE_TIMEOUT)
+    return written
+
+
+def variants_ready(name, storage=default_storage):
+    """
+    Return True when variants exist for ``name``. Only the cache and storage
+    are checked, never Pillow: a missing set (an upload whose job hasn't run
+    yet, or one that predates the pipeline) is queued for the
+    images.generate_variants job and the caller renders the original.
+    """
+    key = _cache_key(name)
+    ready = cache.get(key)
+    if ready is None:
+        ready = storage.exists(variant_name(name, settings.IMAGE_VARIANT_WIDTHS[-1], 'jpg'))
+        if not ready:
+            jobs.enqueue('images.generate_variants', {'name': name})
+        cache.set(key, ready, CACHE_TIMEOUT if ready else PENDING_TIMEOUT)
+    return ready
+
+
+def srcset(name, ext, storage=default_storage):
+    """'url 160w, url 320w, ...' for one variant format"""
+    return ', '.join(
+        f'{storage.url(variant_name(name, width, ext))} {width}w'
+        for width in settings.IMAGE_VARIANT_WIDTHS
+    )
+
+
+def delete_variants(name, storage=default_storage):
+    """Remove all variants of ``name`` (the original is left alone)"""
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        for ext in VARIANT_FORMATS:
+            target = variant_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+    cache.delete(_cache_key(name))
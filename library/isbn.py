@@ -0,0 +1,66 @@
+"""
+ISBN helpers for Library Management System
+ISBNs are stored normalized: digits only (plus a trailing X for ISBN-10), no hyphens or spaces.
+"""
+import re
+
+_SEPARATORS = re.compile(r'[\s\-]')
+_ISBN_SHAPE = re.compile(r'^(\d{9}[\dX]|\d{13})$')
+
+
+def normalize_isbn(value):
+    """'978-0-306-40615-7' -> '9780306406157'"""
+    return _SEPARATORS.sub('', value or '').upper()
+
+
+def is_isbn_shaped(value):
+    """True when `value` normalizes to 10 (last may be X) or 13 digits; checksum not verified"""
+    return bool(_ISBN_SHAPE.match(normalize_isbn(value)))
+
+
+def _isbn10_valid(isbn):
+    total = sum((10 - i) * (10 if ch == 'X' else int(ch)) for i, ch in enumerate(isbn))
+    return total % 11 == 0
+
+
+def _isbn13_valid(isbn):
+    total = sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(isbn))
+    return total % 10 == 0
+
+
+def is_valid_isbn(value):
+    """True for a checksum-valid ISBN-10 or ISBN-13 (hyphens and spaces allowed)"""
+    isbn = normalize_isbn(value)
+    if not _ISBN_SHAPE.match(isbn):
+        return False
+    return _isbn10_valid(isbn) if len(isbn) == 10 else _isbn13_valid(isbn)
+
+
+def isbn10_to_isbn13(isbn):
+    """Convert a normalized ISBN-10 to its 978-prefixed ISBN-13"""
+    core = '978' + isbn[:9]
+    check = (10 - sum(int(ch) * (1 if i % 2 == 0 else 3) for i, ch in enumerate(core)) % 10) % 10
+    return f'{core}{check}'
+
+
+def isbn13_to_isbn10(isbn):
+    """Convert a 978-prefixed ISBN-13 to ISBN-10, or None for other prefixes"""
+    if not isbn.startswith('978'):
+        return None
+    core = isbn[3:12]
+    check = (11 - sum((10 - i) * int(ch) for i, ch in enumerate(core)) % 11) % 11
+    return core + ('X' if check == 10 else str(check))
+
+
+def isbn_lookup_keys(value):
+    """
+    Normalized stored forms a search for `value` should match,
+    or an empty list when `value` is not a valid ISBN
+    """
+    if not is_valid_isbn(value):
+        return []
+    isbn = normalize_isbn(value)
+    if len(isbn) == 10:
+        return [isbn, isbn10_to_isbn13(isbn)]
+    isbn10 = isbn13_to_isbn10(isbn)
+    return [isbn, isbn10] if isbn10 else [isbn]
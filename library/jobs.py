@@ -0,0 +1,177 @@
+"""
+Database-backed job queue for Library Management System
+No external broker: jobs live in the Job table and `manage.py run_worker`
+claims them with SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL) or a
+compare-and-set UPDATE on backends without row locks (SQLite).
+
+Register a handler with the @job decorator and enqueue it by name:
+
+    @job('library.mark_overdue', every=timedelta(hours=1))
+    def mark_overdue():
+        ...
+
+    enqueue('library.mark_overdue')
+"""
+import logging
+import random
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    name: str
+    func: object
+    max_attempts: int
+    backoff: int
+    every: timedelta = None
+
+
+_registry = {}
+
+
+def job(name, max_attempts=3, backoff=30, every=None):
+    """
+    Register a job handler. Handlers receive the payload as keyword arguments.
+    backoff is the base retry delay in seconds (doubled per attempt);
+    every makes the job periodic.
+    """
+    def decorator(func):
+        _registry[name] = JobSpec(name, func, max_attempts, backoff, every)
+        return func
+    return decorator
+
+
+def registered_jobs():
+    return dict(_registry)
+
+
+def enqueue(name, payload=None, run_at=None, delay=None, max_attempts=None):
+    """Queue a registered job, optionally scheduled for run_at or after delay"""
+    spec = _registry[name]
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=run_at,
+        max_attempts=max_attempts or spec.max_attempts,
+    )
+
+
+def ensure_periodic():
+    """Queue one instance of every periodic job that has none queued or running"""
+    pending = set(
+        Job.objects.filter(
+            name__in=[spec.name for spec in _registry.values() if spec.every],
+            status__in=['queued', 'running'],
+        ).values_list('name', flat=True)
+    )
+    for spec in _registry.values():
+        if spec.every and spec.name not in pending:
+            enqueue(spec.name)
+
+
+def requeue_stale(older_than):
+    """Return jobs stuck in 'running' (worker died mid-job) to the queue"""
+    cutoff = timezone.now() - older_than
+    return Job.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='queued', locked_by='', run_at=timezone.now()
+    )
+
+
+def claim(limit, worker_id):
+    """Atomically move up to `limit` due jobs to 'running' and return them"""
+    now = timezone.now()
+    ready = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            jobs = list(ready.select_for_update(skip_locked=True)[:limit])
+            Job.objects.filter(pk__in=[j.pk for j in jobs]).update(
+                status='running', started_at=now, locked_by=worker_id,
+                attempts=F('attempts') + 1,
+            )
+    else:
+        # No row locks: claim each candidate with a guarded UPDATE, losers get 0 rows
+        jobs = []
+        for candidate in ready[:limit]:
+            won = Job.objects.filter(pk=candidate.pk, status='queued').update(
+                status='running', started_at=now, locked_by=worker_id,
+                attempts=F('attempts') + 1,
+            )
+            if won:
+                jobs.append(candidate)
+
+    for j in jobs:
+        j.status, j.started_at, j.locked_by, j.attempts = 'running', now, worker_id, j.attempts + 1
+    return jobs
+
+
+def run(job_obj):
+    """Execute a claimed job and record the outcome; never raises"""
+    spec = _registry.get(job_obj.name)
+    try:
+        if spec is None:
+            raise LookupError(f'No handler registered for {job_obj.name!r}')
+        spec.func(**job_obj.payload)
+    except Exception:
+        _record_failure(job_obj, spec, traceback.format_exc())
+    else:
+        Job.objects.filter(pk=job_obj.pk).update(
+            status='done', finished_at=timezone.now(), last_error=''
+        )
+        job_obj.status = 'done'
+    # Periodic jobs schedule their next run once this one is finished for good
+    if spec is not None and spec.every and job_obj.status in ('done', 'failed'):
+        enqueue(spec.name, delay=spec.every)
+
+
+def _record_failure(job_obj, spec, error):
+    now = timezone.now()
+    if spec is not None and job_obj.attempts < job_obj.max_attempts:
+        delay = spec.backoff * 2 ** (job_obj.attempts - 1)
+        delay *= random.uniform(0.8, 1.2)
+        status, run_at = 'queued', now + timedelta(seconds=delay)
+        logger.warning('Job %s failed (attempt %s), retrying in %.0fs', job_obj, job_obj.attempts, delay)
+    else:
+        status, run_at = 'failed', job_obj.run_at
+        logger.error('Job %s failed permanently:\n%s', job_obj, error)
+    Job.objects.filter(pk=job_obj.pk).update(
+        status=status, run_at=run_at, finished_at=now, locked_by='', last_error=error
+    )
+    job_obj.status = status
+
+
+def queue_stats(window=timedelta(hours=1)):
+    """
+    Queue depth and latency metrics:
+    ready/scheduled/running/failed counts, age of the oldest ready job,
+    and average wait (run_at -> started_at) and runtime over `window`
+    """
+    now = timezone.now()
+    counts = Job.objects.aggregate(
+        ready=Count('pk', filter=Q(status='queued', run_at__lte=now)),
+        scheduled=Count('pk', filter=Q(status='queued', run_at__gt=now)),
+        running=Count('pk', filter=Q(status='running')),
+        failed=Count('pk', filter=Q(status='failed')),
+        oldest_ready=Min('run_at', filter=Q(status='queued', run_at__lte=now)),
+    )
+    timings = Job.objects.filter(status='done', finished_at__gte=now - window).aggregate(
+        avg_wait=Avg(ExpressionWrapper(F('started_at') - F('run_at'), output_field=DurationField())),
+        avg_runtime=Avg(ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField())),
+    )
+    oldest = counts.pop('oldest_ready')
+    counts['oldest_ready_age'] = (now - oldest).total_seconds() if oldest else 0.0
+    for key, value in timings.items():
+        counts[f'{key}_seconds'] = value.total_seconds() if value is not None else None
+    return counts
@@ -0,0 +1,55 @@
+"""
+Django management command to move old returned loans to the archive table
+Usage: python manage.py archive_borrows [--days 180] [--batch-size 2000] [--dry-run]
+Each batch copies and deletes in one transaction, so it is safe to interrupt
+and rerun. Loans the rollup and recommendation jobs have not read yet stay put.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from library import archive
+
+
+class Command(BaseCommand):
+    help = 'Moves returned loans older than BORROW_ARCHIVE_AFTER_DAYS from BorrowRecord to BorrowArchive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.BORROW_ARCHIVE_AFTER_DAYS,
+            help='Archive loans returned more than this many days ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=archive.ARCHIVE_BATCH_SIZE,
+            help='Loans moved per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the loans that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        eligible = archive.archivable(before).count()
+        self.stdout.write(
+            f'{eligible} returned loans before {before:%Y-%m-%d} up to #{archive.archive_ceiling()} to archive'
+        )
+        if options['dry_run']:
+            return
+
+        started = time.monotonic()
+        moved = archive.archive_borrows(
+            before, options['batch_size'],
+            progress=lambda moved: self.stdout.write(f'  {moved}/{eligible} loans ({time.monotonic() - started:.1f}s)'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Archived {moved} loans in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,57 @@
+"""
+Django management command to benchmark the co-borrow neighbour computation
+Usage: python manage.py benchmark_recommendations [--loans 1000000] [--users 50000] [--books 100000]
+Uses synthetic loans with skewed book popularity (no database) and reports
+build time, top-K time per book and peak memory.
+"""
+import random
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.recommendations import CoBorrowMatrix
+
+
+def synthetic_loans(loans, users, books, seed):
+    rng = random.Random(seed)
+    per_user = max(1, loans // users)
+    for user_id in range(1, users + 1):
+        # Log-uniform book ids: roughly Zipfian popularity with a long tail
+        for _ in range(per_user):
+            yield user_id, int(books ** rng.random())
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks co-borrow recommendations at 1M-loan scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=50_000)
+        parser.add_argument('--books', type=int, default=100_000)
+        parser.add_argument('--neighbours', type=int, default=12)
+        parser.add_argument('--sample', type=int, default=2000, help='Books to time top-K for')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        matrix = CoBorrowMatrix()
+        matrix.add_loans(synthetic_loans(options['loans'], options['users'], options['books'], options['seed']))
+        load_s = time.perf_counter() - started
+        pairs = sum(len(basket) for basket in matrix.baskets.values())
+        self.stdout.write(
+            f'Loaded {pairs} distinct (reader, book) pairs, {len(matrix.borrowers)} books in {load_s:.1f}s'
+        )
+
+        rng = random.Random(options['seed'] + 1)
+        sample = rng.sample(sorted(matrix.borrowers), min(options['sample'], len(matrix.borrowers)))
+        started = time.perf_counter()
+        for book_id in sample:
+            matrix.neighbours(book_id, options['neighbours'])
+        per_book_ms = (time.perf_counter() - started) * 1000 / max(1, len(sample))
+        full_s = per_book_ms * len(matrix.borrowers) / 1000
+        peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            f'Top-{options["neighbours"]}: {per_book_ms:.2f} ms/book on a random sample '
+            f'(~{full_s:.0f}s for every book); peak RSS {peak_mib:.0f} MiB'
+        )
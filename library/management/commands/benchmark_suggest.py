@@ -0,0 +1,62 @@
+"""
+Django management command to benchmark the typeahead prefix index
+Usage: python manage.py benchmark_suggest [--size 1000000] [--queries 10000]
+Builds a PrefixIndex from synthetic titles (no database) and reports build
+time, approximate memory and lookup latency percentiles.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.suggest import PrefixIndex
+
+WORDS = (
+    'the of and a in to history war love night city river house garden secret '
+    'shadow light dark stone fire water king queen empire last first great little '
+    'lost silent winter summer road island world star ocean mountain forest'
+).split()
+
+
+def synthetic_rows(size, seed):
+    rng = random.Random(seed)
+    for pk in range(1, size + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).title()
+        yield f'b{pk}', f'{title} {pk % 97}'
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the in-memory suggestion index at catalog scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1_000_000, help='Synthetic titles to index')
+        parser.add_argument('--queries', type=int, default=10_000, help='Prefix lookups to time')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        size = options['size']
+        started = time.perf_counter()
+        index = PrefixIndex(max_entries=size)
+        index.build(synthetic_rows(size, options['seed']))
+        build_s = time.perf_counter() - started
+        self.stdout.write(
+            f'Built {len(index)} entries in {build_s:.1f}s, ~{index.memory_bytes() / 2**20:.0f} MiB'
+        )
+
+        rng = random.Random(options['seed'] + 1)
+        prefixes = [rng.choice(WORDS)[:rng.randint(2, 5)] for _ in range(options['queries'])]
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.search(prefix)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        pct = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]  # noqa: E731
+        self.stdout.write(
+            f'{len(timings)} lookups: p50 {pct(0.5):.3f} ms, p99 {pct(0.99):.3f} ms, max {timings[-1]:.3f} ms'
+        )
+
+        started = time.perf_counter()
+        for pk in range(1, 1001):
+            index.upsert(f'b{pk}', f'Renamed Title {pk}')
+        self.stdout.write(f'1000 incremental upserts in {(time.perf_counter() - started) * 1000:.0f} ms')
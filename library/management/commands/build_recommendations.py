@@ -0,0 +1,38 @@
+"""
+Django management command to compute "readers also borrowed" neighbours
+Usage: python manage.py build_recommendations [--full] [--neighbours 12]
+Without --full only books touched by loans since the last run are recounted
+(the same work as the hourly `library.refresh_recommendations` job).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Builds co-borrow neighbour lists for book_detail recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Recount every book from the whole loan history',
+        )
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=None,
+            help='Neighbours kept per book (default RECOMMENDATION_NEIGHBOURS)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['full']:
+            written = recommendations.build_recommendations(options['neighbours'])
+        else:
+            written = recommendations.refresh_recommendations(options['neighbours'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Wrote neighbours for {written} books in {time.monotonic() - started:.1f}s'
+        ))
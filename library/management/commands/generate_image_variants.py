@@ -0,0 +1,83 @@
+"""
+Django management command to backfill resized image variants
+Usage: python manage.py generate_image_variants [--workers 4] [--force]
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from library.images import generate_variants
+from library.models import Book, UserProfile
+
+
+def _init_worker():
+    """Configure Django in pool processes started with the spawn method"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+def _process(args):
+    name, force = args
+    try:
+        return name, generate_variants(name, force=force), None
+    except Exception as exc:
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Generates WebP/JPEG variants for existing cover images and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes (default: CPU count)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants that already exist',
+        )
+
+    def collect_names(self):
+        """All non-empty image names, read in one pass per table"""
+        names = set(
+            Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+            .values_list('cover_image', flat=True).iterator()
+        )
+        names.update(
+            UserProfile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+            .values_list('profile_picture', flat=True).iterator()
+        )
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        names = self.collect_names()
+        total = len(names)
+        self.stdout.write(f'Processing {total} images with {options["workers"]} workers...')
+
+        started = time.monotonic()
+        done = written = failed = 0
+        tasks = [(name, options['force']) for name in names]
+        # Database connections are not shared with the pool; workers only touch storage
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            for name, count, error in pool.map(_process, tasks, chunksize=16):
+                done += 1
+                written += count
+                if error:
+                    failed += 1
+                    self.stderr.write(f'  {name}: {error}')
+                if done % 100 == 0:
+                    rate = done / (time.monotonic() - started)
+                    self.stdout.write(f'  {done}/{total} images ({rate:.1f} images/s)')
+
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {done} images, {written} variants written, {failed} failed '
+            f'in {elapsed:.1f}s ({rate:.1f} images/s)'
+        ))
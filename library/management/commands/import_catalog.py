@@ -0,0 +1,101 @@
+"""
+Django management command to bulk-load books from a catalog file
+Usage: python manage.py import_catalog books.csv [--format csv|jsonl|marc] [--batch-size 1000] [--dry-run]
+CSV columns: isbn, title, author, publication_date (YYYY or YYYY-MM-DD), and
+optionally categories (separated by ; or |), pages, copies, description.
+JSON Lines records use the same keys. Existing ISBNs are updated in place.
+"""
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import catalog_import
+
+REJECTS_SHOWN = 10
+
+
+class Command(BaseCommand):
+    help = 'Streams books from a CSV, JSON Lines or MARC text file into the catalog, upserting by ISBN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin (needs --format)')
+        parser.add_argument(
+            '--format',
+            choices=catalog_import.FORMATS,
+            help='File format (default: from the extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=catalog_import.IMPORT_BATCH_SIZE,
+            help='Records upserted per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate and count what would be created or updated without writing',
+        )
+        parser.add_argument(
+            '--rejects',
+            help='Write rejected records (line, reason) to this CSV file',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Upsert through the ORM even on PostgreSQL',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+            help='Input file encoding',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading stdin')
+        try:
+            fmt = options['format'] or catalog_import.detect_format(path)
+            fh = sys.stdin if path == '-' else open(path, encoding=options['encoding'], newline='')
+        except (ValueError, OSError) as exc:
+            raise CommandError(exc)
+
+        importer = catalog_import.CatalogImporter(
+            options['batch_size'], dry_run=options['dry_run'], use_copy=False if options['no_copy'] else None,
+        )
+        mode = 'dry run' if options['dry_run'] else 'COPY' if importer.use_copy else 'ORM upsert'
+        self.stdout.write(f'Importing {path} ({fmt}, {mode}, batches of {options["batch_size"]})')
+
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'  {result.rows} records ({result.rows / max(elapsed, 1e-6):.0f}/s)')
+
+        with fh:
+            result = importer.run(catalog_import.read_records(fh, fmt), progress)
+        elapsed = time.monotonic() - started
+
+        if options['rejects'] and result.rejects:
+            with open(options['rejects'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'reason'])
+                writer.writerows(result.rejects)
+        for line_no, reason in result.rejects[:REJECTS_SHOWN]:
+            self.stdout.write(self.style.WARNING(f'  line {line_no}: {reason}'))
+        if len(result.rejects) > REJECTS_SHOWN:
+            self.stdout.write(self.style.WARNING(f'  ... {len(result.rejects) - REJECTS_SHOWN} more rejects'))
+
+        summary = (
+            f'{result.created} books created, {result.updated} updated, '
+            f'{result.authors_created} new authors, {result.categories_created} new categories, '
+            f'{len(result.rejects)} rejected'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'✓ Dry run of {result.rows} records: {summary} (nothing written)'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Imported {result.rows} records in {elapsed:.1f}s ({result.rows / max(elapsed, 1e-6):.0f} rows/s): {summary}'
+        ))
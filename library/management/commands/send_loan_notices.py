@@ -0,0 +1,45 @@
+"""
+Django management command to send due-date reminders and overdue notices
+Usage: python manage.py send_loan_notices [--kind due_soon|overdue] [--chunk-size 500] [--dry-run]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from library.notifications import NOTICE_KINDS, send_loan_notices
+
+
+class Command(BaseCommand):
+    help = 'Emails due-soon reminders and overdue notices in batches, skipping loans already notified'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=NOTICE_KINDS,
+            action='append',
+            help='Notice kind to send (repeatable, default: all)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Loans per batch / email connection',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count pending notices without sending or recording them',
+        )
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or NOTICE_KINDS:
+            started = time.monotonic()
+            result = send_loan_notices(kind, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+            verb = 'would send' if options['dry_run'] else 'sent'
+            style = self.style.SUCCESS if not result.failed else self.style.WARNING
+            self.stdout.write(style(
+                f'✓ {kind}: {verb} {result.sent}, failed {result.failed} '
+                f'in {result.batches} batches ({time.monotonic() - started:.1f}s)'
+            ))
+            for error in result.errors:
+                self.stderr.write(f'  {error}')
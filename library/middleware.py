@@ -0,0 +1,25 @@
+"""
+Middleware for Library Management System
+"""
+from . import health
+
+
+class HealthCheckMiddleware:
+    """
+    Answer probe paths before the rest of the middleware stack runs,
+    so health checks never touch sessions, messages, CSRF or HTTPS redirects.
+    Must be listed first in MIDDLEWARE.
+    """
+    probes = {
+        '/healthz': health.healthz,
+        '/readyz': health.readyz,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        probe = self.probes.get(request.path_info.rstrip('/'))
+        if probe is not None and request.method in ('GET', 'HEAD'):
+            return probe(request)
+        return self.get_response(request)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanNotice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_soon', 'Due soon'), ('overdue', 'Overdue')], max_length=20)),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('borrow_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notices', to='library.borrowrecord')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='loannotice',
+            constraint=models.UniqueConstraint(fields=('borrow_record', 'kind'), name='unique_notice_per_loan'),
+        ),
+    ]
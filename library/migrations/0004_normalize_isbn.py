@@ -0,0 +1,44 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+SEPARATORS = re.compile(r'[\s\-]')
+
+
+def normalize_isbns(apps, schema_editor):
+    """Strip hyphens/spaces from stored ISBNs, batching by pk; rows that would collide are left as-is"""
+    Book = apps.get_model('library', 'Book')
+    last_pk = 0
+    while True:
+        batch = list(
+            Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'isbn')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        changed = {}
+        for pk, isbn in batch:
+            normalized = SEPARATORS.sub('', isbn).upper()
+            if normalized != isbn:
+                changed[pk] = normalized
+        if not changed:
+            continue
+        taken = set(Book.objects.filter(isbn__in=changed.values()).values_list('isbn', flat=True))
+        rows = []
+        for pk, normalized in changed.items():
+            if normalized not in taken:
+                taken.add(normalized)
+                rows.append(Book(pk=pk, isbn=normalized))
+        Book.objects.bulk_update(rows, ['isbn'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_loannotice'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_isbns, migrations.RunPython.noop),
+    ]
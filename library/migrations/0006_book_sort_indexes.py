@@ -0,0 +1,49 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_catalogchange'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='book',
+            name='library_boo_title_c38ef2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='library_boo_created_909d70_idx',
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name', 'id'], name='library_aut_name_f479f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'id'], name='library_boo_title_b4b861_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-created_at', '-id'], name='library_boo_created_d8b71e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'title', 'id'], name='library_boo_author__981527_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-publication_date', '-id'], name='library_boo_publica_330fe0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-available_copies', '-id'], name='library_boo_availab_ad6d52_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['-created_at', '-id'], name='book_available_newest_idx'),
+        ),
+    ]
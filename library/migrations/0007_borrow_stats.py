@@ -0,0 +1,93 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_book_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PopularBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board', models.CharField(choices=[('week', 'Most borrowed this week'), ('trending', 'Trending')], max_length=20)),
+                ('rank', models.PositiveIntegerField()),
+                ('borrows', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'ordering': ['board', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategoryBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_borrows', to='library.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyBookBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_borrows', to='library.book')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyAuthorBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_borrows', to='library.author')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='popularbook',
+            constraint=models.UniqueConstraint(fields=('board', 'rank'), name='unique_board_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycategoryborrows',
+            index=models.Index(fields=['day', 'category'], name='library_dai_day_27281e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategoryborrows',
+            constraint=models.UniqueConstraint(fields=('category', 'day'), name='unique_category_borrow_day'),
+        ),
+        migrations.AddIndex(
+            model_name='dailybookborrows',
+            index=models.Index(fields=['day', 'book'], name='library_dai_day_5a0f2f_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailybookborrows',
+            constraint=models.UniqueConstraint(fields=('book', 'day'), name='unique_book_borrow_day'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyauthorborrows',
+            index=models.Index(fields=['day', 'author'], name='library_dai_day_c9a31c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyauthorborrows',
+            constraint=models.UniqueConstraint(fields=('author', 'day'), name='unique_author_borrow_day'),
+        ),
+    ]
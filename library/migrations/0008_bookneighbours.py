@@ -0,0 +1,26 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_borrow_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbours',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='neighbours', serialize=False, to='library.book')),
+                ('neighbours', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Book neighbours',
+            },
+        ),
+    ]
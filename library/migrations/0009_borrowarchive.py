@@ -0,0 +1,34 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('library', '0008_bookneighbours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('borrow_date', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('return_date', models.DateTimeField()),
+                ('notes', models.TextField(blank=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to='library.book')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_borrows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-borrow_date', '-id'],
+                'indexes': [models.Index(fields=['user', '-borrow_date', '-id'], name='archive_user_history_idx'), models.Index(fields=['book'], name='library_bor_book_id_0d7dd2_idx')],
+            },
+        ),
+    ]
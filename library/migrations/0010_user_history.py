@@ -0,0 +1,37 @@
+# Generated by Django 4.2.9 on 2026-10-18 22:55
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_archived_loans(apps, schema_editor):
+    """Seed UserProfile.archived_loans from loans archived before the counter existed"""
+    BorrowArchive = apps.get_model('library', 'BorrowArchive')
+    UserProfile = apps.get_model('library', 'UserProfile')
+    counts = BorrowArchive.objects.order_by().values('user').annotate(n=Count('pk')).values_list('user', 'n')
+    for user_id, n in counts.iterator():
+        UserProfile.objects.update_or_create(user_id=user_id, defaults={'archived_loans': n})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_borrowarchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['user', 'status', '-borrow_date', '-id'], name='borrow_user_status_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='borrowrecord',
+            name='library_bor_user_id_7e8e6a_idx',
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='archived_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_archived_loans, migrations.RunPython.noop),
+    ]
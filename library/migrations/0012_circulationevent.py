@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CirculationEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('occurred_at', models.DateTimeField()),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Borrowed'), (2, 'Returned'), (3, 'Marked overdue'), (4, 'Copies adjusted'), (5, 'Loan edited')])),
+                ('book_id', models.PositiveIntegerField()),
+                ('user_id', models.PositiveIntegerField(null=True)),
+                ('loan_id', models.BigIntegerField(null=True)),
+                ('actor_id', models.PositiveIntegerField(null=True)),
+                ('delta', models.SmallIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occurred_at'], name='event_time_idx'), models.Index(fields=['book_id', 'occurred_at'], name='event_book_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.9 on 2026-10-18 23:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_circulationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorUtilization',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='library.author')),
+                ('books', models.PositiveIntegerField()),
+                ('total_copies', models.IntegerField()),
+                ('available_copies', models.IntegerField()),
+                ('utilization', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyLibraryBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('overdue', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily library borrows',
+            },
+        ),
+        migrations.AddField(
+            model_name='dailyauthorborrows',
+            name='overdue',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailybookborrows',
+            name='overdue',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailycategoryborrows',
+            name='overdue',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='dailylibraryborrows',
+            constraint=models.UniqueConstraint(fields=('day',), name='unique_library_borrow_day'),
+        ),
+        migrations.AddIndex(
+            model_name='authorutilization',
+            index=models.Index(fields=['-utilization', 'author'], name='author_utilization_idx'),
+        ),
+    ]
@@ -1,11 +1,13 @@
 """
 Models for Library Management System
-Includes: Author, Category, Book, BorrowRecord
+Includes: Author, Category, Book, BorrowRecord, Hold, LoanNotice, UserProfile, Job, CatalogChange,
+borrow statistics rollups (Daily*Borrows, PopularBook, StatsCursor), BookNeighbours, BorrowArchive
 Relationships: Many-to-One (Book-Author), Many-to-Many (Book-Category, User-Book via BorrowRecord)
 """
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .isbn import normalize_isbn
 
 
 class Author(models.Model):
@@ -19,6 +21,9 @@ class Author(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -44,6 +49,24 @@ class Category(models.Model):
         return self.books.count()
 
 
+class BookQuerySet(models.QuerySet):
+    # Columns rendered by book cards (book_list, home, author_detail), plus every
+    # SORT_ORDERINGS key the keyset paginator reads for cursors; skips description
+    CARD_FIELDS = (
+        'id', 'title', 'isbn', 'publication_date', 'available_copies', 'cover_image', 'created_at',
+        'author__id', 'author__name',
+    )
+
+    def for_cards(self, with_categories=False):
+        """Column-projected rows for list pages; detail views should use the full row"""
+        queryset = self.select_related('author').only(*self.CARD_FIELDS)
+        if with_categories:
+            queryset = queryset.prefetch_related(
+                models.Prefetch('categories', queryset=Category.objects.only('id', 'name'))
+            )
+        return queryset
+
+
 class Book(models.Model):
     """
     Book model with relationships:
@@ -71,18 +94,44 @@ class Book(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
+
+    # book_list sort modes: (label, keyset ordering). Each ordering has a matching
+    # index below (author sort: Author (name, id) then Book (author, title, id))
+    SORT_ORDERINGS = {
+        'newest': ('Newest', ('-created_at', '-id')),
+        'title': ('Title', ('title', 'id')),
+        'published': ('Publication date', ('-publication_date', '-id')),
+        'author': ('Author', ('author__name', 'author_id', 'title', 'id')),
+        'available': ('Most available', ('-available_copies', '-id')),
+    }
+
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['isbn']),
-            models.Index(fields=['title']),
-            models.Index(fields=['-created_at']),
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['-created_at', '-id']),
             models.Index(fields=['author', '-created_at']),
+            models.Index(fields=['author', 'title', 'id']),
+            models.Index(fields=['-publication_date', '-id']),
+            models.Index(fields=['-available_copies', '-id']),
+            # "Available only" listing; stays small when most copies are out
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(available_copies__gt=0),
+                name='book_available_newest_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.title} by {self.author.name}"
 
+    def save(self, *args, **kwargs):
+        # Stored without hyphens/spaces so ISBN search is a unique-index lookup
+        self.isbn = normalize_isbn(self.isbn)
+        super().save(*args, **kwargs)
+
     def is_available(self):
         return self.available_copies > 0
 
@@ -97,6 +146,8 @@ class BorrowRecord(models.Model):
         ('returned', 'Returned'),
         ('overdue', 'Overdue'),
     ]
+    # Loans that still hold a copy of the book
+    ACTIVE_STATUSES = ('borrowed', 'overdue')
 
     user = models.ForeignKey(
         User,
@@ -121,7 +172,8 @@ class BorrowRecord(models.Model):
     class Meta:
         ordering = ['-borrow_date']
         indexes = [
-            models.Index(fields=['user', 'status']),
+            # Active loans by (user, status); history pages seek on the trailing keys
+            models.Index(fields=['user', 'status', '-borrow_date', '-id'], name='borrow_user_status_idx'),
             models.Index(fields=['book', 'status']),
             models.Index(fields=['-borrow_date']),
             models.Index(fields=['status', 'due_date']),
@@ -131,10 +183,79 @@ class BorrowRecord(models.Model):
         return f"{self.user.username} - {self.book.title} ({self.status})"
 
     def is_overdue(self):
+        if self.status == 'overdue':
+            return True
         if self.status == 'borrowed' and self.due_date < timezone.now():
             return True
         return False
 
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
+class Hold(models.Model):
+    """
+    A place in a book's waiting list. The id is the queue position: the next
+    holder is the lowest waiting id for the book, one probe of hold_queue_idx.
+    A 'ready' hold has a returned copy set aside until expires_at.
+    """
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('ready', 'Ready for pickup'),
+        ('fulfilled', 'Fulfilled'),
+        ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
+    ]
+    OPEN_STATUSES = ('waiting', 'ready')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='holds')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    created_at = models.DateTimeField(default=timezone.now)
+    ready_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['book', 'status', 'id'], name='hold_queue_idx'),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['status', 'expires_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'], condition=models.Q(status__in=['waiting', 'ready']), name='unique_open_hold',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title} ({self.status})"
+
+
+class LoanNotice(models.Model):
+    """Records a due-date reminder or overdue notice sent for a loan, so reruns don't resend"""
+    KIND_CHOICES = [
+        ('due_soon', 'Due soon'),
+        ('overdue', 'Overdue'),
+    ]
+
+    borrow_record = models.ForeignKey(
+        BorrowRecord,
+        on_delete=models.CASCADE,
+        related_name='notices'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    sent_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['borrow_record', 'kind'], name='unique_notice_per_loan'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} notice for loan #{self.borrow_record_id}"
+
 
 class UserProfile(models.Model):
     """Extended user profile"""
@@ -144,6 +265,270 @@ class UserProfile(models.Model):
     date_of_birth = models.DateField(null=True, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Loans moved to BorrowArchive, counted by library.archive as it moves them
+    archived_loans = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database and executed by `manage.py run_worker`
+    Claimed with SELECT ... FOR UPDATE SKIP LOCKED where the backend supports it
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['name', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class CatalogChange(models.Model):
+    """
+    Append-only log of Book/Author saves and deletes (and Book category
+    links), written by signals and by bulk operations that bypass them.
+    The newest id is the catalog version stamp; per-worker suggestion indexes
+    replay entries past the id they last saw instead of rebuilding, and
+    cached search results are keyed on it.
+    """
+    KIND_CHOICES = [
+        ('book', 'Book'),
+        ('author', 'Author'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} changed (v{self.pk})"
+
+
+class CirculationEvent(models.Model):
+    """
+    Append-only circulation audit log, written in batches by library.events
+    after the originating transaction commits. References are plain integers,
+    not foreign keys: inserts take no locks on loans or books, and the log
+    outlives deleted books, users and archived loans.
+    """
+    BORROWED, RETURNED, OVERDUE, COPIES_ADJUSTED, LOAN_EDITED = range(1, 6)
+    KIND_CHOICES = [
+        (BORROWED, 'Borrowed'),
+        (RETURNED, 'Returned'),
+        (OVERDUE, 'Marked overdue'),
+        (COPIES_ADJUSTED, 'Copies adjusted'),
+        (LOAN_EDITED, 'Loan edited'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    occurred_at = models.DateTimeField()
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    book_id = models.PositiveIntegerField()
+    user_id = models.PositiveIntegerField(null=True)  # the patron
+    loan_id = models.BigIntegerField(null=True)  # BorrowRecord / BorrowArchive id
+    actor_id = models.PositiveIntegerField(null=True)  # staff user, when not the patron or a job
+    delta = models.SmallIntegerField(default=0)  # copies added or removed
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['occurred_at'], name='event_time_idx'),
+            models.Index(fields=['book_id', 'occurred_at'], name='event_book_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} book #{self.book_id} at {self.occurred_at:%Y-%m-%d %H:%M}"
+
+
+class DailyBorrows(models.Model):
+    """Loans started and loans flagged overdue per day; rows are added to by library.stats, never recomputed"""
+    day = models.DateField()
+    borrows = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyBookBorrows(DailyBorrows):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_borrows')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'day'], name='unique_book_borrow_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'book']),
+        ]
+
+
+class DailyAuthorBorrows(DailyBorrows):
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='daily_borrows')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'day'], name='unique_author_borrow_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'author']),
+        ]
+
+
+class DailyCategoryBorrows(DailyBorrows):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_borrows')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='unique_category_borrow_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category']),
+        ]
+
+
+class DailyLibraryBorrows(DailyBorrows):
+    """Library-wide totals, so loans per day or week read one row per day"""
+
+    class Meta:
+        verbose_name_plural = 'Daily library borrows'
+        constraints = [
+            models.UniqueConstraint(fields=['day'], name='unique_library_borrow_day'),
+        ]
+
+
+class PopularBook(models.Model):
+    """Precomputed top-N leaderboards; pages read the first N ranks of a board"""
+    BOARD_CHOICES = [
+        ('week', 'Most borrowed this week'),
+        ('trending', 'Trending'),
+    ]
+
+    board = models.CharField(max_length=20, choices=BOARD_CHOICES)
+    rank = models.PositiveIntegerField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    borrows = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['board', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'rank'], name='unique_board_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_board_display()} #{self.rank}: book #{self.book_id}"
+
+
+class StatsCursor(models.Model):
+    """
+    High-water mark: the last BorrowRecord id an incremental job (rollups,
+    recommendations) has seen, or the last CirculationEvent id for the overdue rollups
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at #{self.last_id}"
+
+
+class BookNeighbours(models.Model):
+    """
+    "Readers also borrowed" for one book: [[book id, score], ...] best first,
+    computed offline by library.recommendations from co-borrow counts
+    """
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='neighbours')
+    neighbours = models.JSONField(default=list)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'Book neighbours'
+
+    def __str__(self):
+        return f"Neighbours of book #{self.book_id}"
+
+
+class AuthorUtilization(models.Model):
+    """
+    Copies per author (utilization = share of copies off the shelf),
+    recomputed by library.reports so the reporting view never groups Book
+    """
+    author = models.OneToOneField(Author, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    books = models.PositiveIntegerField()
+    total_copies = models.IntegerField()
+    available_copies = models.IntegerField()
+    utilization = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-utilization', 'author'], name='author_utilization_idx'),
+        ]
+
+    def __str__(self):
+        return f"Author #{self.author_id}: {self.utilization:.0%} utilized"
+
+
+class BorrowArchive(models.Model):
+    """
+    Returned loans moved off BorrowRecord by library.archive; keeps the
+    original loan id, so the hot table only holds active and recent loans
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_borrows')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='archived_borrows')
+    borrow_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    return_date = models.DateTimeField()
+    notes = models.TextField(blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    # Same interface as a returned BorrowRecord for templates
+    status = 'returned'
+
+    class Meta:
+        ordering = ['-borrow_date', '-id']
+        indexes = [
+            models.Index(fields=['user', '-borrow_date', '-id'], name='archive_user_history_idx'),
+            models.Index(fields=['book']),
+        ]
+
+    def __str__(self):
+        return f"Archived loan #{self.id}"
+
+    def get_status_display(self):
+        return 'Returned'
+
+    def is_overdue(self):
+        return False
+
+    def is_active(self):
+        return False
@@ -0,0 +1,137 @@
+"""
+Due-date reminders, overdue notices and hold pickup notices for Library Management System
+Loans are streamed through the (status, due_date) index in keyset-paginated
+chunks, and each chunk is sent over one reused email connection.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import BorrowRecord, Hold, LoanNotice
+
+logger = logging.getLogger(__name__)
+
+NOTICE_KINDS = ('due_soon', 'overdue')
+
+
+@dataclass
+class NoticeResult:
+    kind: str
+    sent: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: list = field(default_factory=list)
+
+
+def pending_loans(kind, now=None):
+    """Active loans that need a `kind` notice and have not received one"""
+    now = now or timezone.now()
+    if kind == 'due_soon':
+        window = Q(status='borrowed', due_date__gte=now,
+                   due_date__lt=now + timedelta(days=settings.LOAN_REMINDER_DAYS))
+    elif kind == 'overdue':
+        window = Q(status__in=BorrowRecord.ACTIVE_STATUSES, due_date__lt=now)
+    else:
+        raise ValueError(f'Unknown notice kind {kind!r}')
+
+    already_sent = LoanNotice.objects.filter(borrow_record=OuterRef('pk'), kind=kind)
+    return (
+        BorrowRecord.objects.filter(window)
+        .exclude(user__email='')
+        .filter(~Exists(already_sent))
+        .select_related('user', 'book', 'book__author')
+        .only('id', 'due_date', 'status', 'user__username', 'user__first_name', 'user__email',
+              'book__id', 'book__title', 'book__author__name')
+        .order_by('due_date', 'id')
+    )
+
+
+def _iter_chunks(queryset, chunk_size):
+    """Keyset pagination on (due_date, id) so every chunk is an index range scan"""
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(Q(due_date__gt=last.due_date) | Q(due_date=last.due_date, id__gt=last.id))
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]
+
+
+def build_message(kind, record):
+    context = {'record': record, 'user': record.user, 'book': record.book, 'site_name': 'Library Management System'}
+    subject = render_to_string(f'library/emails/{kind}_subject.txt', context).strip()
+    body = render_to_string(f'library/emails/{kind}_body.txt', context)
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [record.user.email])
+
+
+def send_loan_notices(kind, chunk_size=500, now=None, dry_run=False):
+    """
+    Send `kind` notices for every pending loan. Each chunk is sent over one
+    connection and recorded in LoanNotice only after the send succeeds.
+    """
+    now = now or timezone.now()
+    result = NoticeResult(kind)
+    for rows in _iter_chunks(pending_loans(kind, now), chunk_size):
+        result.batches += 1
+        if dry_run:
+            result.sent += len(rows)
+            continue
+        messages = [build_message(kind, record) for record in rows]
+        try:
+            with get_connection(fail_silently=False) as connection:
+                sent = connection.send_messages(messages) or 0
+        except Exception as exc:
+            logger.exception('Sending %s notices failed for a batch of %s', kind, len(rows))
+            result.failed += len(rows)
+            result.errors.append(str(exc))
+            continue
+        LoanNotice.objects.bulk_create(
+            [LoanNotice(borrow_record_id=record.id, kind=kind, sent_at=now) for record in rows],
+            ignore_conflicts=True,
+        )
+        result.sent += sent
+    return result
+
+
+def send_hold_notices(chunk_size=500, now=None):
+    """
+    Email holders whose copy is ready for pickup, a chunk per connection, and
+    stamp notified_at after each successful send. Allocation on return only
+    marks holds ready; this job is what talks to the mail server.
+    """
+    now = now or timezone.now()
+    result = NoticeResult('hold_ready')
+    pending = (
+        Hold.objects.filter(status='ready', notified_at__isnull=True)
+        .exclude(user__email='')
+        .select_related('user', 'book', 'book__author')
+        .only('id', 'expires_at', 'user__username', 'user__first_name', 'user__email',
+              'book__id', 'book__title', 'book__author__name')
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        rows = list(pending.filter(id__gt=last_id)[:chunk_size])
+        if not rows:
+            return result
+        last_id = rows[-1].id
+        result.batches += 1
+        try:
+            with get_connection(fail_silently=False) as connection:
+                sent = connection.send_messages([build_message('hold_ready', hold) for hold in rows]) or 0
+        except Exception as exc:
+            logger.exception('Sending hold notices failed for a batch of %s', len(rows))
+            result.failed += len(rows)
+            result.errors.append(str(exc))
+            continue
+        Hold.objects.filter(pk__in=[hold.id for hold in rows]).update(notified_at=now)
+        result.sent += sent
@@ -0,0 +1,231 @@
+"""
+Paginators for large tables
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .counting import count_with_estimate_flag
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose total comes from planner statistics on big tables
+    and that fetches pages with a deferred join: the OFFSET scan walks only
+    primary keys, then the full rows for that page are loaded by pk.
+    """
+
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimate = count_with_estimate_flag(self.object_list)
+        return count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        pks = list(self.object_list.values_list('pk', flat=True)[bottom:top])
+        # Re-applying the queryset's ordering to one page of pks is cheap
+        return self._get_page(self.object_list.filter(pk__in=pks), number, self)
+
+
+def _cursor_value(value):
+    # Full isoformat: DjangoJSONEncoder drops microseconds, which would break ties
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, with cursors for its neighbours"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        return self.paginator.cursor_for(self.object_list[-1]) if self.has_next() else None
+
+    @property
+    def previous_cursor(self):
+        return self.paginator.cursor_for(self.object_list[0]) if self.has_previous() else None
+
+
+class KeysetPaginator:
+    """
+    Cursor (keyset) pagination: a page continues from the sort key of the row
+    it follows, so it is an index range scan however deep the reader goes.
+    `ordering` is all ascending or all descending ('-field') and must end in a
+    unique tiebreaker such as 'id'. Totals, when shown, come from `count`.
+    """
+
+    def __init__(self, object_list, ordering, per_page):
+        self.object_list = object_list
+        self.per_page = per_page
+        self.descending = ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in ordering]
+        if any(name.startswith('-') != self.descending for name in ordering):
+            raise ValueError('Keyset ordering must use one direction for every field')
+        self._model_fields = [self._resolve(name) for name in self.fields]
+
+    def _resolve(self, path):
+        model = self.object_list.model
+        *relations, name = path.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        count, self.count_is_estimate = count_with_estimate_flag(self.object_list)
+        return count
+
+    def sort_key(self, obj):
+        values = []
+        for path in self.fields:
+            value = obj
+            for attr in path.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def cursor_for(self, obj):
+        return base64.urlsafe_b64encode(json.dumps(self.sort_key(obj), default=_cursor_value).encode()).decode()
+
+    def _decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                return None
+            values = [field.to_python(value) for field, value in zip(self._model_fields, values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+        # Sort keys are never NULL; a null here is a crafted cursor, and __gte=None would raise
+        return None if None in values else values
+
+    def _seek(self, values, forward):
+        # (a, b, id) > (x, y, z) spelled out for the ORM, with a leading a >= x
+        # so the planner gets a plain index range to start from
+        op = 'lt' if forward == self.descending else 'gt'
+        pairs = list(zip(self.fields, values))
+        name, value = pairs[-1]
+        condition = Q(**{f'{name}__{op}': value})
+        for name, value in reversed(pairs[:-1]):
+            condition = Q(**{f'{name}__{op}': value}) | (Q(**{name: value}) & condition)
+        first_name, first_value = pairs[0]
+        return Q(**{f'{first_name}__{op}e': first_value}) & condition
+
+    def _ordering(self, forward):
+        prefix = '-' if forward == self.descending else ''
+        return [prefix + name for name in self.fields]
+
+    def queryset_for(self, after=None, before=None):
+        """(queryset for one page plus a look-ahead row, forward?, cursor values or None)"""
+        after = self._decode(after) if after else None
+        before = self._decode(before) if before else None
+        forward = before is None
+        queryset = self.object_list.order_by(*self._ordering(forward))
+        cursor = after if forward else before
+        if cursor is not None:
+            queryset = queryset.filter(self._seek(cursor, forward))
+        return queryset[:self.per_page + 1], forward, cursor
+
+    def page(self, after=None, before=None):
+        """The first page, the page after cursor `after`, or the page before cursor `before`"""
+        queryset, forward, cursor = self.queryset_for(after, before)
+        return self._page(list(queryset), forward, cursor)
+
+    def page_of_ids(self, ids, after=None, before=None, complete=True, queryset=None):
+        """
+        The same page as page(), cut from `ids`: every matching pk in this
+        paginator's order (e.g. a cached result). Only the visible rows are
+        loaded, with one in_bulk query on `queryset` (default object_list;
+        pass an unfiltered one when the ids already apply the filters).
+        None when the cursor row is not in `ids`, or when an incomplete
+        (truncated) list runs out before the page does; fall back to page() then.
+        """
+        anchor = None
+        if after or before:
+            values = self._decode(after or before)
+            try:
+                anchor = ids.index(values[-1]) if values else None
+            except ValueError:
+                pass
+            if anchor is None:
+                return None
+        if before:
+            start, end = max(0, anchor - self.per_page), anchor
+        else:
+            start = 0 if anchor is None else anchor + 1
+            end = start + self.per_page
+        if not complete and end >= len(ids):
+            return None
+        if complete:
+            # The whole result is known: no COUNT query for the total
+            self.count = len(ids)
+        visible = ids[start:end]
+        rows = (self.object_list if queryset is None else queryset).in_bulk(visible)
+        return KeysetPage([rows[pk] for pk in visible if pk in rows], self,
+                          has_next=bool(before) or end < len(ids), has_previous=start > 0)
+
+    def _page(self, rows, forward, cursor):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return KeysetPage(rows, self, has_next=has_more, has_previous=cursor is not None)
+        rows.reverse()
+        return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """
+    Keyset pagination over several querysets that share one ordering, such as
+    a hot table and its archive: each page is one bounded range scan per
+    source, merged in Python, which gives the same rows as paging a UNION.
+    Keys must be unique across the sources.
+    """
+
+    def __init__(self, sources, ordering, per_page):
+        super().__init__(sources[0], ordering, per_page)
+        self.sources = [KeysetPaginator(source, ordering, per_page) for source in sources]
+
+    @cached_property
+    def count(self):
+        counts = [source.count for source in self.sources]
+        self.count_is_estimate = any(source.count_is_estimate for source in self.sources)
+        return sum(counts)
+
+    def page(self, after=None, before=None):
+        rows = []
+        for source in self.sources:
+            queryset, forward, cursor = source.queryset_for(after, before)
+            rows.extend(queryset)
+        # Rows in the direction they were read: walking forward over a descending order is largest first
+        rows.sort(key=self.sort_key, reverse=forward == self.descending)
+        return self._page(rows, forward, cursor)
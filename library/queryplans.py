@@ -0,0 +1,137 @@
+"""
+Query-plan checks for Library Management System
+Runs EXPLAIN on captured SQL (PostgreSQL JSON plans, or SQLite's
+EXPLAIN QUERY PLAN) and reports sequential scans of big tables and sorts
+over more rows than a page needs. SQLite plans carry no row estimates, so
+they are derived from sqlite_stat1 after ANALYZE. Used by the plan
+regression tests.
+"""
+import difflib
+import json
+import re
+
+from django.db import connection as default_connection
+
+# SQLite plan lines: "SCAN t", "SCAN t USING INDEX i", "SEARCH t USING [COVERING] INDEX i (a=? AND b>?)"
+_SQLITE_ACCESS = re.compile(
+    r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:(INTEGER PRIMARY KEY)|(?:COVERING )?INDEX (\w+)))?(?: \((.*)\))?'
+)
+
+
+def table_sizes(tables, connection=default_connection):
+    """Exact row count per table (the seeded test dataset, not production)"""
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+def explain(sql, connection=default_connection):
+    """Plan for one captured (already interpolated) SELECT, as readable lines plus raw nodes"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            lines = []
+            _pg_lines(plan[0]['Plan'], 0, lines)
+            return lines, plan[0]['Plan']
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        rows = cursor.fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines, rows
+
+
+def _pg_lines(node, depth, lines):
+    relation = f" on {node['Relation Name']}" if 'Relation Name' in node else ''
+    index = f" using {node['Index Name']}" if 'Index Name' in node else ''
+    lines.append(f"{'  ' * depth}{node['Node Type']}{relation}{index} (rows={node.get('Plan Rows')})")
+    for child in node.get('Plans', []):
+        _pg_lines(child, depth + 1, lines)
+
+
+def _pg_relations(node):
+    found = {node['Relation Name']} if 'Relation Name' in node else set()
+    for child in node.get('Plans', []):
+        found |= _pg_relations(child)
+    return found
+
+
+def _pg_problems(node, big_tables, max_sort_rows, problems):
+    if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in big_tables:
+        problems.append(f"sequential scan on {node['Relation Name']}")
+    if node['Node Type'] == 'Sort':
+        rows = max((child.get('Plan Rows', 0) for child in node.get('Plans', [])), default=0)
+        if rows > max_sort_rows:
+            problems.append(f"full sort of ~{rows} rows from {', '.join(sorted(_pg_relations(node)))}")
+    for child in node.get('Plans', []):
+        _pg_problems(child, big_tables, max_sort_rows, problems)
+
+
+def _sqlite_index_stats(connection):
+    """{index name: [rows, rows per key prefix...]} from sqlite_stat1 (filled by ANALYZE)"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        if cursor.fetchone() is None:
+            return {}
+        cursor.execute('SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL')
+        return {idx: [int(n) for n in stat.split()[:8] if n.isdigit()] for idx, stat in cursor.fetchall()}
+
+
+def _sqlite_rows(match, sizes, stats):
+    kind, table, pk, index, condition = match.groups()
+    table_rows = sizes.get(table, 0)
+    if kind == 'SCAN':
+        return table_rows
+    if pk:
+        return 1
+    # stat is "rows, rows per value of the first column, of the first two, ..."
+    index_stats = stats.get(index)
+    equalities = len(re.findall(r'\w+=\?', condition or ''))
+    if not index_stats or equalities == 0 or re.search(r'[<>]', condition or ''):
+        return table_rows
+    return index_stats[min(equalities, len(index_stats) - 1)]
+
+
+def plan_problems(lines, raw, sizes, big_table_rows, max_sort_rows, connection=default_connection):
+    """
+    Sequential scans of tables with at least `big_table_rows` rows, and full
+    ORDER BY sorts whose estimated input exceeds `max_sort_rows`.
+    `sizes` maps table name to row count (see table_sizes).
+    """
+    problems = []
+    big_tables = {table for table, rows in sizes.items() if rows >= big_table_rows}
+    if connection.vendor == 'postgresql':
+        _pg_problems(raw, big_tables, max_sort_rows, problems)
+        return problems
+    stats = _sqlite_index_stats(connection)
+    estimate = 1
+    touched = set()
+    for line in lines:
+        match = _SQLITE_ACCESS.match(line.strip())
+        if not match:
+            continue
+        kind, table = match.group(1), match.group(2)
+        touched.add(table)
+        if kind == 'SCAN' and match.group(3) is None and match.group(4) is None and table in big_tables:
+            problems.append(f'sequential scan on {table}')
+        # Nested-loop joins: rows reaching the sorter multiply level by level
+        estimate *= max(1, _sqlite_rows(match, sizes, stats))
+    # Partial sorts ("RIGHT PART OF ORDER BY") only sort within an index prefix
+    if any(line.strip() == 'USE TEMP B-TREE FOR ORDER BY' for line in lines) and estimate > max_sort_rows:
+        problems.append(f"full sort of ~{estimate} rows from {', '.join(sorted(touched))}")
+    return problems
+
+
+def plan_diff(expected, actual, label):
+    """Unified diff between a recorded plan and the current one"""
+    return '\n'.join(difflib.unified_diff(
+        expected, actual, fromfile=f'{label} (baseline)', tofile=f'{label} (current)', lineterm='',
+    ))
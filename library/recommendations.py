@@ -0,0 +1,196 @@
+"""
+"Readers also borrowed" recommendations for Library Management System
+A sparse book-by-book co-borrow matrix is never materialized: borrower lists
+and baskets are held as compact int arrays, and each book's row is counted on
+demand (Counter.update runs in C) and cut to its top-K neighbours by cosine
+similarity. Results are stored per book in BookNeighbours and cached.
+Loan history is read from both BorrowRecord and BorrowArchive.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Book, BookNeighbours, BorrowArchive, BorrowRecord, StatsCursor
+from .stats import ROLLUP_LAG
+
+RECOMMENDATION_CURSOR = 'co_borrow'
+# Most recent distinct books kept per reader; bounds the quadratic pair count
+MAX_BASKET = 200
+MIN_CO_BORROWERS = 2
+WRITE_BATCH_SIZE = 1000
+
+
+class CoBorrowMatrix:
+    """Reader baskets and book borrower lists as array('i'), i.e. the matrix in both orientations"""
+
+    def __init__(self, max_basket=MAX_BASKET):
+        self.max_basket = max_basket
+        self.baskets = defaultdict(lambda: array('i'))
+        self.borrowers = defaultdict(lambda: array('i'))
+        # Whole-history reader count per book, when only some readers were loaded
+        self.borrower_counts = None
+
+    def borrower_count(self, book_id):
+        if self.borrower_counts is not None:
+            return self.borrower_counts.get(book_id, 0)
+        return len(self.borrowers[book_id])
+
+    def add_loans(self, loans):
+        """`loans` of (user id, book id), grouped by user and newest first"""
+        seen_user, seen_books = None, set()
+        for user_id, book_id in loans:
+            if user_id != seen_user:
+                seen_user, seen_books = user_id, set()
+            if book_id in seen_books or len(seen_books) >= self.max_basket:
+                continue
+            seen_books.add(book_id)
+            self.baskets[user_id].append(book_id)
+            self.borrowers[book_id].append(user_id)
+
+    def neighbours(self, book_id, k):
+        """Top-k [book id, cosine score] co-borrowed with `book_id`"""
+        readers = self.borrowers.get(book_id)
+        if not readers:
+            return []
+        counts = Counter()
+        for user_id in readers:
+            counts.update(self.baskets[user_id])
+        counts.pop(book_id, None)
+        n = self.borrower_count(book_id) or len(readers)
+        scored = (
+            (count / math.sqrt(n * (self.borrower_count(other) or count)), other)
+            for other, count in counts.items() if count >= MIN_CO_BORROWERS
+        )
+        # Ties go to the lower (older) book id, so lists are stable between runs
+        top = heapq.nlargest(k, scored, key=lambda pair: (pair[0], -pair[1]))
+        return [[other, round(score, 4)] for score, other in top]
+
+
+def _history(condition=Q()):
+    """(user id, book id) over live and archived loans, grouped by user and newest first"""
+    fields = ('user_id', 'book_id', 'borrow_date')
+    loans = BorrowRecord.objects.filter(condition).order_by().values_list(*fields).union(
+        BorrowArchive.objects.filter(condition).order_by().values_list(*fields), all=True,
+    )
+    for user_id, book_id, _ in loans.order_by('user_id', '-borrow_date').iterator(chunk_size=10000):
+        yield user_id, book_id
+
+
+def _readers_of(book_ids):
+    return (
+        Q(user_id__in=BorrowRecord.objects.filter(book_id__in=book_ids).values('user_id'))
+        | Q(user_id__in=BorrowArchive.objects.filter(book_id__in=book_ids).values('user_id'))
+    )
+
+
+def borrower_counts(book_ids):
+    """{book id: distinct readers} over live and archived loans, one grouped query per batch"""
+    counts = Counter()
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), WRITE_BATCH_SIZE):
+        batch = book_ids[start:start + WRITE_BATCH_SIZE]
+        # UNION (not ALL) leaves one row per reader and book, however often it was borrowed
+        pairs = BorrowRecord.objects.filter(book_id__in=batch).order_by().values_list('user_id', 'book_id').union(
+            BorrowArchive.objects.filter(book_id__in=batch).order_by().values_list('user_id', 'book_id'),
+        )
+        counts.update(book_id for _, book_id in pairs.iterator(chunk_size=10000))
+    return counts
+
+
+def load_matrix(book_ids=None):
+    """
+    Whole loan history, or only the readers of `book_ids` (enough to recount
+    those rows). The partial matrix sees just some readers of each neighbour,
+    so the cosine denominators come from borrower_counts() instead; these
+    ignore MAX_BASKET, which only matters for readers past that many books.
+    """
+    matrix = CoBorrowMatrix()
+    matrix.add_loans(_history(Q() if book_ids is None else _readers_of(book_ids)))
+    if book_ids is not None:
+        matrix.borrower_counts = borrower_counts(matrix.borrowers)
+    return matrix
+
+
+def _cache_key(book_id):
+    return f'library:recommendations:{book_id}'
+
+
+def store_neighbours(matrix, book_ids, k=None):
+    """Compute and upsert neighbour lists for `book_ids`; returns rows written"""
+    k = k or settings.RECOMMENDATION_NEIGHBOURS
+    computed_at = timezone.now()
+    written = 0
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), WRITE_BATCH_SIZE):
+        batch = book_ids[start:start + WRITE_BATCH_SIZE]
+        BookNeighbours.objects.bulk_create(
+            [BookNeighbours(book_id=pk, neighbours=matrix.neighbours(pk, k), computed_at=computed_at)
+             for pk in batch],
+            update_conflicts=True, unique_fields=['book'], update_fields=['neighbours', 'computed_at'],
+        )
+        cache.delete_many([_cache_key(pk) for pk in batch])
+        written += len(batch)
+    return written
+
+
+def _advance_cursor(cutoff):
+    """Loans past the high-water mark (stopping at the first too-fresh one); moves the mark"""
+    StatsCursor.objects.get_or_create(name=RECOMMENDATION_CURSOR)
+    with transaction.atomic():
+        cursor = StatsCursor.objects.select_for_update().get(name=RECOMMENDATION_CURSOR)
+        loans = list(
+            BorrowRecord.objects.filter(pk__gt=cursor.last_id).order_by('pk')
+            .values_list('pk', 'book_id', 'borrow_date')
+        )
+        fresh = next((i for i, loan in enumerate(loans) if loan[2] >= cutoff), len(loans))
+        loans = loans[:fresh]
+        if loans:
+            cursor.last_id = loans[-1][0]
+            cursor.save(update_fields=['last_id', 'updated_at'])
+    return loans
+
+
+def build_recommendations(k=None):
+    """Full rebuild from the whole loan history; returns books written"""
+    cutoff = timezone.now() - ROLLUP_LAG
+    _advance_cursor(cutoff)
+    matrix = load_matrix()
+    return store_neighbours(matrix, list(matrix.borrowers), k)
+
+
+def refresh_recommendations(k=None, now=None):
+    """
+    Recount only rows a new loan can change: every book co-borrowed with a
+    book lent since the high-water mark. Its reader count moved, so every
+    score against it did too, not just those in the new reader's basket.
+    Returns books written.
+    """
+    if not StatsCursor.objects.filter(name=RECOMMENDATION_CURSOR, last_id__gt=0).exists():
+        return build_recommendations(k)
+    loans = _advance_cursor((now or timezone.now()) - ROLLUP_LAG)
+    if not loans:
+        return 0
+    lent = {book_id for _, book_id, _ in loans}
+    affected = {book_id for _, book_id in _history(_readers_of(lent))}
+    matrix = load_matrix(affected)
+    return store_neighbours(matrix, affected, k)
+
+
+def recommended_books(book, limit=6):
+    """Cards for `book`'s neighbours: one cache hit (or one pk lookup), then one IN query"""
+    key = _cache_key(book.pk)
+    neighbours = cache.get(key)
+    if neighbours is None:
+        row = BookNeighbours.objects.filter(book_id=book.pk).values_list('neighbours', flat=True).first()
+        neighbours = [book_id for book_id, _ in row or []]
+        cache.set(key, neighbours, settings.RECOMMENDATION_CACHE_SECONDS)
+    ids = neighbours[:limit]
+    books = Book.objects.for_cards().in_bulk(ids)
+    return [books[pk] for pk in ids if pk in books]
@@ -0,0 +1,141 @@
+"""
+Circulation reports for Library Management System
+Read only from precomputed tables: the daily library, author and category
+rollups (library.stats) and the AuthorUtilization snapshot. A report reads
+at most one row per day and key in its date range, so it costs the same
+whatever the size of the loan history, and never joins Book to categories.
+"""
+import csv
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import AuthorUtilization, Book, DailyCategoryBorrows, DailyLibraryBorrows
+
+REPORT_DAYS = 90
+# Longest range a report accepts; bounds the per-day loop and the rows read
+MAX_REPORT_DAYS = 731
+UTILIZATION_BATCH_SIZE = 1000
+PERIODS = ('day', 'week')
+REPORTS = ('loans', 'overdue', 'utilization')
+
+
+def default_range(today=None):
+    """The last REPORT_DAYS days, today included"""
+    today = today or timezone.localdate()
+    return today - timedelta(days=REPORT_DAYS - 1), today
+
+
+def _bucket(day, period):
+    return day - timedelta(days=day.weekday()) if period == 'week' else day
+
+
+def loans_by_period(start, end, period='day'):
+    """
+    [{'period', 'borrows', 'overdue'}] per day or per week (starting Monday)
+    from start to end inclusive; days without loans are reported as zero
+    """
+    totals = {}
+    # Counted rather than stepped to end, so end=date.max never steps past it
+    for offset in range((end - start).days + 1):
+        totals.setdefault(_bucket(start + timedelta(days=offset), period), {'borrows': 0, 'overdue': 0})
+    for day, borrows, overdue in DailyLibraryBorrows.objects.filter(day__range=(start, end)).values_list(
+            'day', 'borrows', 'overdue'):
+        bucket = totals[_bucket(day, period)]
+        bucket['borrows'] += borrows
+        bucket['overdue'] += overdue
+    return [{'period': bucket, **counts} for bucket, counts in totals.items()]
+
+
+def _rate(overdue, borrows):
+    return overdue / borrows if borrows else None
+
+
+def overdue_by_category(start, end):
+    """
+    [{'category', 'borrows', 'overdue', 'rate'}] for start to end inclusive,
+    highest rate first: loans flagged overdue over loans started in the range
+    """
+    rows = (
+        DailyCategoryBorrows.objects.filter(day__range=(start, end)).order_by()
+        .values('category__name')
+        .annotate(borrows=Sum('borrows'), overdue=Sum('overdue'))
+        .values_list('category__name', 'borrows', 'overdue')
+    )
+    report = [
+        {'category': name, 'borrows': borrows, 'overdue': overdue, 'rate': _rate(overdue, borrows)}
+        for name, borrows, overdue in rows
+    ]
+    report.sort(key=lambda row: (-(row['rate'] or 0), row['category']))
+    return report
+
+
+def author_utilization():
+    """Authors by utilization, highest first, from the (-utilization, author) index"""
+    return (
+        AuthorUtilization.objects.select_related('author').only(
+            'books', 'total_copies', 'available_copies', 'utilization', 'computed_at', 'author__name',
+        )
+        .order_by('-utilization', 'author')
+    )
+
+
+class _Echo:
+    """File-like object whose write() hands the row back, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def csv_rows(report, start=None, end=None, period='day'):
+    """Lines of CSV (header first) for one report, generated row by row for a streaming response"""
+    writer = csv.writer(_Echo())
+    if report == 'loans':
+        yield writer.writerow([period, 'borrows', 'overdue'])
+        for row in loans_by_period(start, end, period):
+            yield writer.writerow([row['period'].isoformat(), row['borrows'], row['overdue']])
+    elif report == 'overdue':
+        yield writer.writerow(['category', 'borrows', 'overdue', 'overdue_rate'])
+        for row in overdue_by_category(start, end):
+            rate = '' if row['rate'] is None else f"{row['rate']:.4f}"
+            yield writer.writerow([row['category'], row['borrows'], row['overdue'], rate])
+    else:
+        yield writer.writerow(['author', 'books', 'total_copies', 'available_copies', 'utilization', 'computed_at'])
+        for row in author_utilization().iterator(chunk_size=UTILIZATION_BATCH_SIZE):
+            yield writer.writerow([row.author.name, row.books, row.total_copies, row.available_copies,
+                                   f'{row.utilization:.4f}', row.computed_at.isoformat()])
+
+
+def refresh_author_utilization():
+    """
+    Recompute AuthorUtilization with one grouped pass over Book and batched
+    upserts; authors left without books are dropped. Returns authors written.
+    """
+    computed_at = timezone.now()
+    rows = (
+        Book.objects.order_by().values('author')
+        .annotate(books=Count('pk'), total=Sum('total_copies'), available=Sum('available_copies'))
+        .values_list('author', 'books', 'total', 'available')
+    )
+    batch, written = [], 0
+    with transaction.atomic():
+        for author_id, books, total, available in list(rows):
+            batch.append(AuthorUtilization(
+                author_id=author_id, books=books, total_copies=total, available_copies=available,
+                utilization=max(0.0, 1 - available / total) if total > 0 else 0.0, computed_at=computed_at,
+            ))
+            if len(batch) == UTILIZATION_BATCH_SIZE:
+                written += _upsert_utilization(batch)
+                batch = []
+        written += _upsert_utilization(batch)
+        AuthorUtilization.objects.filter(computed_at__lt=computed_at).delete()
+    return written
+
+
+def _upsert_utilization(rows):
+    AuthorUtilization.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['author'],
+        update_fields=['books', 'total_copies', 'available_copies', 'utilization', 'computed_at'],
+    )
+    return len(rows)
@@ -0,0 +1,114 @@
+"""
+Shared search-result cache for Library Management System
+A book_list search (text query and/or category) is stored once for every
+reader as the ordered list of matching book ids, keyed on the normalized
+query, category, sort and the catalog version stamp; a page then loads only
+its visible books. Any catalog change moves the version on, so entries are
+never invalidated one by one: stale ones stop being read and are evicted
+least-recently-used first by the `search` cache alias (SEARCH_CACHE_ENTRIES).
+Sorts and filters on availability change with every loan and are not cached.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .suggest import catalog_version
+
+CACHE_ALIAS = 'search'
+# Result order depends on available_copies, which loans change without a catalog version bump
+UNCACHED_SORTS = ('available',)
+STAT_KEYS = ('hits', 'misses', 'hit_us', 'miss_us')
+
+
+def normalize_query(query):
+    """'  Harry   POTTER ' -> 'harry potter'"""
+    return ' '.join((query or '').split()).lower()
+
+
+def is_cacheable(query, category, sort, available_only):
+    """Only searches are cached; a category must be an id to be a valid key part"""
+    if available_only or sort in UNCACHED_SORTS:
+        return False
+    if category and not str(category).isdigit():
+        return False
+    return bool(normalize_query(query) or category)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(query, category, sort, version):
+    digest = hashlib.sha1(json.dumps([normalize_query(query), category or '', sort]).encode()).hexdigest()
+    return f'library:search:{version}:{digest}'
+
+
+def _count(name, amount=1):
+    cache = _cache()
+    key = f'library:search:stats:{name}'
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # First count since the entry was evicted or reset; a racing add loses one sample
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+@dataclass
+class SearchResult:
+    ids: list
+    complete: bool  # False when the match list was cut at SEARCH_CACHE_MAX_IDS
+    hit: bool
+    elapsed_ms: float
+
+
+def result_ids(queryset, ordering, query, category, sort):
+    """
+    Ordered ids of `queryset` (already filtered for this search) from the cache,
+    or computed with one id-only query and stored. Hits, misses and the time
+    each took are counted for search_cache_stats().
+    """
+    started = time.perf_counter()
+    key = _key(query, category, sort, catalog_version())
+    cached = _cache().get(key)
+    hit = cached is not None
+    if hit:
+        ids, complete = cached
+    else:
+        limit = settings.SEARCH_CACHE_MAX_IDS
+        ids = list(queryset.prefetch_related(None).order_by(*ordering).values_list('pk', flat=True)[:limit + 1])
+        complete = len(ids) <= limit
+        ids = ids[:limit]
+        _cache().set(key, (ids, complete), settings.SEARCH_CACHE_SECONDS)
+    elapsed = time.perf_counter() - started
+    _count('hits' if hit else 'misses')
+    _count('hit_us' if hit else 'miss_us', int(elapsed * 1_000_000))
+    return SearchResult(ids, complete, hit, elapsed * 1000)
+
+
+def search_cache_stats():
+    """
+    {'hits', 'misses', 'hit_ratio', 'hit_ms', 'miss_ms', 'saved_ms'}: average
+    time to produce a result list on a hit and on a miss, and the total time
+    hits saved against recomputing (hits x the difference)
+    """
+    values = _cache().get_many([f'library:search:stats:{name}' for name in STAT_KEYS])
+    hits, misses, hit_us, miss_us = (values.get(f'library:search:stats:{name}', 0) for name in STAT_KEYS)
+    hit_ms = hit_us / hits / 1000 if hits else 0.0
+    miss_ms = miss_us / misses / 1000 if misses else 0.0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'hit_ms': hit_ms,
+        'miss_ms': miss_ms,
+        'saved_ms': max(0.0, hits * (miss_ms - hit_ms)) if misses else 0.0,
+    }
+
+
+def reset_stats():
+    _cache().delete_many([f'library:search:stats:{name}' for name in STAT_KEYS])
@@ -0,0 +1,103 @@
+"""
+Signal handlers for Library Management System
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from . import jobs
+from .models import Author, Book, CatalogChange, Category, UserProfile
+
+# Models whose image uploads get resized variants
+IMAGE_FIELDS = {
+    Book: 'cover_image',
+    UserProfile: 'profile_picture',
+}
+
+
+def note_new_upload(sender, instance, **kwargs):
+    """
+    Remember whether this save carries a freshly uploaded (uncommitted) image,
+    and which stored image it replaces or clears
+    """
+    field = IMAGE_FIELDS[sender]
+    field_file = getattr(instance, field)
+    instance._new_image_upload = bool(field_file) and not field_file._committed
+    instance._replaced_image = None
+    # Only a new upload or a cleared field can orphan variants; skip the lookup otherwise
+    if instance.pk and (instance._new_image_upload or not field_file):
+        old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+        if old and old != field_file.name:
+            instance._replaced_image = old
+
+
+def _delete_variants_on_commit(name):
+    transaction.on_commit(lambda: jobs.enqueue('images.delete_variants', {'name': name}))
+
+
+def schedule_variants(sender, instance, **kwargs):
+    """Queue variant generation for a new upload, and cleanup of the image it replaced, on commit"""
+    if getattr(instance, '_new_image_upload', False):
+        instance._new_image_upload = False
+        name = getattr(instance, IMAGE_FIELDS[sender]).name
+        transaction.on_commit(lambda: jobs.enqueue('images.generate_variants', {'name': name}))
+    if getattr(instance, '_replaced_image', None):
+        _delete_variants_on_commit(instance._replaced_image)
+        instance._replaced_image = None
+
+
+def delete_row_variants(sender, instance, **kwargs):
+    """A deleted row's image variants go too (the original is left, as Django does)"""
+    name = getattr(instance, IMAGE_FIELDS[sender]).name
+    if name:
+        _delete_variants_on_commit(name)
+
+
+for model in IMAGE_FIELDS:
+    pre_save.connect(note_new_upload, sender=model, dispatch_uid=f'note_new_upload_{model.__name__}')
+    post_save.connect(schedule_variants, sender=model, dispatch_uid=f'schedule_variants_{model.__name__}')
+    post_delete.connect(delete_row_variants, sender=model, dispatch_uid=f'delete_variants_{model.__name__}')
+
+
+# Models logged to CatalogChange for the typeahead index (library.suggest) and search cache
+CATALOG_KINDS = {
+    Book: 'book',
+    Author: 'author',
+}
+
+
+def log_catalog_change(sender, instance, **kwargs):
+    """Bump the catalog version; suggestion indexes re-read this object"""
+    CatalogChange.objects.create(kind=CATALOG_KINDS[sender], object_id=instance.pk)
+
+
+for model in CATALOG_KINDS:
+    post_save.connect(log_catalog_change, sender=model, dispatch_uid=f'log_catalog_save_{model.__name__}')
+    post_delete.connect(log_catalog_change, sender=model, dispatch_uid=f'log_catalog_delete_{model.__name__}')
+
+
+def _log_books(book_ids):
+    CatalogChange.objects.bulk_create([CatalogChange(kind='book', object_id=pk) for pk in book_ids])
+
+
+def log_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Category links changed: bump the version so cached category searches are recomputed"""
+    if reverse and action == 'pre_clear':
+        # category.books.clear() sends no pk_set; note the books before the links go
+        instance._cleared_book_ids = list(instance.books.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _log_books([instance.pk])
+    elif action == 'post_clear':
+        _log_books(instance.__dict__.pop('_cleared_book_ids', ()))
+    else:
+        _log_books(pk_set or ())
+
+
+def log_category_delete(sender, instance, **kwargs):
+    """A deleted category's links cascade without m2m signals; log its books first"""
+    _log_books(instance.books.values_list('pk', flat=True))
+
+
+m2m_changed.connect(log_category_change, sender=Book.categories.through, dispatch_uid='log_category_change')
+pre_delete.connect(log_category_delete, sender=Category, dispatch_uid='log_category_delete')
@@ -0,0 +1,253 @@
+"""
+Borrow statistics for Library Management System
+New loans are folded into per-day rollups (library-wide, book, author,
+category) past a high-water mark on BorrowRecord.id, so no request groups the
+loan history. Loans flagged overdue are folded the same way from the
+circulation event log. Leaderboards are precomputed into PopularBook and read
+by rank. Archived loans (BorrowArchive) are already folded; only a reset
+refolds them.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    Book, BorrowArchive, BorrowRecord, CirculationEvent, DailyAuthorBorrows, DailyBookBorrows, DailyCategoryBorrows,
+    DailyLibraryBorrows, PopularBook, StatsCursor,
+)
+
+ROLLUP_CURSOR = 'borrow_rollups'
+# A CirculationEvent id, not a loan id: overdue flags are read from the event log
+OVERDUE_CURSOR = 'overdue_rollups'
+ROLLUP_CHUNK_SIZE = 5000
+# Loans younger than this wait for the next run, so one whose transaction
+# commits after a newer id is not skipped by the high-water mark
+ROLLUP_LAG = timedelta(minutes=1)
+LEADERBOARD_SIZE = 20
+TRENDING_MIN_BORROWS = 2
+
+
+def _add_counts(model, key_field, counts, field='borrows'):
+    """
+    Add {(key id, day): n} onto `field` of existing rollup rows, creating the
+    missing ones. Library-wide rows have no key: key_field=None, keys (None, day).
+    """
+    if not counts:
+        return
+    attname = f'{key_field}_id' if key_field else None
+    lookup = {'day__in': {day for _, day in counts}}
+    if attname:
+        lookup[f'{attname}__in'] = {key for key, _ in counts}
+    existing = {
+        (getattr(row, attname) if attname else None, row.day): row
+        for row in model.objects.filter(**lookup)
+    }
+    to_update, to_create = [], []
+    for (key, day), n in counts.items():
+        row = existing.get((key, day))
+        if row is None:
+            to_create.append(model(**({attname: key} if attname else {}), day=day, **{field: n}))
+        else:
+            setattr(row, field, getattr(row, field) + n)
+            to_update.append(row)
+    model.objects.bulk_update(to_update, [field], batch_size=1000)
+    model.objects.bulk_create(to_create, batch_size=1000)
+
+
+def _fold(rows, field='borrows'):
+    """Count (id, book id, author id, when) rows onto `field` of every rollup, by local day of `when`"""
+    library_counts, book_counts, author_counts, category_counts = Counter(), Counter(), Counter(), Counter()
+    categories = defaultdict(list)
+    book_ids = {book_id for _, book_id, _, _ in rows}
+    for book_id, category_id in Book.categories.through.objects.filter(
+            book_id__in=book_ids).values_list('book_id', 'category_id'):
+        categories[book_id].append(category_id)
+    for _, book_id, author_id, when in rows:
+        day = timezone.localdate(when)
+        library_counts[None, day] += 1
+        book_counts[book_id, day] += 1
+        author_counts[author_id, day] += 1
+        for category_id in categories[book_id]:
+            category_counts[category_id, day] += 1
+    _add_counts(DailyLibraryBorrows, None, library_counts, field)
+    _add_counts(DailyBookBorrows, 'book', book_counts, field)
+    _add_counts(DailyAuthorBorrows, 'author', author_counts, field)
+    _add_counts(DailyCategoryBorrows, 'category', category_counts, field)
+
+
+def rollup_chunk(chunk_size=ROLLUP_CHUNK_SIZE, now=None, lag=ROLLUP_LAG):
+    """
+    Fold up to `chunk_size` loans past the high-water mark into the daily
+    rollups and advance the mark, in one transaction. Returns loans folded.
+    """
+    cutoff = (now or timezone.now()) - lag
+    StatsCursor.objects.get_or_create(name=ROLLUP_CURSOR)
+    with transaction.atomic():
+        # Row lock: concurrent runs queue here instead of counting loans twice
+        cursor = StatsCursor.objects.select_for_update().get(name=ROLLUP_CURSOR)
+        rows = list(
+            BorrowRecord.objects.filter(pk__gt=cursor.last_id).order_by('pk')
+            .values_list('pk', 'book_id', 'book__author_id', 'borrow_date')[:chunk_size]
+        )
+        # Ids are folded strictly in order: stop at the first loan that is too fresh
+        fresh = next((i for i, row in enumerate(rows) if row[3] >= cutoff), len(rows))
+        rows = rows[:fresh]
+        if rows:
+            _fold(rows)
+            cursor.last_id = rows[-1][0]
+            cursor.save(update_fields=['last_id', 'updated_at'])
+    return len(rows)
+
+
+def rollup_borrows(chunk_size=ROLLUP_CHUNK_SIZE, now=None, lag=ROLLUP_LAG):
+    """Fold every loan past the high-water mark; returns loans folded"""
+    total = 0
+    while True:
+        folded = rollup_chunk(chunk_size, now, lag)
+        total += folded
+        if folded < chunk_size:
+            return total
+
+
+def fold_overdue_chunk(chunk_size=ROLLUP_CHUNK_SIZE, now=None, lag=ROLLUP_LAG):
+    """
+    Fold up to `chunk_size` "marked overdue" events past the overdue
+    high-water mark onto the rollups' overdue counts, by the day they were
+    flagged. Returns events folded.
+    """
+    cutoff = (now or timezone.now()) - lag
+    StatsCursor.objects.get_or_create(name=OVERDUE_CURSOR)
+    with transaction.atomic():
+        cursor = StatsCursor.objects.select_for_update().get(name=OVERDUE_CURSOR)
+        events = list(
+            CirculationEvent.objects.filter(pk__gt=cursor.last_id, kind=CirculationEvent.OVERDUE).order_by('pk')
+            .values_list('pk', 'book_id', 'occurred_at')[:chunk_size]
+        )
+        fresh = next((i for i, event in enumerate(events) if event[2] >= cutoff), len(events))
+        events = events[:fresh]
+        if events:
+            # Events hold plain book ids; a book deleted since has nothing left to count against
+            authors = dict(Book.objects.filter(pk__in={event[1] for event in events}).values_list('pk', 'author_id'))
+            _fold([(pk, book_id, authors[book_id], at) for pk, book_id, at in events if book_id in authors],
+                  field='overdue')
+            cursor.last_id = events[-1][0]
+            cursor.save(update_fields=['last_id', 'updated_at'])
+    return len(events)
+
+
+def fold_overdue(chunk_size=ROLLUP_CHUNK_SIZE, now=None, lag=ROLLUP_LAG):
+    """Fold every overdue event past the high-water mark; returns events folded"""
+    total = 0
+    while True:
+        folded = fold_overdue_chunk(chunk_size, now, lag)
+        total += folded
+        if folded < chunk_size:
+            return total
+
+
+def backfill_overdue(chunk_size=ROLLUP_CHUNK_SIZE, lag=ROLLUP_LAG):
+    """
+    After reset_rollups: replay the whole "marked overdue" event log onto the
+    overdue counts. This is fold_overdue from the start of the log, so a
+    rebuild and the incremental rollups use one definition (loans flagged
+    overdue, by the day they were flagged) and agree. Returns events folded.
+    """
+    StatsCursor.objects.update_or_create(name=OVERDUE_CURSOR, defaults={'last_id': 0})
+    return fold_overdue(chunk_size, lag=lag)
+
+
+def reset_rollups():
+    """Drop all rollups and rewind the high-water marks (for a full backfill)"""
+    with transaction.atomic():
+        for model in (DailyLibraryBorrows, DailyBookBorrows, DailyAuthorBorrows, DailyCategoryBorrows, PopularBook):
+            model.objects.all().delete()
+        StatsCursor.objects.filter(name__in=[ROLLUP_CURSOR, OVERDUE_CURSOR]).update(last_id=0)
+
+
+def fold_archive(chunk_size=ROLLUP_CHUNK_SIZE):
+    """
+    Fold every archived loan into the rollups, for a backfill after
+    reset_rollups (the archive is behind the high-water mark, so rollup_chunk
+    never reads it). Not resumable: rerun after another reset.
+    """
+    last_id = folded = 0
+    while True:
+        rows = list(
+            BorrowArchive.objects.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', 'book_id', 'book__author_id', 'borrow_date')[:chunk_size]
+        )
+        if not rows:
+            return folded
+        with transaction.atomic():
+            _fold(rows)
+        folded += len(rows)
+        last_id = rows[-1][0]
+
+
+def refresh_leaderboards(today=None, size=LEADERBOARD_SIZE):
+    """
+    Recompute the 'week' (most borrowed in the last 7 days) and 'trending'
+    (this week against the week before) boards from the last 14 daily rollups
+    """
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=6)
+    window = (
+        DailyBookBorrows.objects.filter(day__gte=week_start - timedelta(days=7), day__lte=today)
+        .values('book')
+        .annotate(
+            recent=Sum('borrows', filter=Q(day__gte=week_start), default=0),
+            previous=Sum('borrows', filter=Q(day__lt=week_start), default=0),
+        )
+        .values_list('book', 'recent', 'previous')
+    )
+    rows = list(window.iterator(chunk_size=5000))
+    week = heapq.nsmallest(size, (row for row in rows if row[1]), key=lambda row: (-row[1], row[0]))
+    # Smoothed growth ratio, so one loan of a never-borrowed book doesn't top the board
+    trending = heapq.nsmallest(
+        size, (row for row in rows if row[1] >= TRENDING_MIN_BORROWS),
+        key=lambda row: (-(row[1] + 1) / (row[2] + 5), -row[1], row[0]),
+    )
+    computed_at = timezone.now()
+    with transaction.atomic():
+        PopularBook.objects.all().delete()
+        PopularBook.objects.bulk_create([
+            PopularBook(board=board, rank=rank, book_id=book_id, borrows=recent, computed_at=computed_at)
+            for board, ranked in (('week', week), ('trending', trending))
+            for rank, (book_id, recent, _) in enumerate(ranked, start=1)
+        ])
+
+
+def leaderboard(board, limit=5):
+    """Top `limit` entries of a board: reads exactly `limit` rows by (board, rank)"""
+    return list(
+        PopularBook.objects.filter(board=board, rank__lte=limit)
+        .select_related('book__author')
+        .only('rank', 'borrows', 'book__id', 'book__title', 'book__author__id', 'book__author__name')
+        .order_by('rank')
+    )
+
+
+def book_borrow_counts(book, today=None):
+    """{'total', 'week'} borrows for one book from its daily rollups"""
+    week_start = (today or timezone.localdate()) - timedelta(days=6)
+    return DailyBookBorrows.objects.filter(book=book).aggregate(
+        total=Sum('borrows', default=0),
+        week=Sum('borrows', filter=Q(day__gte=week_start), default=0),
+    )
+
+
+def user_loan_counts(user, profile=None):
+    """
+    {'total', 'active'} loans for one reader: one conditional aggregate over
+    the (user, status) index, plus the archived count kept on the profile
+    """
+    counts = BorrowRecord.objects.filter(user=user).order_by().aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(status__in=BorrowRecord.ACTIVE_STATUSES)),
+    )
+    counts['total'] += profile.archived_loans if profile else 0
+    return counts
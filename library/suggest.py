@@ -0,0 +1,238 @@
+"""
+Typeahead suggestions for Library Management System
+Each worker process keeps a PrefixIndex of book titles and author names in
+memory: one sorted list of strings searched with bisect. The newest
+CatalogChange id is the catalog version; when it moves, only the logged
+books/authors are re-read and patched into the index. Full builds run on a
+background thread (a greenlet under gevent) while requests keep reading the
+previous index.
+"""
+import bisect
+import logging
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Author, Book, CatalogChange
+
+logger = logging.getLogger(__name__)
+
+KIND_LABELS = {'b': 'title', 'a': 'author'}
+# Entries are 'folded\x00display\x00tag'; \x00 sorts first so all keys sharing
+# a folded prefix stay contiguous and each (kind, pk) tag makes the key unique
+SEP = '\x00'
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fold(text):
+    """Case- and whitespace-insensitive form used for matching"""
+    return _WHITESPACE.sub(' ', text.replace(SEP, '')).strip().casefold()
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index. Memory is bounded by max_entries and key_length:
+    entries past the cap are dropped (and `truncated` is set), long titles are
+    clipped to key_length characters.
+    """
+
+    def __init__(self, max_entries=None, key_length=None):
+        self.max_entries = max_entries or settings.SUGGEST_MAX_ENTRIES
+        self.key_length = key_length or settings.SUGGEST_KEY_LENGTH
+        self.truncated = False
+        self._keys = []
+        self._by_tag = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _entry(self, tag, text):
+        display = text.replace(SEP, '')[:self.key_length]
+        folded = fold(display)
+        return f'{folded}{SEP}{display}{SEP}{tag}' if folded else None
+
+    def memory_bytes(self):
+        """Approximate footprint of the entry strings, tags and containers"""
+        return (
+            sys.getsizeof(self._keys) + sys.getsizeof(self._by_tag)
+            + sum(map(sys.getsizeof, self._keys)) + sum(map(sys.getsizeof, self._by_tag))
+        )
+
+    def build(self, rows):
+        """Replace the contents with `rows` of (tag, text), e.g. ('b42', 'Dune')"""
+        by_tag = {}
+        for tag, text in rows:
+            if len(by_tag) >= self.max_entries:
+                self.truncated = True
+                break
+            entry = self._entry(tag, text)
+            if entry is not None:
+                by_tag[tag] = entry
+        self._keys = sorted(by_tag.values())
+        self._by_tag = by_tag
+
+    def remove(self, tag):
+        entry = self._by_tag.pop(tag, None)
+        if entry is not None:
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+
+    def upsert(self, tag, text):
+        self.remove(tag)
+        entry = self._entry(tag, text)
+        if entry is None:
+            return
+        if len(self._keys) >= self.max_entries:
+            self.truncated = True
+            return
+        bisect.insort(self._keys, entry)
+        self._by_tag[tag] = entry
+
+    def search(self, prefix, limit=8):
+        """Distinct (display, kind) completions for `prefix`, alphabetical"""
+        folded = fold(prefix)
+        if not folded:
+            return []
+        results = []
+        seen = set()
+        keys = self._keys
+        i = bisect.bisect_left(keys, folded)
+        # Bound the scan so a very common prefix with many duplicates stays cheap
+        for entry in keys[i:i + limit * 8]:
+            if not entry.startswith(folded):
+                break
+            _, display, tag = entry.split(SEP)
+            item = (display, KIND_LABELS[tag[0]])
+            if item not in seen:
+                seen.add(item)
+                results.append(item)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def catalog_version():
+    """Newest CatalogChange id (a primary-key lookup), 0 before any change"""
+    return CatalogChange.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def _catalog_rows(book_ids=None, author_ids=None):
+    books = Book.objects.order_by('pk')
+    authors = Author.objects.order_by('pk')
+    if book_ids is not None:
+        books = books.filter(pk__in=book_ids)
+        authors = authors.filter(pk__in=author_ids)
+    for pk, title in books.values_list('pk', 'title').iterator(chunk_size=5000):
+        yield f'b{pk}', title
+    for pk, name in authors.values_list('pk', 'name').iterator(chunk_size=5000):
+        yield f'a{pk}', name
+
+
+class CatalogSuggester:
+    """Per-process PrefixIndex kept in step with the catalog version stamp"""
+
+    def __init__(self, rows=_catalog_rows):
+        self.rows = rows
+        self.index = None
+        self.version = 0
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        self._builder = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.index = None
+            self.version = 0
+            self._checked_at = 0.0
+            self._built_at = 0.0
+            self._builder = None
+
+    def _build_index(self):
+        index = PrefixIndex()
+        index.build(self.rows())
+        return index
+
+    def _install(self, index, version):
+        # Changes logged while a background build ran are replayed onto it; upserts are idempotent
+        self.index, self.version = index, version
+        self._built_at = time.monotonic()
+
+    def _rebuild(self, version):
+        """Full build: on a background thread unless SUGGEST_BACKGROUND_BUILD is off, one at a time"""
+        if not settings.SUGGEST_BACKGROUND_BUILD:
+            self._install(self._build_index(), version)
+            return
+        if self._builder is not None and self._builder.is_alive():
+            return
+        self._builder = threading.Thread(target=self._build_in_background, args=(version,), daemon=True)
+        self._builder.start()
+
+    def _build_in_background(self, version):
+        try:
+            index = self._build_index()
+            with self._lock:
+                self._install(index, version)
+        except Exception:
+            logger.exception('Suggestion index build failed; serving the previous index')
+        finally:
+            # The thread opened its own connection; don't leave it behind
+            connections.close_all()
+
+    def _apply_changes(self, version):
+        changes = list(
+            CatalogChange.objects.filter(pk__gt=self.version, pk__lte=version)
+            .values_list('kind', 'object_id')
+        )
+        # A bulk edit touched a large share of the catalog: one full rebuild
+        # is cheaper than patching the sorted array row by row
+        if len(changes) > max(1000, len(self.index) // 10):
+            self._rebuild(version)
+            return
+        book_ids = {pk for kind, pk in changes if kind == 'book'}
+        author_ids = {pk for kind, pk in changes if kind == 'author'}
+        current = dict(self.rows(book_ids, author_ids))
+        for tag in [f'b{pk}' for pk in book_ids] + [f'a{pk}' for pk in author_ids]:
+            if tag in current:
+                self.index.upsert(tag, current[tag])
+            else:
+                self.index.remove(tag)
+        self.version = version
+
+    def _is_fresh(self, now):
+        return self.index is not None and now - self._checked_at < settings.SUGGEST_REFRESH_SECONDS
+
+    def refresh(self, force=False):
+        """
+        Check the version stamp at most every SUGGEST_REFRESH_SECONDS.
+        A change whose transaction commits after a newer one can be skipped by the
+        incremental path, so the index is also rebuilt every SUGGEST_REBUILD_SECONDS;
+        that build (and a worker's first) runs in the background.
+        """
+        now = time.monotonic()
+        if not force and self._is_fresh(now):
+            return
+        with self._lock:
+            if not force and self._is_fresh(now):
+                return
+            version = catalog_version()
+            if self.index is None or force or now - self._built_at >= settings.SUGGEST_REBUILD_SECONDS:
+                self._rebuild(version)
+            # While a background build runs, keep patching the index being served
+            if self.index is not None and version != self.version:
+                self._apply_changes(version)
+            self._checked_at = now
+
+    def suggest(self, prefix, limit=8):
+        """Completions from the current index; none until a worker's first build finishes"""
+        self.refresh()
+        index = self.index
+        return index.search(prefix, limit) if index is not None else []
+
+
+suggester = CatalogSuggester()
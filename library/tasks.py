@@ -0,0 +1,104 @@
+"""
+Background job handlers for Library Management System
+Executed by `manage.py run_worker`; see library.jobs
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import archive, circulation, holds, images, recommendations, reports, stats
+from .notifications import NOTICE_KINDS, send_hold_notices, send_loan_notices
+from .jobs import job
+from .models import BorrowRecord, CatalogChange, Job
+
+
+@job('images.generate_variants', max_attempts=2)
+def generate_image_variants(name):
+    """Resize an uploaded cover or profile picture into its srcset variants"""
+    images.generate_variants(name)
+
+
+@job('images.delete_variants', max_attempts=2)
+def delete_image_variants(name):
+    """Remove the variants of a replaced or deleted cover or profile picture"""
+    images.delete_variants(name)
+
+
+@job('library.mark_overdue', every=timedelta(minutes=15))
+def mark_overdue():
+    """Flag borrowed loans past their due date (uses the (status, due_date) index)"""
+    return circulation.mark_overdue(BorrowRecord.objects.all())
+
+
+@job('jobs.purge_finished', every=timedelta(hours=6))
+def purge_finished_jobs():
+    """Delete finished jobs older than JOB_RETENTION_DAYS"""
+    cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    return Job.objects.filter(status__in=['done', 'failed'], finished_at__lt=cutoff).delete()
+
+
+@job('library.purge_catalog_changes', every=timedelta(days=1))
+def purge_catalog_changes():
+    """
+    Trim the CatalogChange log; suggestion indexes fully rebuild every
+    SUGGEST_REBUILD_SECONDS, so older entries are never replayed
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SUGGEST_REBUILD_SECONDS, days=1)
+    return CatalogChange.objects.filter(created_at__lt=cutoff).delete()
+
+
+@job('library.send_loan_notices', every=timedelta(hours=1))
+def send_loan_notice_batches():
+    """Email due-soon reminders and overdue notices not sent yet"""
+    for kind in NOTICE_KINDS:
+        send_loan_notices(kind)
+
+
+@job('library.reconcile_inventory', every=timedelta(days=1))
+def reconcile_inventory(batch_size=1000):
+    """Correct available_copies drift against total_copies minus active loans"""
+    book_ids = list(circulation.inventory_drift().values_list('pk', flat=True))
+    for start in range(0, len(book_ids), batch_size):
+        circulation.fix_inventory(book_ids[start:start + batch_size])
+    return len(book_ids)
+
+
+@job('library.rollup_borrows', every=timedelta(minutes=5))
+def rollup_borrows():
+    """Fold new loans into the daily borrow rollups and recompute the leaderboards"""
+    folded = stats.rollup_borrows()
+    stats.refresh_leaderboards()
+    return folded
+
+
+@job('library.refresh_reports', every=timedelta(hours=1))
+def refresh_reports():
+    """Fold new overdue flags into the rollups and recompute per-author utilization"""
+    folded = stats.fold_overdue()
+    reports.refresh_author_utilization()
+    return folded
+
+
+@job('library.refresh_recommendations', every=timedelta(hours=1))
+def refresh_recommendations():
+    """Recount co-borrow neighbours for books in the baskets of recent borrowers"""
+    return recommendations.refresh_recommendations()
+
+
+@job('library.archive_borrows', every=timedelta(days=1))
+def archive_borrows():
+    """Move returned loans older than BORROW_ARCHIVE_AFTER_DAYS to BorrowArchive"""
+    return archive.archive_borrows()
+
+
+@job('library.send_hold_notices', every=timedelta(minutes=5))
+def send_hold_notice_batches():
+    """Email holders whose copy was set aside since the last run"""
+    return send_hold_notices().sent
+
+
+@job('library.expire_holds', every=timedelta(hours=1))
+def expire_holds():
+    """Pass copies not picked up within HOLD_PICKUP_DAYS to the next holder"""
+    return holds.expire_holds()
@@ -0,0 +1,25 @@
+"""
+Template tags for responsive images
+Usage: {% load library_images %}{% responsive_image book.cover_image book.title "card-img-top book-cover" %}
+"""
+from django import template
+from django.conf import settings
+
+from ..images import srcset, variant_name, variants_ready
+
+register = template.Library()
+
+
+@register.inclusion_tag('library/includes/responsive_image.html')
+def responsive_image(image, alt='', css_class='', sizes='(max-width: 768px) 100vw, 320px', fallback_width=320):
+    """Render a <picture> with WebP and JPEG srcsets, falling back to the original upload"""
+    if fallback_width not in settings.IMAGE_VARIANT_WIDTHS:
+        fallback_width = settings.IMAGE_VARIANT_WIDTHS[0]
+    context = {'alt': alt, 'css_class': css_class, 'sizes': sizes, 'src': image.url}
+    if variants_ready(image.name, storage=image.storage):
+        context.update(
+            webp_srcset=srcset(image.name, 'webp', storage=image.storage),
+            jpeg_srcset=srcset(image.name, 'jpg', storage=image.storage),
+            src=image.storage.url(variant_name(image.name, fallback_width, 'jpg')),
+        )
+    return context
@@ -2,13 +2,45 @@
 Tests for Library Management System
 Includes tests for models, views, and authentication
 """
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
 import pytest
-from django.test import TestCase, Client
+from io import BytesIO, StringIO
+from PIL import Image
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.management import call_command
+from django.template import Context, Template
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
-from .models import Author, Category, Book, BorrowRecord, UserProfile
+from .forms import BookForm, UserProfileForm
+from .health import reset_readiness_cache
+from . import jobs
+from .images import generate_variants, variant_name
+from .notifications import send_hold_notices, send_loan_notices
+from .counting import count_with_estimate_flag
+from .pagination import EstimatedCountPaginator, KeysetPaginator, MergedKeysetPaginator
+from . import archive, catalog_import, circulation, events, holds, recommendations, reports, searchcache, stats
+from . import queryplans
+from .suggest import CatalogSuggester, PrefixIndex, suggester
+from .models import (
+    Author, Category, Book, BorrowArchive, BorrowRecord, CatalogChange, CirculationEvent,
+    DailyAuthorBorrows, DailyBookBorrows,
+    DailyCategoryBorrows, Hold, LoanNotice, PopularBook, StatsCursor, UserProfile, Job, BookNeighbours,
+)
+from .uploads import BoundedTemporaryFileUploadHandler
 
 
 @pytest.mark.django_db
@@ -198,3 +230,1674 @@ class TestBorrowingSystem(TestCase):
             BorrowRecord.objects.filter(user=self.user, book=self.book).count(),
             0
         )
+
+
+@pytest.mark.django_db
+class TestHealthChecks(TestCase):
+    """Test cases for liveness and readiness probes"""
+
+    def setUp(self):
+        """Reset cached readiness state"""
+        reset_readiness_cache()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_healthz_does_no_db_work(self):
+        """Test liveness probe runs without queries or cookies"""
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ok')
+        self.assertEqual(len(response.cookies), 0)
+
+    def test_readyz_reports_checks_and_caches_result(self):
+        """Test readiness probe checks DB, migrations and cache once per interval"""
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['checks'], {'database': 'ok', 'migrations': 'ok', 'cache': 'ok'})
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+
+
+@pytest.mark.django_db
+class TestImageVariants(TestCase):
+    """Test cases for the cover image variant pipeline"""
+
+    def setUp(self):
+        """Write a cover image into a temporary media root"""
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.override = override_settings(MEDIA_ROOT=self.media.name)
+        self.override.enable()
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 1500), 'red').save(buffer, 'PNG')
+        self.name = default_storage.save('book_covers/cover.png', ContentFile(buffer.getvalue()))
+
+    def tearDown(self):
+        self.override.disable()
+        self.media.cleanup()
+
+    def test_generate_variants_downscales(self):
+        """Test every width/format variant is written and resized"""
+        self.assertEqual(generate_variants(self.name), 6)
+        with default_storage.open(variant_name(self.name, 320, 'webp')) as fh:
+            self.assertEqual(Image.open(fh).size, (320, 480))
+        self.assertEqual(generate_variants(self.name), 0)
+
+    def test_replaced_and_deleted_images_lose_their_variants(self):
+        """Test a new upload or a deleted row queues removal of the old image's variants"""
+        author = Author.objects.create(name='Cover Author')
+        book = Book.objects.create(title='Covered', author=author, isbn='9780000009607',
+                                   publication_date=timezone.now().date(), cover_image=self.name)
+        generate_variants(self.name)
+        buffer = BytesIO()
+        Image.new('RGB', (200, 300), 'blue').save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            book.cover_image = SimpleUploadedFile('new.png', buffer.getvalue(), content_type='image/png')
+            book.save()
+        cleanup = Job.objects.get(name='images.delete_variants')
+        self.assertEqual(cleanup.payload, {'name': self.name})
+        jobs.run(cleanup)
+        self.assertFalse(default_storage.exists(variant_name(self.name, 160, 'webp')))
+        self.assertTrue(default_storage.exists(self.name))
+
+        new_name = book.cover_image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            book.delete()
+        self.assertEqual(Job.objects.filter(name='images.delete_variants').last().payload, {'name': new_name})
+
+    def test_responsive_image_tag_queues_missing_variants(self):
+        """Test the tag never resizes inline: it queues the job, then renders srcset once variants exist"""
+        image = Book(cover_image=self.name).cover_image
+        template = Template('{% load library_images %}{% responsive_image image "Cover" "book-cover" %}')
+        html = template.render(Context({'image': image}))
+        self.assertNotIn('srcset', html)
+        self.assertIn('cover.png', html)
+        self.assertFalse(default_storage.exists('book_covers/cover_160w.jpg'))
+        self.assertEqual(list(Job.objects.values_list('name', 'payload')),
+                         [('images.generate_variants', {'name': self.name})])
+        template.render(Context({'image': image}))
+        self.assertEqual(Job.objects.count(), 1)
+
+        generate_variants(self.name)
+        html = template.render(Context({'image': image}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('cover_640w.webp 640w', html)
+
+
+@override_settings(UPLOAD_LIMITS={
+    'default': {'max_bytes': 1024 * 1024, 'max_pixels': 1_000_000},
+    'profile_picture': {'max_bytes': 64 * 1024, 'max_pixels': 1_000_000},
+})
+class TestBoundedUploads(TestCase):
+    """Test cases for upload size and pixel limits"""
+
+    def make_png(self, size):
+        buffer = BytesIO()
+        Image.new('L', size).save(buffer, 'PNG')
+        return SimpleUploadedFile('avatar.png', buffer.getvalue(), content_type='image/png')
+
+    def test_rejects_too_many_pixels_from_header(self):
+        """Test a highly compressible 5000x5000 image is rejected before decode"""
+        upload = self.make_png((5000, 5000))
+        self.assertLess(upload.size, 64 * 1024)
+        form = UserProfileForm(data={}, files={'profile_picture': upload})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['profile_picture'][0].code, 'image_too_large')
+
+    def test_accepts_image_within_limits(self):
+        """Test a small image passes validation"""
+        form = UserProfileForm(data={}, files={'profile_picture': self.make_png((200, 200))})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_handler_stops_writing_past_field_limit(self):
+        """Test the upload handler discards bytes past the field limit and flags the file"""
+        handler = BoundedTemporaryFileUploadHandler()
+        handler.new_file('profile_picture', 'big.png', 'image/png', None)
+        for start in range(0, 100 * 1024, 1024):
+            handler.receive_data_chunk(b'x' * 1024, start)
+        uploaded = handler.file_complete(100 * 1024)
+        self.assertTrue(uploaded.upload_truncated)
+        self.assertEqual(uploaded.size, 64 * 1024)
+        form = UserProfileForm(data={}, files={'profile_picture': uploaded})
+        self.assertEqual(form.errors.as_data()['profile_picture'][0].code, 'file_too_large')
+
+    def test_handler_keeps_the_part_of_the_crossing_chunk_that_fits(self):
+        """Test a chunk straddling the limit is written up to it, matching the reported size"""
+        handler = BoundedTemporaryFileUploadHandler()
+        handler.new_file('profile_picture', 'big.png', 'image/png', None)
+        for start in range(0, 70_000, 1000):
+            handler.receive_data_chunk(b'x' * 1000, start)
+        uploaded = handler.file_complete(70_000)
+        uploaded.file.seek(0, os.SEEK_END)
+        self.assertEqual(uploaded.file.tell(), uploaded.size)
+        self.assertEqual((uploaded.size, uploaded.received_size), (64 * 1024, 70_000))
+
+
+@pytest.mark.django_db
+class TestJobQueue(TestCase):
+    """Test cases for the database-backed job queue"""
+
+    def setUp(self):
+        """Register throwaway job handlers"""
+        self.calls = []
+        jobs.job('test.record')(lambda **payload: self.calls.append(payload))
+        jobs.job('test.explode', max_attempts=2, backoff=10)(self.explode)
+        jobs.job('test.periodic', every=timedelta(minutes=5))(lambda: None)
+
+    def tearDown(self):
+        for name in ('test.record', 'test.explode', 'test.periodic'):
+            jobs._registry.pop(name)
+
+    def explode(self):
+        raise RuntimeError('boom')
+
+    def test_claim_and_run(self):
+        """Test due jobs are claimed once and run with their payload"""
+        jobs.enqueue('test.record', {'book_id': 7})
+        jobs.enqueue('test.record', delay=timedelta(hours=1))
+        claimed = jobs.claim(10, 'w1')
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(jobs.claim(10, 'w2'), [])
+
+        jobs.run(claimed[0])
+        self.assertEqual(self.calls, [{'book_id': 7}])
+        self.assertEqual(Job.objects.get(pk=claimed[0].pk).status, 'done')
+
+    def test_failed_job_retries_with_backoff_then_fails(self):
+        """Test failures are rescheduled until max_attempts is reached"""
+        queued = jobs.enqueue('test.explode')
+        jobs.run(jobs.claim(1, 'w1')[0])
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('queued', 1))
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=7))
+        self.assertIn('boom', queued.last_error)
+
+        Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        jobs.run(jobs.claim(1, 'w1')[0])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'failed')
+
+    def test_periodic_job_reschedules_itself(self):
+        """Test a finished periodic job queues its next run"""
+        jobs.ensure_periodic()
+        jobs.ensure_periodic()
+        self.assertEqual(Job.objects.filter(name='test.periodic').count(), 1)
+        jobs.run(next(j for j in jobs.claim(50, 'w1') if j.name == 'test.periodic'))
+        upcoming = Job.objects.get(name='test.periodic', status='queued')
+        self.assertGreater(upcoming.run_at, timezone.now() + timedelta(minutes=4))
+
+    def test_worker_drains_queue_and_reports_stats(self):
+        """Test run_worker --once executes ready jobs and --stats prints metrics"""
+        for i in range(3):
+            jobs.enqueue('test.record', {'n': i})
+        call_command('run_worker', '--once', '--threads', '1', stdout=StringIO())
+        self.assertEqual(sorted(call['n'] for call in self.calls), [0, 1, 2])
+
+        out = StringIO()
+        call_command('run_worker', '--stats', stdout=out)
+        self.assertIn('ready=0', out.getvalue())
+        self.assertIn('avg_wait_seconds=', out.getvalue())
+
+    def test_mark_overdue_sweep_keeps_loan_returnable(self):
+        """Test overdue sweep flags late loans and they can still be returned"""
+        user = User.objects.create_user(username='late', password='testpass123')
+        book = Book.objects.create(
+            title="Late Book", author=Author.objects.create(name="A"), isbn="9780000000001",
+            publication_date=timezone.now().date(), available_copies=0, total_copies=1
+        )
+        record = BorrowRecord.objects.create(user=user, book=book, due_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(jobs.registered_jobs()['library.mark_overdue'].func(), 1)
+
+        self.client.login(username='late', password='testpass123')
+        self.client.post(reverse('return_book', args=[record.pk]), secure=True)
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'returned')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class TestLoanNotices(TestCase):
+    """Test cases for due-date reminders and overdue notices"""
+
+    def setUp(self):
+        """Create loans that are due soon, overdue and not due yet"""
+        author = Author.objects.create(name="Notice Author")
+        now = timezone.now()
+        self.records = {}
+        for i, (key, due) in enumerate([
+            ('due_soon', now + timedelta(days=1)),
+            ('overdue', now - timedelta(days=3)),
+            ('later', now + timedelta(days=10)),
+        ]):
+            user = User.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com')
+            book = Book.objects.create(
+                title=f"Notice Book {i}", author=author, isbn=f"97800000001{i:02d}",
+                publication_date=now.date(), available_copies=0, total_copies=1
+            )
+            self.records[key] = BorrowRecord.objects.create(user=user, book=book, due_date=due)
+
+    def test_sends_each_notice_once(self):
+        """Test notices go out in batches and reruns don't resend"""
+        result = send_loan_notices('due_soon', chunk_size=1)
+        self.assertEqual((result.sent, result.batches), (1, 1))
+        self.assertEqual(send_loan_notices('overdue').sent, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['reader0@example.com'])
+        self.assertIn('Notice Book 0', mail.outbox[0].subject)
+        self.assertIn('Overdue', mail.outbox[1].subject)
+
+        call_command('send_loan_notices', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(LoanNotice.objects.count(), 2)
+
+    def test_plain_text_mails_are_not_html_escaped(self):
+        """Test titles with quotes and ampersands reach the mail unescaped"""
+        Book.objects.filter(pk=self.records['overdue'].book_id).update(title="Ender's Game & Other Stories")
+        send_loan_notices('overdue')
+        message = mail.outbox[0]
+        self.assertIn("\"Ender's Game & Other Stories\"", message.subject)
+        self.assertIn("\"Ender's Game & Other Stories\" by Notice Author", message.body)
+        self.assertNotIn('&amp;', message.body)
+
+    def test_dry_run_records_nothing(self):
+        """Test --dry-run counts without sending"""
+        out = StringIO()
+        call_command('send_loan_notices', '--dry-run', stdout=out)
+        self.assertIn('due_soon: would send 1', out.getvalue())
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(LoanNotice.objects.exists())
+
+
+@pytest.mark.django_db
+class TestAutocomplete(TestCase):
+    """Test cases for autocomplete endpoints and widgets"""
+
+    def setUp(self):
+        """Create a catalog larger than one autocomplete page"""
+        self.user = User.objects.create_user(username='librarian', password='testpass123')
+        self.authors = Author.objects.bulk_create([Author(name=f"Author {i:03d}") for i in range(30)])
+        self.book = Book.objects.create(
+            title="Chosen Book", author=self.authors[5], isbn="9780000000202",
+            publication_date=timezone.now().date()
+        )
+
+    def test_book_form_renders_only_selected_author(self):
+        """Test the author select does not serialize every author"""
+        html = str(BookForm(instance=self.book)['author'])
+        self.assertIn('Author 005', html)
+        self.assertNotIn('Author 006', html)
+        self.assertIn('data-autocomplete-url="/autocomplete/authors/"', html)
+
+    def test_author_endpoint_paginates_matches(self):
+        """Test JSON matches are paged without a COUNT query"""
+        self.client.login(username='librarian', password='testpass123')
+        data = self.client.get(reverse('autocomplete_authors'), {'q': 'author'}, secure=True).json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertTrue(data['more'])
+        data = self.client.get(reverse('autocomplete_authors'), {'q': 'author', 'page': 2}, secure=True).json()
+        self.assertEqual(data['results'][0]['text'], 'Author 020')
+        self.assertFalse(data['more'])
+
+        data = self.client.get(reverse('autocomplete_books'), {'q': 'chosen'}, secure=True).json()
+        self.assertEqual(data['results'], [{'id': self.book.pk, 'text': 'Chosen Book by Author 005'}])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TestAdminPerformance(TestCase):
+    """Test cases for admin changelists on large tables"""
+
+    def setUp(self):
+        """Create a staff user and a handful of loans"""
+        self.admin = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.login(username='admin', password='testpass123')
+        self.authors = Author.objects.bulk_create([Author(name=f"Author {i}") for i in range(5)])
+        self.books = Book.objects.bulk_create([
+            Book(title=f"Book {i}", author=self.authors[i % 5], isbn=f"97800000003{i:02d}",
+                 publication_date=timezone.now().date())
+            for i in range(10)
+        ])
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=self.admin, book=book, due_date=timezone.now()) for book in self.books
+        ])
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test counts are annotated and related rows are joined, not fetched per row"""
+        for i, name in enumerate(('author', 'book', 'borrowrecord')):
+            url = reverse(f'admin:library_{name}_changelist')
+            before = self.changelist_queries(url)
+            book = Book.objects.create(title="Extra", author=Author.objects.create(name="Extra"),
+                                       isbn=f"97800000004{i:02d}", publication_date=timezone.now().date())
+            BorrowRecord.objects.create(user=self.admin, book=book, due_date=timezone.now())
+            self.assertEqual(self.changelist_queries(url), before, name)
+
+    def test_author_filter_renders_only_selected_author(self):
+        """Test the author sidebar filter does not list every author"""
+        url = reverse('admin:library_book_changelist')
+        response = self.client.get(url, {'author': self.authors[1].pk}, secure=True)
+        self.assertContains(response, 'Author 1')
+        self.assertNotContains(response, 'Author 3</a>')
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+    def test_autocomplete_filters_render_on_unfiltered_changelists(self):
+        """Test the author and book sidebar filters show their autocomplete box before any choice"""
+        for model, endpoint in (('book', 'autocomplete_authors'), ('borrowrecord', 'autocomplete_books')):
+            response = self.client.get(reverse(f'admin:library_{model}_changelist'), secure=True)
+            self.assertContains(response, 'data-url-template=')
+            self.assertContains(response, f'data-autocomplete-url="{reverse(endpoint)}"')
+
+    def test_deferred_join_paginator_keeps_order(self):
+        """Test pages are loaded by pk and keep the queryset ordering"""
+        paginator = EstimatedCountPaginator(Book.objects.order_by('title'), 4)
+        self.assertEqual(paginator.count, 10)
+        page = paginator.page(2)
+        self.assertEqual([book.title for book in page], ['Book 4', 'Book 5', 'Book 6', 'Book 7'])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class TestBulkAdminActions(TestCase):
+    """Test cases for set-based admin actions"""
+
+    def setUp(self):
+        """Create books with active loans"""
+        self.admin = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.login(username='admin', password='testpass123')
+        author = Author.objects.create(name="Bulk Author")
+        self.books = [
+            Book.objects.create(title=f"Bulk {i}", author=author, isbn=f"97800000005{i:02d}",
+                                publication_date=timezone.now().date(), available_copies=1, total_copies=3)
+            for i in range(2)
+        ]
+        self.loans = [
+            BorrowRecord.objects.create(user=self.admin, book=book, due_date=timezone.now() - timedelta(days=1))
+            for book in (self.books[0], self.books[0], self.books[1])
+        ]
+
+    def post_action(self, model, action, ids, **extra):
+        return self.client.post(
+            reverse(f'admin:library_{model}_changelist'),
+            {'action': action, '_selected_action': ids, **extra},
+            secure=True, follow=True,
+        )
+
+    def test_mark_returned_restocks_in_aggregate(self):
+        """Test returning three loans adds copies per book in one pass"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.post_action('borrowrecord', 'mark_returned', [loan.pk for loan in self.loans])
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.books[0].refresh_from_db()
+        self.books[1].refresh_from_db()
+        self.assertEqual((self.books[0].available_copies, self.books[1].available_copies), (3, 2))
+        self.assertFalse(BorrowRecord.objects.filter(status='borrowed').exists())
+
+        response = self.post_action('borrowrecord', 'mark_returned', [loan.pk for loan in self.loans])
+        self.assertContains(response, 'Returned 0 loans')
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].available_copies, 3)
+
+    def test_mark_overdue_reports_rows(self):
+        """Test past-due loans are flagged with a single update"""
+        response = self.post_action('borrowrecord', 'mark_overdue', [loan.pk for loan in self.loans])
+        self.assertContains(response, 'Marked 3 loans overdue')
+
+    def test_adjust_copies_and_categories(self):
+        """Test copy adjustments skip books that would go negative and categories are bulk-written"""
+        ids = [book.pk for book in self.books]
+        response = self.post_action('book', 'adjust_copies', ids, copies_delta='-2')
+        self.assertContains(response, 'Adjusted copies on 0 books (2 skipped')
+        self.post_action('book', 'adjust_copies', ids, copies_delta='2')
+        self.books[0].refresh_from_db()
+        self.assertEqual((self.books[0].available_copies, self.books[0].total_copies), (3, 5))
+
+        fiction, poetry = Category.objects.create(name="Fiction"), Category.objects.create(name="Poetry")
+        self.books[0].categories.add(poetry)
+        self.post_action('book', 'add_category', ids, category=fiction.pk)
+        self.assertEqual(fiction.books.count(), 2)
+        self.post_action('book', 'replace_categories', ids, category=fiction.pk)
+        self.assertEqual(list(self.books[0].categories.all()), [fiction])
+
+
+@pytest.mark.django_db
+class TestInventoryReconciliation(TestCase):
+    """Test cases for the reconcile_inventory command"""
+
+    def setUp(self):
+        """Create books whose available_copies have drifted"""
+        user = User.objects.create_user(username='reader', password='testpass123')
+        author = Author.objects.create(name="Drift Author")
+        self.books = [
+            Book.objects.create(title=f"Drift {i}", author=author, isbn=f"97800000006{i:02d}",
+                                publication_date=timezone.now().date(), available_copies=available, total_copies=3)
+            for i, available in enumerate([3, 1, 2])
+        ]
+        for book in (self.books[0], self.books[1], self.books[2]):
+            BorrowRecord.objects.create(user=user, book=book, due_date=timezone.now(), status='borrowed')
+        BorrowRecord.objects.create(user=user, book=self.books[2], due_date=timezone.now(), status='returned')
+
+    def test_reports_and_fixes_drift(self):
+        """Test mismatches are reported and corrected from active loan counts"""
+        out = StringIO()
+        call_command('reconcile_inventory', stdout=out)
+        self.assertIn('Found 2 books with drift', out.getvalue())
+        self.books[0].refresh_from_db()
+        self.assertEqual(self.books[0].available_copies, 3)
+
+        call_command('reconcile_inventory', '--fix', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(
+            list(Book.objects.order_by('isbn').values_list('available_copies', flat=True)), [2, 2, 2]
+        )
+        out = StringIO()
+        call_command('reconcile_inventory', stdout=out)
+        self.assertIn('Found 0 books with drift', out.getvalue())
+
+
+@pytest.mark.django_db
+class TestEstimatedCounts(TestCase):
+    """Test cases for estimated counts and list pagination"""
+
+    def setUp(self):
+        """Create more books than fit on one page"""
+        author = Author.objects.create(name="Paged Author")
+        Book.objects.bulk_create([
+            Book(title=f"Paged {i:02d}", author=author, isbn=f"97800000007{i:02d}",
+                 publication_date=timezone.now().date())
+            for i in range(30)
+        ])
+
+    def test_small_tables_fall_back_to_exact_count(self):
+        """Test SQLite and small tables get exact counts"""
+        self.assertEqual(count_with_estimate_flag(Book.objects.all()), (30, False))
+        self.assertEqual(count_with_estimate_flag(Book.objects.filter(title__endswith='1'), threshold=0), (3, False))
+
+    def test_book_list_is_paginated(self):
+        """Test book list renders one page at a time"""
+        response = self.client.get(reverse('book_list'), secure=True)
+        self.assertEqual(len(response.context['books']), 24)
+        self.assertContains(response, '30 books')
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('book_list'), {'after': cursor}, secure=True)
+        self.assertEqual(len(response.context['books']), 6)
+
+
+@pytest.mark.django_db
+class TestListProjections(TestCase):
+    """Test cases for column-projected list querysets"""
+
+    def setUp(self):
+        """Create an author and books with large text fields"""
+        self.author = Author.objects.create(name="Wordy Author", bio="x" * 10000)
+        category = Category.objects.create(name="Long Reads")
+        for i in range(3):
+            book = Book.objects.create(
+                title=f"Wordy {i}", author=self.author, isbn=f"97800000008{i:02d}",
+                description="y" * 10000, publication_date=timezone.now().date()
+            )
+            book.categories.add(category)
+
+    def list_sql(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_list_pages_skip_large_text_columns(self):
+        """Test list pages never select description or bio"""
+        for url in (reverse('home'), reverse('book_list'), reverse('author_list')):
+            sql = self.list_sql(url)
+            self.assertNotIn('"description"', sql, url)
+            self.assertNotIn('"bio"', sql, url)
+
+    def test_card_rows_carry_every_sort_key(self):
+        """Test keyset cursors never load a deferred sort column per book"""
+        book = Book.objects.for_cards().first()
+        for _, ordering in Book.SORT_ORDERINGS.values():
+            for name in ordering:
+                field = name.lstrip('-')
+                if '__' not in field:
+                    self.assertNotIn(field, book.get_deferred_fields())
+
+    def test_author_detail_keeps_full_author_but_projects_books(self):
+        """Test author detail renders the bio but not book descriptions"""
+        response = self.client.get(reverse('author_detail', args=[self.author.pk]), secure=True)
+        self.assertContains(response, "x" * 100)
+        self.assertIn('description', response.context['books'][0].get_deferred_fields())
+
+
+@pytest.mark.django_db
+class TestIsbnSearch(TestCase):
+    """Test cases for ISBN normalization and the exact-match fast path"""
+
+    def setUp(self):
+        """Create a book whose ISBN-13 has an ISBN-10 equivalent"""
+        self.author = Author.objects.create(name="Isbn Author")
+        self.book = Book.objects.create(
+            title="Checksums", author=self.author, isbn="978-0-306-40615-7",
+            publication_date=timezone.now().date()
+        )
+
+    def test_isbn_stored_normalized(self):
+        """Test hyphens are stripped on save"""
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.isbn, "9780306406157")
+
+    def test_isbn_search_redirects_to_single_match(self):
+        """Test hyphenated ISBN-13 and its ISBN-10 both redirect to the book"""
+        for query in ("978-0-306-40615-7", "0-306-40615-2"):
+            response = self.client.get(reverse('book_list'), {'q': query}, secure=True)
+            self.assertRedirects(
+                response, reverse('book_detail', args=[self.book.pk]), fetch_redirect_response=False
+            )
+
+    def test_isbn_search_skips_text_scan(self):
+        """Test a valid ISBN never reaches the icontains scan"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('book_list'), {'q': '9780306406157'}, secure=True)
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('LIKE', sql)
+
+    def test_non_isbn_query_uses_text_search(self):
+        """Test a checksum-invalid number falls back to the normal search page"""
+        response = self.client.get(reverse('book_list'), {'q': '9780306406158'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+
+    def test_punctuation_query_does_not_match_every_isbn(self):
+        """Test a query of only hyphens and spaces finds nothing instead of every book"""
+        response = self.client.get(reverse('book_list'), {'q': ' - -- '}, secure=True)
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_form_accepts_hyphenated_isbn(self):
+        """Test BookForm normalizes before the unique check"""
+        form = BookForm(data={
+            'title': 'Dupe', 'author': self.author.pk, 'isbn': '978-0-306-40615-7',
+            'publication_date': '2020-01-01', 'pages': 10, 'language': 'English',
+            'available_copies': 1, 'total_copies': 1,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('isbn', form.errors)
+        self.assertIn('already exists', str(form.errors['isbn']))
+
+    def test_backfill_migration_normalizes_without_collisions(self):
+        """Test the data migration strips separators and leaves colliding rows alone"""
+        from importlib import import_module
+        from django.apps import apps
+        migration = import_module('library.migrations.0004_normalize_isbn')
+        Book.objects.bulk_create([
+            Book(title="Legacy", author=self.author, isbn="0-306-40615-2", publication_date=timezone.now().date()),
+            Book(title="Clash", author=self.author, isbn="978 0306406157", publication_date=timezone.now().date()),
+        ])
+        migration.normalize_isbns(apps, None)
+        self.assertTrue(Book.objects.filter(title="Legacy", isbn="0306406152").exists())
+        self.assertTrue(Book.objects.filter(title="Clash", isbn="978 0306406157").exists())
+
+
+@pytest.mark.django_db
+@override_settings(SUGGEST_REFRESH_SECONDS=0)
+class TestSuggestions(TestCase):
+    """Test cases for the typeahead prefix index and /suggest/ endpoint"""
+
+    def setUp(self):
+        """Create a small catalog and start from an empty per-process index"""
+        suggester.reset()
+        self.author = Author.objects.create(name="Harper Lee")
+        self.book = Book.objects.create(
+            title="Harry Potter", author=self.author, isbn="9780000000901",
+            publication_date=timezone.now().date()
+        )
+
+    def suggestions(self, term):
+        response = self.client.get(reverse('suggest'), {'q': term}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return [(item['text'], item['kind']) for item in response.json()['suggestions']]
+
+    def test_prefix_index_is_case_insensitive_and_bounded(self):
+        """Test matching ignores case and whitespace and the entry cap holds"""
+        index = PrefixIndex(max_entries=2, key_length=10)
+        index.build([('b1', 'The  Hobbit'), ('b2', 'the hobbit'), ('b3', 'Thud!')])
+        self.assertEqual(len(index), 2)
+        self.assertTrue(index.truncated)
+        self.assertEqual(index.search('THE HOB'), [('The  Hobbi', 'title'), ('the hobbit', 'title')])
+        index.remove('b1')
+        self.assertEqual(index.search('the'), [('the hobbit', 'title')])
+
+    def test_suggest_returns_titles_and_authors(self):
+        """Test both kinds are served from the index without per-request catalog queries"""
+        self.assertEqual(self.suggestions('har'), [('Harper Lee', 'author'), ('Harry Potter', 'title')])
+        with CaptureQueriesContext(connection) as ctx:
+            self.suggestions('harr')
+        self.assertEqual(len(ctx.captured_queries), 1)  # version stamp only
+        self.assertEqual(self.suggestions('h'), [])
+
+    @override_settings(SUGGEST_BACKGROUND_BUILD=True)
+    def test_full_build_runs_off_the_request_path(self):
+        """Test a due rebuild runs on a thread while requests keep reading the previous index"""
+        started, release = threading.Event(), threading.Event()
+        catalog = [('b1', 'Harry Potter')]
+
+        def rows(book_ids=None, author_ids=None):
+            started.set()
+            release.wait(5)
+            return list(catalog)
+
+        background = CatalogSuggester(rows)
+        self.assertEqual(background.suggest('har'), [])  # first build still running
+        started.wait(5)
+        release.set()
+        background._builder.join(5)
+        self.assertEqual(background.suggest('har'), [('Harry Potter', 'title')])
+
+        started.clear()
+        release.clear()
+        catalog[:] = [('b2', 'Hard Times')]
+        background.refresh(force=True)
+        started.wait(5)
+        self.assertEqual(background.suggest('har'), [('Harry Potter', 'title')])
+        release.set()
+        background._builder.join(5)
+        self.assertEqual(background.suggest('har'), [('Hard Times', 'title')])
+
+    def test_index_applies_catalog_changes_incrementally(self):
+        """Test saves and deletes bump the version and patch the index in place"""
+        self.suggestions('har')
+        index = suggester.index
+        self.book.title = "Hard Times"
+        self.book.save()
+        Author.objects.create(name="Harriet Beecher Stowe")
+        self.assertEqual(CatalogChange.objects.count(), 4)
+        self.assertEqual(
+            self.suggestions('har'),
+            [('Hard Times', 'title'), ('Harper Lee', 'author'), ('Harriet Beecher Stowe', 'author')],
+        )
+        self.book.delete()
+        self.assertEqual(self.suggestions('hard'), [])
+        self.assertIs(suggester.index, index)
+
+
+@pytest.mark.django_db
+class TestBookSorting(TestCase):
+    """Test cases for index-backed sort modes and cursor paging"""
+
+    def setUp(self):
+        """Create books across several authors and collect planner statistics"""
+        authors = [Author.objects.create(name=f"Sort Author {i:02d}") for i in range(20)]
+        today = timezone.now().date()
+        Book.objects.bulk_create([
+            Book(title=f"Sorted {i % 7} {i:03d}", author=authors[i % 20], isbn=f"97800000{i:05d}",
+                 available_copies=i % 3, publication_date=today - timedelta(days=i % 50))
+            for i in range(300)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def walk(self, params):
+        """Follow Next links through the whole list"""
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('book_list'), {**params, **({'after': cursor} if cursor else {})},
+                                       secure=True)
+            page = response.context['page_obj']
+            seen.extend(book.pk for book in page)
+            if not page.has_next():
+                return seen
+            cursor = page.next_cursor
+
+    def test_each_sort_pages_through_every_book_in_order(self):
+        """Test cursor paging matches a plain ORDER BY for every sort mode"""
+        for sort, (_, ordering) in Book.SORT_ORDERINGS.items():
+            expected = list(Book.objects.order_by(*ordering).values_list('pk', flat=True))
+            self.assertEqual(self.walk({'sort': sort}), expected, sort)
+
+    def test_previous_cursor_returns_the_prior_page(self):
+        """Test paging backwards reproduces the page before"""
+        first = self.client.get(reverse('book_list'), {'sort': 'title'}, secure=True).context['page_obj']
+        second = self.client.get(reverse('book_list'), {'sort': 'title', 'after': first.next_cursor},
+                                 secure=True).context['page_obj']
+        back = self.client.get(reverse('book_list'), {'sort': 'title', 'before': second.previous_cursor},
+                               secure=True).context['page_obj']
+        self.assertEqual([book.pk for book in back], [book.pk for book in first])
+        self.assertFalse(back.has_previous())
+
+    def test_null_cursor_is_ignored(self):
+        """Test a crafted cursor of nulls falls back to the first page instead of failing"""
+        user = User.objects.create_user(username='cursor-reader', password='x')
+        self.client.force_login(user)
+        for length in (2, 3, 4):
+            cursor = base64.urlsafe_b64encode(json.dumps([None] * length).encode()).decode()
+            for sort in ('title', 'newest', 'author'):
+                for direction in ('after', 'before'):
+                    response = self.client.get(reverse('book_list'), {'sort': sort, direction: cursor}, secure=True)
+                    self.assertEqual(response.status_code, 200, (sort, length, direction))
+                    self.assertFalse(response.context['page_obj'].has_previous())
+            response = self.client.get(reverse('my_borrowed_books'), {'after': cursor}, secure=True)
+            self.assertEqual(response.status_code, 200)
+
+    def test_available_only_filter(self):
+        """Test only books with copies on the shelf are listed"""
+        pks = self.walk({'available': '1'})
+        self.assertEqual(len(pks), Book.objects.filter(available_copies__gt=0).count())
+
+    def plan(self, queryset, ordering):
+        paginator = KeysetPaginator(queryset, ordering, 24)
+        cursor = paginator.page().next_cursor
+        return [paginator.queryset_for()[0].explain(), paginator.queryset_for(after=cursor)[0].explain()]
+
+    def test_sorts_read_an_index_instead_of_sorting_the_table(self):
+        """Test EXPLAIN shows no full ORDER BY sort for any mode (a per-author partial sort is fine)"""
+        for sort, (_, ordering) in Book.SORT_ORDERINGS.items():
+            for plan in self.plan(Book.objects.for_cards(), ordering):
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, f'{sort}:\n{plan}')
+                self.assertNotIn('SCAN library_book\n', plan + '\n', f'{sort}:\n{plan}')
+
+    def test_available_only_uses_partial_index(self):
+        """Test the default sort with the available filter reads the partial index"""
+        available = Book.objects.for_cards().filter(available_copies__gt=0)
+        for plan in self.plan(available, Book.SORT_ORDERINGS['newest'][1]):
+            self.assertIn('book_available_newest_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+PLAN_BASELINES = os.path.join(os.path.dirname(__file__), 'query_plans')
+
+
+@pytest.mark.django_db
+class TestQueryPlans(TestCase):
+    """
+    Plan regression tests: seed a large catalog, capture the SQL each view runs and
+    fail on sequential scans or full sorts over big tables.
+    PLAN_TEST_BOOKS sets the scale; PLAN_TEST_UPDATE=1 rewrites the recorded plans.
+    """
+    BIG_TABLE_ROWS = 1000
+    MAX_SORT_ROWS = 500
+    # (label, url name, args, query params, logged in, problems that are expected)
+    CASES = [
+        ('home', 'home', [], {}, False, ()),
+        ('book_list', 'book_list', [], {}, False, ()),
+        ('book_list_sorted', 'book_list', [], {'sort': 'published'}, False, ()),
+        ('book_list_available', 'book_list', [], {'available': '1'}, False, ()),
+        ('book_list_category', 'book_list', [], {'category': 'first'}, False, ()),
+        # Substring search can't use a b-tree index; the ISBN fast path can
+        ('book_list_search', 'book_list', [], {'q': 'Plan 12'}, False, ('sequential scan on library_book',)),
+        ('book_list_isbn', 'book_list', [], {'q': '9780000012345'}, False, ()),
+        ('book_detail', 'book_detail', ['book'], {}, True, ()),
+        ('author_list', 'author_list', [], {}, False, ()),
+        ('author_detail', 'author_detail', ['author'], {}, False, ()),
+        ('my_borrowed_books', 'my_borrowed_books', [], {}, True, ()),
+        ('user_profile', 'user_profile', [], {}, True, ()),
+        ('autocomplete_books', 'autocomplete_books', [], {}, True, ()),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        """Seed PLAN_TEST_BOOKS books (default 5000) with authors, categories and loans"""
+        size = int(os.environ.get('PLAN_TEST_BOOKS', 5000))
+        cls.user = User.objects.create_user(username='planner', password='testpass123')
+        UserProfile.objects.create(user=cls.user)
+        others = User.objects.bulk_create([User(username=f'reader{i}') for i in range(size // 50)])
+        Author.objects.bulk_create([Author(name=f'Plan Author {i:05d}') for i in range(size // 10)])
+        author_ids = list(Author.objects.values_list('pk', flat=True))
+        Category.objects.bulk_create([Category(name=f'Plan Category {i:02d}') for i in range(20)])
+        category_ids = list(Category.objects.values_list('pk', flat=True))
+        today = timezone.now().date()
+        Book.objects.bulk_create([
+            Book(title=f'Plan {i % 97} {i:06d}', author_id=author_ids[i % len(author_ids)],
+                 isbn=f'97800{i:08d}', available_copies=i % 3, total_copies=3,
+                 publication_date=today - timedelta(days=i % 3650))
+            for i in range(size)
+        ], batch_size=2000)
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        through = Book.categories.through
+        through.objects.bulk_create([
+            through(book_id=pk, category_id=category_ids[n % len(category_ids)]) for n, pk in enumerate(book_ids)
+        ], batch_size=2000)
+        now = timezone.now()
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=[cls.user, *others][n % (len(others) + 1)], book_id=pk,
+                         due_date=now + timedelta(days=14 - n % 30),
+                         status=('returned', 'borrowed', 'overdue')[n % 3])
+            for n, pk in enumerate(book_ids * 2)
+        ], batch_size=2000)
+        old = now - timedelta(days=400)
+        BorrowArchive.objects.bulk_create([
+            BorrowArchive(id=10_000_000 + n, user=[cls.user, *others][n % (len(others) + 1)], book_id=pk,
+                          borrow_date=old - timedelta(hours=n), due_date=old, return_date=old)
+            for n, pk in enumerate(book_ids)
+        ], batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.book = Book.objects.order_by('pk').first()
+        cls.author = cls.book.author
+        cls.category = Category.objects.order_by('pk').first()
+        cls.sizes = queryplans.table_sizes(
+            [model._meta.db_table for model in (Book, Author, Category, BorrowRecord, BorrowArchive, User)]
+            + [through._meta.db_table]
+        )
+
+    def baseline_path(self):
+        return os.path.join(PLAN_BASELINES, f'{connection.vendor}.json')
+
+    def capture_plans(self, url_name, args, params, logged_in):
+        if logged_in:
+            self.client.force_login(self.user)
+        else:
+            self.client.logout()
+        args = [getattr(self, name).pk for name in args]
+        params = {key: self.category.pk if value == 'first' else value for key, value in params.items()}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name, args=args), params, secure=True)
+        self.assertIn(response.status_code, (200, 302))
+        plans = []
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or 'django_session' in sql:
+                continue
+            lines, raw = queryplans.explain(sql)
+            problems = queryplans.plan_problems(lines, raw, self.sizes, self.BIG_TABLE_ROWS, self.MAX_SORT_ROWS)
+            plans.append((sql, lines, problems))
+        return plans
+
+    def test_view_queries_use_indexes(self):
+        """Test no view query scans or fully sorts a big table"""
+        try:
+            with open(self.baseline_path()) as fh:
+                baseline = json.load(fh)
+        except FileNotFoundError:
+            baseline = {}
+        recorded, failures = {}, []
+        for label, url_name, args, params, logged_in, expected in self.CASES:
+            plans = self.capture_plans(url_name, args, params, logged_in)
+            current = [line for n, (_, lines, _) in enumerate(plans) for line in [f'-- query {n + 1}', *lines]]
+            recorded[label] = current
+            for sql, lines, problems in plans:
+                unexpected = [problem for problem in problems if not problem.startswith(expected)]
+                if unexpected:
+                    failures.append(
+                        f"{label}: {'; '.join(unexpected)}\n{sql}\n"
+                        + queryplans.plan_diff(baseline.get(label, []), current, label)
+                    )
+        if os.environ.get('PLAN_TEST_UPDATE'):
+            os.makedirs(PLAN_BASELINES, exist_ok=True)
+            with open(self.baseline_path(), 'w') as fh:
+                json.dump(recorded, fh, indent=2, sort_keys=True)
+                fh.write('\n')
+        self.assertFalse(failures, '\n\n'.join(failures))
+
+    def test_checker_flags_unindexed_sort(self):
+        """Test the checker reports a sort on an unindexed column and prints the plan"""
+        sql = str(Book.objects.order_by('pages')[:24].query)
+        lines, raw = queryplans.explain(sql)
+        problems = queryplans.plan_problems(lines, raw, self.sizes, self.BIG_TABLE_ROWS, self.MAX_SORT_ROWS)
+        self.assertTrue(any(problem.startswith('full sort') for problem in problems), lines)
+        self.assertIn('+USE TEMP B-TREE FOR ORDER BY', queryplans.plan_diff([], lines, 'pages'))
+
+
+@pytest.mark.django_db
+class TestBorrowStats(TestCase):
+    """Test cases for incremental borrow rollups and leaderboards"""
+
+    def setUp(self):
+        """Create two books in one category and a reader"""
+        self.user = User.objects.create_user(username='statsreader', password='testpass123')
+        self.author = Author.objects.create(name="Stats Author")
+        self.category = Category.objects.create(name="Stats")
+        self.hot, self.cold = [
+            Book.objects.create(title=title, author=self.author, isbn=f"97800000090{i}",
+                                publication_date=timezone.now().date())
+            for i, title in enumerate(["Hot Book", "Cold Book"])
+        ]
+        self.hot.categories.add(self.category)
+        self.now = timezone.now()
+
+    def borrow(self, book, days_ago, count=1):
+        when = self.now - timedelta(days=days_ago)
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=self.user, book=book, borrow_date=when, due_date=when + timedelta(days=14))
+            for _ in range(count)
+        ])
+
+    def test_rollups_fold_new_loans_once(self):
+        """Test chunks advance the high-water mark and reruns add nothing twice"""
+        self.borrow(self.hot, 1, count=3)
+        self.borrow(self.cold, 20)
+        self.assertEqual(stats.rollup_borrows(chunk_size=2, now=self.now), 4)
+        self.assertEqual(stats.rollup_borrows(now=self.now), 0)
+        self.borrow(self.hot, 1)
+        self.assertEqual(stats.rollup_borrows(now=self.now), 1)
+        self.assertEqual(stats.book_borrow_counts(self.hot), {'total': 4, 'week': 4})
+        self.assertEqual(stats.book_borrow_counts(self.cold), {'total': 1, 'week': 0})
+        self.assertEqual(sum(DailyAuthorBorrows.objects.filter(author=self.author).values_list('borrows', flat=True)), 5)
+        self.assertEqual(DailyCategoryBorrows.objects.get(category=self.category).borrows, 4)
+
+    def test_fresh_loans_wait_for_the_next_run(self):
+        """Test loans inside the lag window are left past the high-water mark"""
+        self.borrow(self.hot, 1)
+        BorrowRecord.objects.create(user=self.user, book=self.cold, due_date=self.now + timedelta(days=14))
+        self.borrow(self.hot, 2)
+        self.assertEqual(stats.rollup_borrows(), 1)
+        self.assertEqual(stats.rollup_borrows(now=self.now + timedelta(minutes=5)), 2)
+
+    def test_leaderboards_and_views(self):
+        """Test boards rank by this week's borrows and pages read them without grouping loans"""
+        self.borrow(self.hot, 1, count=4)
+        self.borrow(self.cold, 2)
+        self.borrow(self.cold, 10, count=6)
+        call_command('backfill_borrow_stats', stdout=StringIO())
+        self.assertEqual(StatsCursor.objects.get().last_id, BorrowRecord.objects.order_by('-pk').first().pk)
+        self.assertEqual([e.book for e in stats.leaderboard('week')], [self.hot, self.cold])
+        self.assertEqual([e.book for e in stats.leaderboard('trending')], [self.hot])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('home'), secure=True)
+        self.assertContains(response, 'Most Borrowed This Week')
+        self.assertFalse([q for q in ctx.captured_queries if 'library_borrowrecord' in q['sql']])
+        response = self.client.get(reverse('book_detail', args=[self.cold.pk]), secure=True)
+        self.assertContains(response, '7 times (1 this week)')
+
+    def test_backfill_reset_rebuilds_from_scratch(self):
+        """Test --reset drops rollups and refolds the whole history"""
+        self.borrow(self.hot, 3, count=2)
+        call_command('backfill_borrow_stats', stdout=StringIO())
+        call_command('backfill_borrow_stats', '--reset', stdout=StringIO())
+        self.assertEqual(DailyBookBorrows.objects.get(book=self.hot).borrows, 2)
+        self.assertEqual(PopularBook.objects.filter(board='week').count(), 1)
+
+
+@pytest.mark.django_db
+class TestRecommendations(TestCase):
+    """Test cases for co-borrow recommendations"""
+
+    def setUp(self):
+        """Three readers who share two books; one also reads a third"""
+        cache.clear()
+        author = Author.objects.create(name="Rec Author")
+        self.books = [
+            Book.objects.create(title=f"Rec {i}", author=author, isbn=f"97800000091{i}",
+                                publication_date=timezone.now().date())
+            for i in range(4)
+        ]
+        self.readers = [User.objects.create_user(username=f'rec{i}', password='x') for i in range(3)]
+        self.past = timezone.now() - timedelta(days=3)
+        for reader in self.readers:
+            self.lend(reader, self.books[0], self.books[1])
+        self.lend(self.readers[0], self.books[2])
+
+    def lend(self, reader, *books):
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=reader, book=book, borrow_date=self.past, due_date=self.past + timedelta(days=14))
+            for book in books
+        ])
+
+    def test_matrix_scores_by_cosine_and_drops_single_co_borrows(self):
+        """Test neighbours need two shared readers and rank by cosine similarity"""
+        matrix = recommendations.load_matrix()
+        self.assertEqual(matrix.neighbours(self.books[0].pk, 5), [[self.books[1].pk, 1.0]])
+        self.assertEqual(matrix.neighbours(self.books[2].pk, 5), [])
+
+    def test_detail_page_shows_stored_neighbours(self):
+        """Test the detail page reads the stored list and the cache afterwards"""
+        call_command('build_recommendations', '--full', stdout=StringIO())
+        self.assertEqual(BookNeighbours.objects.count(), 3)
+        response = self.client.get(reverse('book_detail', args=[self.books[0].pk]), secure=True)
+        self.assertEqual(response.context['recommended_books'], [self.books[1]])
+        self.assertContains(response, 'Readers Also Borrowed')
+        with CaptureQueriesContext(connection) as ctx:
+            recommendations.recommended_books(self.books[0])
+        self.assertNotIn('library_bookneighbours', ' '.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_refresh_recounts_only_books_of_new_borrowers(self):
+        """Test incremental refresh touches the new borrowers' baskets only"""
+        recommendations.build_recommendations()
+        self.lend(self.readers[1], self.books[2])
+        self.lend(self.readers[2], self.books[3])
+        now = timezone.now() + timedelta(minutes=5)
+        self.assertEqual(recommendations.refresh_recommendations(now=now), 4)
+        self.lend(self.readers[1], self.books[3])
+        written = recommendations.refresh_recommendations(now=now + timedelta(minutes=5))
+        self.assertEqual(written, 4)
+        neighbours = BookNeighbours.objects.get(book=self.books[2]).neighbours
+        self.assertEqual([pk for pk, _ in neighbours][:1], [self.books[0].pk])
+        self.assertEqual(recommendations.refresh_recommendations(now=now + timedelta(minutes=10)), 0)
+
+    def test_refresh_matches_full_rebuild(self):
+        """Test incremental scores use whole-history borrower counts, as a full rebuild does"""
+        outsider = User.objects.create_user(username='rec-out', password='x')
+        self.lend(outsider, self.books[1], self.books[3])
+        recommendations.build_recommendations()
+        newcomer = User.objects.create_user(username='rec-new', password='x')
+        self.lend(newcomer, self.books[0])
+        recommendations.refresh_recommendations(k=5, now=timezone.now() + timedelta(minutes=5))
+        matrix = recommendations.load_matrix()
+        for row in BookNeighbours.objects.all():
+            self.assertEqual(row.neighbours, matrix.neighbours(row.book_id, 5))
+        self.assertEqual(BookNeighbours.objects.get(book=self.books[0]).neighbours, [[self.books[1].pk, 0.75]])
+
+
+@pytest.mark.django_db
+class TestBorrowArchive(TestCase):
+    """Test cases for moving old returned loans to the archive table"""
+
+    def setUp(self):
+        """A reader with an old return, a recent return and an active loan"""
+        self.user = User.objects.create_user(username='archivist', password='testpass123')
+        author = Author.objects.create(name="Archive Author")
+        self.old, self.recent, self.active = [
+            Book.objects.create(title=f"Archive {i}", author=author, isbn=f"97800000092{i}",
+                                publication_date=timezone.now().date())
+            for i in range(3)
+        ]
+        now = timezone.now()
+        long_ago = now - timedelta(days=400)
+        self.old_loan = BorrowRecord.objects.create(
+            user=self.user, book=self.old, borrow_date=long_ago, due_date=long_ago + timedelta(days=14),
+            return_date=long_ago + timedelta(days=10), status='returned',
+        )
+        LoanNotice.objects.create(borrow_record=self.old_loan, kind='due_soon')
+        BorrowRecord.objects.create(
+            user=self.user, book=self.recent, borrow_date=now - timedelta(days=20),
+            due_date=now - timedelta(days=6), return_date=now - timedelta(days=8), status='returned',
+        )
+        BorrowRecord.objects.create(
+            user=self.user, book=self.active, borrow_date=now - timedelta(days=2), due_date=now + timedelta(days=12),
+        )
+        self.client.force_login(self.user)
+
+    def fold(self):
+        stats.rollup_borrows(lag=timedelta(0))
+        recommendations.build_recommendations()
+
+    def test_waits_for_incremental_jobs(self):
+        """Test loans the rollup and recommendation jobs have not read are not archived"""
+        self.assertEqual(archive.archive_ceiling(), 0)
+        self.assertEqual(archive.archive_borrows(), 0)
+        stats.rollup_borrows(lag=timedelta(0))
+        self.assertEqual(archive.archive_borrows(), 0)
+
+    def test_command_moves_old_returns_only(self):
+        """Test archive_borrows copies and deletes old returns in batches, keeping ids and notices out"""
+        self.fold()
+        out = StringIO()
+        call_command('archive_borrows', '--dry-run', stdout=out)
+        self.assertIn('1 returned loans', out.getvalue())
+        self.assertEqual(BorrowArchive.objects.count(), 0)
+        call_command('archive_borrows', '--batch-size', '1', stdout=StringIO())
+        archived = BorrowArchive.objects.get()
+        self.assertEqual((archived.pk, archived.book), (self.old_loan.pk, self.old))
+        self.assertFalse(BorrowRecord.objects.filter(pk=self.old_loan.pk).exists())
+        self.assertFalse(LoanNotice.objects.exists())
+        self.assertEqual(BorrowRecord.objects.count(), 2)
+        self.assertEqual(archive.archive_borrows(), 0)
+
+    def test_history_pages_merge_hot_and_archived_loans(self):
+        """Test history cursor pages run one bounded scan per table and walk both ways"""
+        self.fold()
+        archive.archive_borrows()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('my_borrowed_books'), secure=True)
+        self.assertEqual([r.book for r in response.context['active_records']], [self.active])
+        self.assertEqual([r.book for r in response.context['history_page']], [self.recent, self.old])
+        self.assertContains(response, 'Archive 0')
+        archive_reads = [q['sql'] for q in ctx.captured_queries if 'library_borrowarchive' in q['sql']]
+        self.assertEqual(len(archive_reads), 1)
+        self.assertIn('LIMIT 21', archive_reads[0])
+
+        history = MergedKeysetPaginator(
+            [BorrowRecord.objects.filter(user=self.user, status='returned'), BorrowArchive.objects.all()],
+            ['-borrow_date', '-id'], 1,
+        )
+        first = history.page()
+        self.assertEqual(([r.book for r in first], first.has_next(), first.has_previous()), ([self.recent], True, False))
+        second = history.page(after=first.next_cursor)
+        self.assertEqual(([r.book for r in second], second.has_next()), ([self.old], False))
+        self.assertEqual([r.book for r in history.page(before=second.previous_cursor)], [self.recent])
+        self.assertEqual(history.count, 2)
+
+    def test_profile_counts_include_archived_loans(self):
+        """Test the profile reads one conditional aggregate plus the archived counter"""
+        self.fold()
+        archive.archive_borrows()
+        self.assertEqual(UserProfile.objects.get(user=self.user).archived_loans, 1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user_profile'), secure=True)
+        self.assertEqual((response.context['borrow_count'], response.context['active_borrows']), (3, 1))
+        self.assertEqual(len([q for q in ctx.captured_queries if 'library_borrowrecord' in q['sql']]), 1)
+
+    def test_stats_and_recommendations_keep_archived_loans(self):
+        """Test a rollup reset and a recommendation rebuild still count archived loans"""
+        self.fold()
+        archive.archive_borrows()
+        call_command('backfill_borrow_stats', '--reset', stdout=StringIO())
+        self.assertEqual(stats.book_borrow_counts(self.old)['total'], 1)
+        matrix = recommendations.load_matrix()
+        self.assertEqual(sorted(matrix.baskets[self.user.pk]), sorted([self.old.pk, self.recent.pk, self.active.pk]))
+
+
+@pytest.mark.django_db
+class TestCirculationDesk(TestCase):
+    """Test cases for batch checkout and return"""
+
+    def setUp(self):
+        """A librarian, a patron and a shelf of books"""
+        self.staff = User.objects.create_user(username='librarian', password='x', is_staff=True)
+        self.patron = User.objects.create_user(username='patron', password='x')
+        author = Author.objects.create(name="Desk Author")
+        self.books = [
+            Book.objects.create(title=f"Desk {i}", author=author, isbn=f"97800000093{i:02d}",
+                                publication_date=timezone.now().date(), available_copies=1, total_copies=1)
+            for i in range(12)
+        ]
+        self.client.force_login(self.staff)
+
+    def post(self, action, items, **headers):
+        return self.client.post(
+            reverse('circulation_desk'),
+            {'username': 'patron', 'action': action, 'items': '\n'.join(items)},
+            secure=True, **headers,
+        )
+
+    def test_checkout_runs_fixed_statements_per_batch(self):
+        """Test a batch lends every book with the same statements as a single checkout"""
+        with CaptureQueriesContext(connection) as single:
+            circulation.checkout_books(self.patron, [self.books[0].pk])
+        with CaptureQueriesContext(connection) as batch:
+            results = circulation.checkout_books(self.patron, [book.pk for book in self.books[1:]])
+        self.assertEqual(len(batch.captured_queries), len(single.captured_queries))
+        self.assertEqual(set(results.values()), {'borrowed'})
+        self.assertEqual(BorrowRecord.objects.filter(user=self.patron, status='borrowed').count(), 12)
+        self.assertFalse(Book.objects.filter(available_copies__gt=0).exists())
+
+    def test_desk_reports_a_result_per_item(self):
+        """Test mixed batches lend what they can and explain the rest, as JSON for scanners"""
+        Book.objects.filter(pk=self.books[1].pk).update(available_copies=0)
+        circulation.checkout_books(self.patron, [self.books[2].pk])
+        items = ['978-0-00-000930-0', self.books[1].isbn, str(self.books[2].pk), '9780000009999', '999999',
+                 '123456789012345678901234']
+        response = self.post('borrow', items, HTTP_ACCEPT='application/json')
+        results = [row['result'] for row in response.json()['results']]
+        self.assertEqual(results, ['borrowed', 'unavailable', 'already_borrowed', 'not_found', 'not_found', 'not_found'])
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).available_copies, 0)
+
+        response = self.post('return', [self.books[0].isbn, self.books[3].isbn])
+        self.assertContains(response, 'Not on loan')
+        self.assertContains(response, '1 of 2 items processed')
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).available_copies, 1)
+
+    def test_desk_is_staff_only_and_validates(self):
+        """Test patrons can't reach the desk and bad batches are rejected whole"""
+        response = self.post('borrow', ['not an isbn'], HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json()['errors'])
+        self.assertEqual(self.post('borrow', [str(n) for n in range(60)]).context['form'].errors['items'],
+                         [f'At most {circulation.MAX_BATCH_ITEMS} books per batch.'])
+        self.client.force_login(self.patron)
+        self.assertEqual(self.post('borrow', [self.books[0].isbn]).status_code, 302)
+        self.assertFalse(BorrowRecord.objects.exists())
+
+
+@pytest.mark.django_db
+class TestHolds(TestCase):
+    """Test cases for hold queues"""
+
+    def setUp(self):
+        """One single-copy book on loan to a borrower, and three readers"""
+        author = Author.objects.create(name="Hold Author")
+        self.book = Book.objects.create(title="Hold Book", author=author, isbn="9780000009400",
+                                        publication_date=timezone.now().date(), available_copies=1, total_copies=1)
+        self.borrower, self.first, self.second, self.third = [
+            User.objects.create_user(username=name, password='x', email=f'{name}@example.com')
+            for name in ('borrower', 'first', 'second', 'third')
+        ]
+        circulation.checkout_books(self.borrower, [self.book.pk])
+
+    def queue(self, *users):
+        return [holds.place_hold(user, self.book)[0] for user in users]
+
+    def return_copy(self, user=None):
+        circulation.return_books(user or self.borrower, [self.book.pk])
+
+    def test_return_goes_to_the_head_of_the_queue(self):
+        """Test a returned copy is set aside for the first holder, who alone can borrow it"""
+        self.queue(self.first, self.second)
+        self.assertEqual([h.ahead for h in holds.queue_positions(self.second)], [1])
+        self.return_copy()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Hold.objects.get(user=self.first).status, 'ready')
+        self.assertEqual([h.ahead for h in holds.queue_positions(self.second)], [0])
+        self.assertEqual(circulation.checkout_books(self.third, [self.book.pk]), {self.book.pk: 'unavailable'})
+        self.assertEqual(circulation.checkout_books(self.first, [self.book.pk]), {self.book.pk: 'borrowed'})
+        self.assertEqual(Hold.objects.get(user=self.first).status, 'fulfilled')
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 0)
+        self.assertFalse(circulation.inventory_drift().exists())
+
+    def test_expiry_and_cancellation_pass_the_copy_on(self):
+        """Test unclaimed or cancelled copies move down the queue, then back to the shelf"""
+        first, second = self.queue(self.first, self.second)
+        self.return_copy()
+        self.assertEqual(holds.expire_holds(now=timezone.now() + timedelta(days=4)), 1)
+        self.assertEqual(Hold.objects.get(pk=first.pk).status, 'expired')
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, 'ready')
+        self.assertFalse(circulation.inventory_drift().exists())
+        self.assertTrue(holds.cancel_hold(second))
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 1)
+        self.assertEqual(holds.place_hold(self.third, self.book)[0].status, 'ready')
+
+    def test_added_copies_go_to_the_queue_first(self):
+        """Test copies added by staff or found by reconciliation are set aside for holders, not shelved"""
+        self.queue(self.first, self.second)
+        self.assertEqual(circulation.adjust_copies(Book.objects.filter(pk=self.book.pk), 1), (1, 0))
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.total_copies, self.book.available_copies), (2, 0))
+        self.assertEqual(Hold.objects.get(user=self.first).status, 'ready')
+        self.assertEqual(circulation.checkout_books(self.third, [self.book.pk]), {self.book.pk: 'unavailable'})
+
+        Book.objects.filter(pk=self.book.pk).update(total_copies=3)
+        self.assertEqual(circulation.fix_inventory([self.book.pk]), 1)
+        self.assertEqual(Hold.objects.get(user=self.second).status, 'ready')
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 0)
+        self.assertFalse(circulation.inventory_drift().exists())
+
+    def test_views_and_batched_notices(self):
+        """Test placing a hold from the detail page, the queue page, and one email batch"""
+        self.queue(self.first)
+        self.client.force_login(self.second)
+        response = self.client.get(reverse('book_detail', args=[self.book.pk]), secure=True)
+        self.assertContains(response, 'Place Hold')
+        response = self.client.post(reverse('place_hold', args=[self.book.pk]), secure=True, follow=True)
+        self.assertContains(response, '1 reader ahead of you')
+        self.client.post(reverse('place_hold', args=[self.book.pk]), secure=True)
+        self.assertEqual(Hold.objects.filter(user=self.second).count(), 1)
+
+        self.return_copy()
+        self.assertEqual(len(mail.outbox), 0)
+        result = send_hold_notices()
+        self.assertEqual((result.sent, result.batches), (1, 1))
+        self.assertEqual(mail.outbox[0].to, ['first@example.com'])
+        self.assertEqual(send_hold_notices().sent, 0)
+
+    def test_hold_mail_is_not_html_escaped(self):
+        """Test titles with quotes and ampersands reach the hold mail unescaped"""
+        Book.objects.filter(pk=self.book.pk).update(title="Ender's Game & Other Stories")
+        self.queue(self.first)
+        self.return_copy()
+        send_hold_notices()
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, "\"Ender's Game & Other Stories\" is waiting for you")
+        self.assertIn("\"Ender's Game & Other Stories\" by Hold Author", message.body)
+
+
+@pytest.mark.django_db
+class TestCatalogImport(TestCase):
+    """Test cases for the streaming catalog importer and import_catalog command"""
+
+    CSV = (
+        'isbn,title,author,categories,publication_date,pages,copies,description\n'
+        '978-0-00-000950-8,Dune,Frank Herbert,Science Fiction; Classics,1965,412,3,Desert planet\n'
+        '9780000009515,Emma,Jane Austen,Classics,1815-12-23,,,\n'
+        'bad-isbn,Nowhere,Nobody,,2000,,,\n'
+        '9780000009522,Undated,Nobody,,,,,\n'
+    )
+
+    def setUp(self):
+        """Create an existing author, category and book for the import to match"""
+        suggester.reset()
+        self.herbert = Author.objects.create(name='Frank Herbert')
+        self.classics = Category.objects.create(name='Classics')
+        self.book = Book.objects.create(
+            title='Old Title', author=self.herbert, isbn='9780000009508',
+            publication_date=timezone.now().date(), available_copies=1, total_copies=2,
+        )
+
+    def run_import(self, text, fmt, **options):
+        importer = catalog_import.CatalogImporter(**options)
+        return importer.run(catalog_import.read_records(StringIO(text), fmt))
+
+    def test_csv_upserts_by_isbn_and_links_categories(self):
+        """Test existing ISBNs update in place, names resolve to existing rows, bad rows are rejected"""
+        result = self.run_import(self.CSV, 'csv', batch_size=2)
+        self.assertEqual((result.rows, result.created, result.updated), (4, 1, 1))
+        self.assertEqual((result.authors_created, result.categories_created), (1, 1))
+        self.assertEqual([line for line, _ in result.rejects], [4, 5])
+        self.assertIn('missing publication_date', result.rejects[1][1])
+
+        dune = Book.objects.get(pk=self.book.pk)
+        self.assertEqual((dune.title, dune.pages, dune.publication_date.year), ('Dune', 412, 1965))
+        # Copy counts belong to circulation and are only set on insert
+        self.assertEqual((dune.available_copies, dune.total_copies), (1, 2))
+        self.assertEqual(sorted(dune.categories.values_list('name', flat=True)), ['Classics', 'Science Fiction'])
+        emma = Book.objects.get(isbn='9780000009515')
+        self.assertEqual(list(emma.categories.all()), [self.classics])
+        self.assertEqual(Author.objects.filter(name='Frank Herbert').count(), 1)
+
+        self.assertEqual(self.run_import(self.CSV, 'csv').updated, 2)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_out_of_range_numbers_are_rejected(self):
+        """Test odd digits and oversized counts are rejects, not a failed import"""
+        text = (
+            'isbn,title,author,publication_date,pages,copies\n'
+            '9780000009553,Good,Some Author,2001,120,1\n'
+            '9780000009560,Squared,Some Author,2001,\u00b2,1\n'
+            '9780000009577,Huge,Some Author,2001,10,99999999999\n'
+        )
+        result = self.run_import(text, 'csv')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.rejects], [3, 4])
+        self.assertIn('not a whole number', result.rejects[0][1])
+        self.assertIn('larger than', result.rejects[1][1])
+        self.assertTrue(Book.objects.filter(isbn='9780000009553', pages=120).exists())
+
+    def test_staged_copy_keeps_empty_descriptions(self):
+        """Test a record without a description stages as '' with COPY told not to read it as NULL"""
+        row = catalog_import.clean_record({'isbn': '9780000009584', 'title': 'Bare', 'author': 'Someone',
+                                           'publication_date': '2001'})
+        line = catalog_import.staging_csv([{**row, 'author_id': 7}]).getvalue()
+        self.assertEqual(line.strip(), '9780000009584,Bare,7,,2001-01-01,0,1')
+        self.assertIn('FORCE_NOT_NULL (isbn, title, description)', catalog_import.STAGING_COPY)
+
+    @pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY staging is PostgreSQL only')
+    def test_copy_path_imports_records_without_description(self):
+        """Test the COPY upsert inserts and updates books that have no description"""
+        text = 'isbn,title,author,publication_date\n9780000009591,No Blurb,Someone,2001\n'
+        self.assertEqual(self.run_import(text, 'csv', use_copy=True).created, 1)
+        self.assertEqual(self.run_import(text, 'csv', use_copy=True).updated, 1)
+        self.assertEqual(Book.objects.get(isbn='9780000009591').description, '')
+
+    def test_jsonl_and_marc_records(self):
+        """Test JSON Lines and MARC text map onto the same fields"""
+        jsonl = (
+            '{"isbn": "9780000009539", "title": "Ulysses", "author": "James Joyce", '
+            '"categories": ["Modernism"], "publication_date": "1922"}\n'
+            'not json\n'
+        )
+        result = self.run_import(jsonl, 'jsonl')
+        self.assertEqual((result.created, result.rejects), (1, [(2, 'invalid JSON')]))
+        marc = (
+            '=LDR  00000nam  2200000   4500\n'
+            '=020  \\\\$a9780000009546 (pbk.)\n'
+            '=100  1\\$aTolkien, J. R. R.,$d1892-1973.\n'
+            '=245  14$aThe hobbit :$bthere and back again /$cJ.R.R. Tolkien.\n'
+            '=264  \\1$aLondon :$bAllen & Unwin,$c1937.\n'
+            '=300  \\\\$a310 p. ;$c23 cm.\n'
+            '=650  \\0$aFantasy fiction.\n'
+        )
+        self.assertEqual(self.run_import(marc, 'marc').created, 1)
+        hobbit = Book.objects.select_related('author').get(isbn='9780000009546')
+        self.assertEqual(hobbit.title, 'The hobbit there and back again')
+        self.assertEqual((hobbit.author.name, hobbit.pages, hobbit.publication_date.year),
+                         ('J. R. R. Tolkien', 310, 1937))
+        self.assertEqual(list(hobbit.categories.values_list('name', flat=True)), ['Fantasy fiction'])
+
+    @override_settings(SUGGEST_REFRESH_SECONDS=0)
+    def test_batches_log_catalog_changes_for_suggestions(self):
+        """Test bulk writes still reach the suggestion index through the change log"""
+        self.assertIn(('Frank Herbert', 'author'), suggester.suggest('fra'))
+        index = suggester.index
+        self.run_import(self.CSV, 'csv')
+        self.assertTrue(CatalogChange.objects.filter(kind='book', object_id=self.book.pk).exists())
+        self.assertEqual(suggester.suggest('jane'), [('Jane Austen', 'author')])
+        self.assertEqual(suggester.suggest('dun'), [('Dune', 'title')])
+        self.assertIs(suggester.index, index)
+
+    def test_command_dry_run_and_rejects_file(self):
+        """Test the command's dry run writes nothing and rejects go to a CSV"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'books.csv')
+            rejects = os.path.join(tmp, 'rejects.csv')
+            with open(path, 'w') as fh:
+                fh.write(self.CSV)
+            out = StringIO()
+            call_command('import_catalog', path, '--dry-run', stdout=out)
+            self.assertIn('1 books created, 1 updated', out.getvalue())
+            self.assertEqual(Book.objects.count(), 1)
+            self.assertFalse(Author.objects.filter(name='Jane Austen').exists())
+
+            out = StringIO()
+            call_command('import_catalog', path, '--rejects', rejects, stdout=out)
+            self.assertIn('rows/s', out.getvalue())
+            self.assertEqual(Book.objects.count(), 2)
+            with open(rejects) as fh:
+                self.assertEqual(len(fh.read().splitlines()), 3)
+
+
+@pytest.mark.django_db
+class TestCirculationEvents(TestCase):
+    """Test cases for the buffered circulation event log"""
+
+    def setUp(self):
+        """Create a patron, a staff member and two books; start from an empty buffer"""
+        events.buffer.flush()
+        self.patron = User.objects.create_user(username='patron', password='pass')
+        self.staff = User.objects.create_user(username='clerk', password='pass', is_staff=True)
+        author = Author.objects.create(name='Event Author')
+        self.books = [
+            Book.objects.create(title=f'Event Book {i}', author=author, isbn=f'978000000960{i}',
+                                publication_date=timezone.now().date(), available_copies=2, total_copies=2)
+            for i in range(2)
+        ]
+        self.book_ids = [book.pk for book in self.books]
+
+    def test_buffer_flushes_on_size_and_after_delay(self):
+        """Test a full batch is written at once and a partial one by the timer"""
+        written = []
+        buffer = events.EventBuffer(writer=written.append, max_events=3, max_delay_ms=20)
+        buffer.add([1, 2])
+        self.assertEqual(written, [])
+        buffer.add([3])
+        self.assertEqual(written, [[1, 2, 3]])
+        buffer.add([4])
+        for _ in range(200):
+            if len(written) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(written, [[1, 2, 3], [4]])
+        self.assertEqual((len(buffer), buffer.flush()), (0, 0))
+
+    def test_circulation_records_after_commit_and_replays(self):
+        """Test checkout, return and overdue events reach the table in one bulk write each flush"""
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.checkout_books(self.patron, self.book_ids, actor=self.staff)
+        BorrowRecord.objects.filter(book=self.books[1]).update(due_date=timezone.now() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.mark_overdue(BorrowRecord.objects.all())
+            circulation.return_books(self.patron, self.book_ids[:1])
+        self.assertEqual(CirculationEvent.objects.count(), 0)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(events.buffer.flush(), 4)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        borrowed = CirculationEvent.objects.filter(kind=CirculationEvent.BORROWED)
+        self.assertEqual(sorted(borrowed.values_list('book_id', flat=True)), self.book_ids)
+        self.assertEqual(set(borrowed.values_list('user_id', 'actor_id')), {(self.patron.pk, self.staff.pk)})
+        loan = BorrowRecord.objects.get(book=self.books[0])
+        replayed = list(events.replay(book=self.books[0], chunk_size=1))
+        self.assertEqual([event.kind for event in replayed], [CirculationEvent.BORROWED, CirculationEvent.RETURNED])
+        self.assertEqual({event.loan_id for event in replayed}, {loan.pk})
+        self.assertEqual(len(list(events.replay(kinds=[CirculationEvent.OVERDUE]))), 1)
+        self.assertEqual(list(events.replay(after_id=replayed[-1].pk, book=self.books[0])), [])
+
+    def test_rolled_back_operations_record_nothing(self):
+        """Test events from a transaction that rolls back never reach the buffer"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                circulation.adjust_copies(Book.objects.all(), 1, actor=self.staff)
+                raise RuntimeError
+            circulation.adjust_copies(Book.objects.filter(pk=self.book_ids[0]), -1, actor=self.staff)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(events.buffer.flush(), 1)
+        event = CirculationEvent.objects.get()
+        self.assertEqual((event.kind, event.book_id, event.delta), (CirculationEvent.COPIES_ADJUSTED, self.book_ids[0], -1))
+
+
+@pytest.mark.django_db
+class TestCirculationReports(TestCase):
+    """Test cases for the rollup-backed staff reports"""
+
+    def setUp(self):
+        """Lend two books three weeks ago, one of them in a category that then goes overdue"""
+        events.buffer.flush()
+        self.staff = User.objects.create_user(username='analyst', password='pass', is_staff=True)
+        self.patron = User.objects.create_user(username='reader', password='pass')
+        self.fiction = Category.objects.create(name='Fiction')
+        self.science = Category.objects.create(name='Science')
+        self.novelist = Author.objects.create(name='Report Novelist')
+        self.physicist = Author.objects.create(name='Report Physicist')
+        self.novel = Book.objects.create(title='Report Novel', author=self.novelist, isbn='9780000009706',
+                                         publication_date=timezone.now().date(), available_copies=2, total_copies=2)
+        self.novel.categories.add(self.fiction)
+        self.physics = Book.objects.create(title='Report Physics', author=self.physicist, isbn='9780000009713',
+                                           publication_date=timezone.now().date())
+        self.physics.categories.add(self.science)
+        self.today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.checkout_books(self.patron, [self.physics.pk], now=timezone.now() - timedelta(days=3))
+            circulation.checkout_books(self.patron, [self.novel.pk], now=timezone.now() - timedelta(days=20))
+            circulation.mark_overdue(BorrowRecord.objects.all())
+        events.buffer.flush()
+        stats.rollup_borrows()
+        stats.fold_overdue(lag=timedelta(0))
+        reports.refresh_author_utilization()
+
+    def test_reports_read_the_rollups(self):
+        """Test loans per period, overdue rates and utilization come out of the rollup tables"""
+        start = self.today - timedelta(days=27)
+        daily = reports.loans_by_period(start, self.today)
+        self.assertEqual(len(daily), 28)
+        self.assertEqual(sum(row['borrows'] for row in daily), 2)
+        weekly = reports.loans_by_period(start, self.today, 'week')
+        self.assertTrue(all(row['period'].weekday() == 0 for row in weekly))
+        self.assertEqual((sum(row['borrows'] for row in weekly), sum(row['overdue'] for row in weekly)), (2, 1))
+
+        rates = [(row['category'], row['rate']) for row in reports.overdue_by_category(start, self.today)]
+        self.assertEqual(rates, [('Fiction', 1.0), ('Science', 0.0)])
+        utilization = [(row.author_id, row.utilization) for row in reports.author_utilization()]
+        self.assertEqual(utilization, [(self.physicist.pk, 1.0), (self.novelist.pk, 0.5)])
+        self.assertEqual(stats.fold_overdue(lag=timedelta(0)), 0)
+
+    def test_backfill_matches_the_event_fold(self):
+        """Test a reset rebuilds the same overdue counts from loan history without double counting"""
+        start = self.today - timedelta(days=27)
+        # Late but never flagged: neither path counts it as overdue
+        late = timezone.now() - timedelta(days=10)
+        BorrowRecord.objects.create(user=self.patron, book=self.physics, borrow_date=late - timedelta(days=14),
+                                    due_date=late, return_date=late + timedelta(days=2), status='returned')
+        stats.rollup_borrows(lag=timedelta(0))
+        before = reports.overdue_by_category(start, self.today)
+        call_command('backfill_borrow_stats', '--reset', stdout=StringIO())
+        self.assertEqual(stats.fold_overdue(lag=timedelta(0)), 0)
+        self.assertEqual(reports.overdue_by_category(start, self.today), before)
+
+    def test_staff_view_and_csv_export(self):
+        """Test the page is staff-only, never touches loan tables, and exports CSV"""
+        self.client.force_login(self.patron)
+        self.assertEqual(self.client.get(reverse('circulation_reports'), secure=True).status_code, 302)
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('circulation_reports'), {'period': 'week'}, secure=True)
+        self.assertContains(response, 'Report Physicist')
+        self.assertContains(response, 'Fiction')
+        self.assertFalse([q for q in ctx.captured_queries if 'library_borrowrecord' in q['sql']
+                          or 'library_book_categories' in q['sql']])
+
+        response = self.client.get(reverse('circulation_reports'), {'export': 'overdue'}, secure=True)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['category,borrows,overdue,overdue_rate', 'Fiction,1,1,1.0000', 'Science,1,0,0.0000'])
+        response = self.client.get(reverse('circulation_reports'), {'export': 'utilization'}, secure=True)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+        response = self.client.get(reverse('circulation_reports'), {'start': '2026-02-01', 'end': '2026-01-01'},
+                                   secure=True)
+        self.assertContains(response, 'on or before the end date')
+        response = self.client.get(reverse('circulation_reports'), {'start': '2000-01-01', 'end': '2026-01-01'},
+                                   secure=True)
+        self.assertContains(response, f'at most {reports.MAX_REPORT_DAYS} days')
+        response = self.client.get(reverse('circulation_reports'), {'end': '9999-12-31', 'export': 'loans'},
+                                   secure=True)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), reports.REPORT_DAYS + 1)
+
+
+@pytest.mark.django_db
+class TestSearchResultCache(TestCase):
+    """Test cases for the shared book_list search result cache"""
+
+    def setUp(self):
+        """Create 30 books matching one search, in one category"""
+        searchcache.reset_stats()
+        author = Author.objects.create(name='Cache Author')
+        self.category = Category.objects.create(name='Cached')
+        self.books = [
+            Book.objects.create(title=f'Wizard Tale {i:02d}', author=author, isbn=f'97800000098{i:02d}',
+                                publication_date=timezone.now().date())
+            for i in range(30)
+        ]
+        self.books[0].categories.add(self.category)
+
+    def search(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('book_list'), params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        searched = [q['sql'] for q in ctx.captured_queries if 'LIKE' in q['sql'].upper()]
+        return response, searched
+
+    def test_equivalent_searches_share_one_entry(self):
+        """Test a repeat search, in any case or spacing, skips the search query and loads one page"""
+        response, searched = self.search({'q': 'wizard tale'})
+        self.assertTrue(response['Server-Timing'].startswith('search-cache;desc="miss"'))
+        self.assertTrue(searched)
+        response, searched = self.search({'q': '  Wizard   TALE '})
+        self.assertTrue(response['Server-Timing'].startswith('search-cache;desc="hit"'))
+        self.assertEqual(searched, [])
+        self.assertEqual(len(response.context['page_obj']), 24)
+        self.assertEqual(searchcache.search_cache_stats()['hit_ratio'], 0.5)
+        out = StringIO()
+        call_command('search_cache_stats', '--reset', stdout=out)
+        self.assertIn('hit_ratio=50.00%', out.getvalue())
+        self.assertEqual(searchcache.search_cache_stats()['hits'], 0)
+
+    def test_cursor_pages_match_the_database(self):
+        """Test cached pages and their cursors give the same rows as uncached keyset paging"""
+        for params in ({'q': 'wizard', 'sort': 'title'}, {'q': 'wizard', 'sort': 'available'}):
+            first = self.client.get(reverse('book_list'), params, secure=True).context['page_obj']
+            second = self.client.get(reverse('book_list'), {**params, 'after': first.next_cursor},
+                                     secure=True).context['page_obj']
+            back = self.client.get(reverse('book_list'), {**params, 'before': second.previous_cursor},
+                                   secure=True).context['page_obj']
+            self.assertEqual(len(second), 6)
+            self.assertFalse(second.has_next())
+            self.assertEqual([book.pk for book in back], [book.pk for book in first])
+        self.assertEqual(searchcache.search_cache_stats()['misses'], 1)
+
+    @override_settings(SEARCH_CACHE_MAX_IDS=10)
+    def test_truncated_lists_fall_back_to_the_database(self):
+        """Test a result longer than SEARCH_CACHE_MAX_IDS still pages in full"""
+        response, _ = self.search({'q': 'wizard'})
+        self.assertEqual(len(response.context['page_obj']), 24)
+        self.assertTrue(response.context['page_obj'].has_next())
+
+    def test_catalog_changes_invalidate(self):
+        """Test saves and category link changes move the version stamp on"""
+        self.search({'category': self.category.pk})
+        self.books[1].categories.add(self.category)
+        response, _ = self.search({'category': self.category.pk})
+        self.assertIn('"miss"', response['Server-Timing'])
+        self.assertEqual(len(response.context['page_obj']), 2)
+        circulation.set_category(Book.objects.filter(pk=self.books[2].pk), self.category)
+        response, _ = self.search({'category': self.category.pk})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.category.books.clear()
+        response, _ = self.search({'category': self.category.pk})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.books[3].categories.add(self.category)
+        category_id = self.category.pk
+        self.search({'category': category_id})
+        self.category.delete()
+        response, _ = self.search({'category': category_id})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.books[0].title = 'Renamed'
+        self.books[0].save()
+        response, _ = self.search({'q': 'renamed'})
+        self.assertEqual([book.title for book in response.context['page_obj']], ['Renamed'])
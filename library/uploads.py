@@ -0,0 +1,57 @@
+"""
+Bounded upload handling for Library Management System
+Uploads stream to a temporary file in chunks and stop being written once
+they pass the per-field byte limit; image dimensions are read from the
+header before Pillow decodes anything.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+
+def upload_limits(field_name):
+    """Per-field {'max_bytes', 'max_pixels'} from settings.UPLOAD_LIMITS"""
+    return settings.UPLOAD_LIMITS.get(field_name, settings.UPLOAD_LIMITS['default'])
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream every upload to disk. Bytes past the field's max_bytes are
+    counted but discarded, and the file is flagged so form validation
+    can reject it with a proper error instead of a truncated image.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.max_bytes = upload_limits(field_name)['max_bytes']
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        room = self.max_bytes - self.received
+        self.received += len(raw_data)
+        if room > 0:
+            # The chunk that crosses the limit is cut there, so the file matches the size reported
+            self.file.write(raw_data[:room])
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(min(file_size, self.max_bytes))
+        uploaded.upload_truncated = self.received > self.max_bytes
+        uploaded.received_size = self.received
+        return uploaded
+
+
+def image_dimensions(uploaded):
+    """
+    Read (width, height) from the image header only. Pillow opens lazily,
+    so no pixel data is decoded here.
+    """
+    if hasattr(uploaded, 'temporary_file_path'):
+        source = uploaded.temporary_file_path()
+    else:
+        source = uploaded
+    try:
+        with Image.open(source) as image:
+            return image.size
+    finally:
+        if hasattr(uploaded, 'seek'):
+            uploaded.seek(0)
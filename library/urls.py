@@ -19,11 +19,24 @@ urlpatterns = [
     path('books/<int:pk>/borrow/', views.borrow_book, name='borrow_book'),
     path('my-books/', views.my_borrowed_books, name='my_borrowed_books'),
     path('borrow/<int:pk>/return/', views.return_book, name='return_book'),
+    path('desk/', views.circulation_desk, name='circulation_desk'),
+    path('reports/', views.circulation_reports, name='circulation_reports'),
+    
+    # Holds
+    path('books/<int:pk>/hold/', views.place_hold, name='place_hold'),
+    path('holds/', views.my_holds, name='my_holds'),
+    path('holds/<int:pk>/cancel/', views.cancel_hold, name='cancel_hold'),
     
     # Authors
     path('authors/', views.author_list, name='author_list'),
     path('authors/<int:pk>/', views.author_detail, name='author_detail'),
     
+    # Autocomplete (JSON)
+    path('autocomplete/authors/', views.autocomplete_authors, name='autocomplete_authors'),
+    path('autocomplete/categories/', views.autocomplete_categories, name='autocomplete_categories'),
+    path('autocomplete/books/', views.autocomplete_books, name='autocomplete_books'),
+    path('suggest/', views.suggest, name='suggest'),
+    
     # Authentication
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
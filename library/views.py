@@ -4,28 +4,51 @@ Includes authentication, CRUD operations, and user management
 """
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
-from django.utils import timezone
-from datetime import timedelta
+from django.db.models import Count, Exists, OuterRef, Q
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 import logging
-from .models import Book, Author, Category, BorrowRecord, UserProfile
-from .forms import UserRegisterForm, BookForm, AuthorForm, CategoryForm, BorrowRecordForm, UserProfileForm
+from .models import Book, Author, Category, BorrowArchive, BorrowRecord, Hold, UserProfile
+from .forms import (
+    UserRegisterForm, BookForm, AuthorForm, CategoryForm, BorrowRecordForm, UserProfileForm, BatchCirculationForm,
+    ReportRangeForm,
+)
+from . import circulation, holds, reports, searchcache
+from .counting import estimated_count
+from .isbn import isbn_lookup_keys, normalize_isbn
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+from .recommendations import recommended_books
+from .stats import book_borrow_counts, leaderboard, user_loan_counts
+from .suggest import suggester
+
+BOOKS_PER_PAGE = 24
+HISTORY_PER_PAGE = 20
+# Authors shown on the reports page; the CSV export has them all
+REPORT_AUTHORS = 50
 
 
 def home(request):
     """Home page view - displays recent books and statistics"""
     logger = logging.getLogger(__name__)
     try:
-        recent_books = Book.objects.select_related('author').prefetch_related('categories')[:6]
-        total_books = Book.objects.count()
-        total_authors = Author.objects.count()
-        total_categories = Category.objects.count()
+        recent_books = Book.objects.for_cards()[:6]
+        # Precomputed boards: N rows by (board, rank), no grouping over loans
+        popular_books = leaderboard('week')
+        trending_books = leaderboard('trending')
+        # Planner statistics on big PostgreSQL tables, exact COUNT otherwise
+        total_books = estimated_count(Book.objects.all())
+        total_authors = estimated_count(Author.objects.all())
+        total_categories = estimated_count(Category.objects.all())
     except Exception:
         logger.exception('Failed to fetch home page data')
         # Avoid raising 500 in production when DB is down; show a simple fallback
         recent_books = []
+        popular_books = []
+        trending_books = []
         total_books = 0
         total_authors = 0
         total_categories = 0
@@ -33,6 +56,8 @@ def home(request):
 
     context = {
         'recent_books': recent_books,
+        'popular_books': popular_books,
+        'trending_books': trending_books,
         'total_books': total_books,
         'total_authors': total_authors,
         'total_categories': total_categories,
@@ -40,48 +65,104 @@ def home(request):
     return render(request, 'library/home.html', context)
 
 
+def _book_page(request, books, cards, sort, search_key=None):
+    """
+    (page, search result or None). Cursor paging over the index that matches
+    the sort, so no OFFSET scans on deep pages; a cacheable search (search_key
+    is (query, category)) is cut from its shared ordered id list instead and
+    loads only the page's own books from `cards`.
+    """
+    ordering = Book.SORT_ORDERINGS[sort][1]
+    paginator = KeysetPaginator(books, ordering, BOOKS_PER_PAGE)
+    after, before = request.GET.get('after'), request.GET.get('before')
+    search = None
+    if search_key is not None:
+        search = searchcache.result_ids(books, ordering, *search_key, sort)
+        page_obj = paginator.page_of_ids(search.ids, after, before, complete=search.complete, queryset=cards)
+        if page_obj is not None:
+            return page_obj, search
+    return paginator.page(after=after, before=before), search
+
+
 def book_list(request):
     """Book list view with search and filter functionality"""
-    books = Book.objects.select_related('author').prefetch_related('categories')
-    query = request.GET.get('q')
+    cards = Book.objects.for_cards(with_categories=True)
+    books = cards
+    # Collapsed whitespace, so equivalent searches share a result-cache entry
+    query = ' '.join(request.GET.get('q', '').split())
     category = request.GET.get('category')
     
-    if query:
-        books = books.filter(
-            Q(title__icontains=query) |
-            Q(author__name__icontains=query) |
-            Q(isbn__icontains=query)
-        )
+    isbn_keys = isbn_lookup_keys(query) if query else []
+    if isbn_keys:
+        # A valid ISBN is a unique-index lookup; a single hit goes straight to the book
+        matches = list(Book.objects.filter(isbn__in=isbn_keys).values_list('pk', flat=True)[:2])
+        if len(matches) == 1 and not category:
+            return redirect('book_detail', pk=matches[0])
+        books = books.filter(pk__in=matches)
+    elif query:
+        text = Q(title__icontains=query) | Q(author__name__icontains=query)
+        isbn_part = normalize_isbn(query)
+        # Only hyphens and spaces normalize to '', and icontains '' matches every book
+        books = books.filter(text | Q(isbn__icontains=isbn_part) if isbn_part else text)
     
     if category:
-        books = books.filter(categories__id=category)
-    
-    categories = Category.objects.all()
+        # An EXISTS probe per book keeps the sort index driving the scan; a join on
+        # categories would sort every book in the category for each page
+        in_category = Book.categories.through.objects.filter(book_id=OuterRef('pk'), category_id=category)
+        books = books.filter(Exists(in_category))
+    available_only = request.GET.get('available') == '1'
+    if available_only:
+        books = books.filter(available_copies__gt=0)
+    
+    sort = request.GET.get('sort')
+    if sort not in Book.SORT_ORDERINGS:
+        sort = 'newest'
+    categories = Category.objects.only('id', 'name').annotate(book_count=Count('books'))
+    cacheable = not isbn_keys and searchcache.is_cacheable(query, category, sort, available_only)
+    page_obj, search = _book_page(request, books, cards, sort, (query, category) if cacheable else None)
+    params = request.GET.copy()
+    for key in ('after', 'before', 'page'):
+        params.pop(key, None)
+    filter_query = params.urlencode()
     
     context = {
-        'books': books,
+        'books': page_obj,
+        'page_obj': page_obj,
         'categories': categories,
         'query': query,
         'selected_category': category,
+        'sort': sort,
+        'sort_choices': [(key, label) for key, (label, _) in Book.SORT_ORDERINGS.items()],
+        'available_only': available_only,
+        'filter_query': filter_query,
     }
-    return render(request, 'library/book_list.html', context)
+    response = render(request, 'library/book_list.html', context)
+    if search is not None:
+        response['Server-Timing'] = f'search-cache;desc="{"hit" if search.hit else "miss"}";dur={search.elapsed_ms:.1f}'
+    return response
 
 
 def book_detail(request, pk):
     """Book detail view"""
     book = get_object_or_404(Book, pk=pk)
     user_has_borrowed = False
+    user_hold = None
     
     if request.user.is_authenticated:
         user_has_borrowed = BorrowRecord.objects.filter(
             user=request.user,
             book=book,
-            status='borrowed'
+            status__in=BorrowRecord.ACTIVE_STATUSES
         ).exists()
+        if not user_has_borrowed and not book.is_available():
+            user_hold = Hold.objects.filter(user=request.user, book=book, status__in=Hold.OPEN_STATUSES).first()
     
     context = {
         'book': book,
         'user_has_borrowed': user_has_borrowed,
+        'user_hold': user_hold,
+        'borrow_counts': book_borrow_counts(book),
+        'recommended_books': recommended_books(book),
     }
     return render(request, 'library/book_detail.html', context)
 
@@ -135,49 +216,38 @@ def book_delete(request, pk):
 @login_required
 def borrow_book(request, pk):
     """Borrow a book"""
-    book = get_object_or_404(Book, pk=pk)
-    
-    # Check if user already borrowed this book
-    existing_borrow = BorrowRecord.objects.filter(
-        user=request.user,
-        book=book,
-        status='borrowed'
-    ).exists()
+    book = get_object_or_404(Book.objects.only('pk', 'title'), pk=pk)
+    # Locks the book row, so two readers can't take its last copy
+    result = circulation.checkout_books(request.user, [book.pk])[book.pk]
     
-    if existing_borrow:
+    if result == 'already_borrowed':
         messages.warning(request, 'You have already borrowed this book!')
         return redirect('book_detail', pk=pk)
     
-    if not book.is_available():
-        messages.error(request, 'This book is not available for borrowing!')
+    if result == 'unavailable':
+        messages.error(request, 'This book is not available for borrowing! Place a hold to join the queue.')
         return redirect('book_detail', pk=pk)
     
-    # Create borrow record
-    due_date = timezone.now() + timedelta(days=14)  # 2 weeks loan
-    BorrowRecord.objects.create(
-        user=request.user,
-        book=book,
-        due_date=due_date,
-        status='borrowed'
-    )
-    
-    # Update available copies
-    book.available_copies -= 1
-    book.save()
-    
     messages.success(request, f'You have successfully borrowed "{book.title}"!')
     return redirect('my_borrowed_books')
 
 
 @login_required
 def my_borrowed_books(request):
-    """View user's borrowed books"""
-    borrow_records = BorrowRecord.objects.filter(
-        user=request.user
-    ).select_related('book', 'book__author').prefetch_related('book__categories')
+    """View user's borrowed books: active loans, then history one cursor page at a time"""
+    loans = BorrowRecord.objects.filter(user=request.user).select_related('book', 'book__author')
+    # Both read the (user, status, -borrow_date, -id) index; history pages also
+    # take one bounded range scan of the archive and merge the two
+    active_records = loans.filter(status__in=BorrowRecord.ACTIVE_STATUSES)
+    archived = BorrowArchive.objects.filter(user=request.user).select_related('book', 'book__author')
+    paginator = MergedKeysetPaginator(
+        [loans.filter(status='returned'), archived], ['-borrow_date', '-id'], HISTORY_PER_PAGE,
+    )
+    history_page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
-        'borrow_records': borrow_records,
+        'active_records': active_records,
+        'history_page': history_page,
     }
     return render(request, 'library/my_borrowed_books.html', context)
 
@@ -185,26 +255,118 @@ def my_borrowed_books(request):
 @login_required
 def return_book(request, pk):
     """Return a borrowed book"""
-    borrow_record = get_object_or_404(BorrowRecord, pk=pk, user=request.user)
+    borrow_record = get_object_or_404(BorrowRecord.objects.select_related('book'), pk=pk, user=request.user)
     
-    if borrow_record.status != 'borrowed':
+    if not borrow_record.is_active():
         messages.warning(request, 'This book has already been returned!')
         return redirect('my_borrowed_books')
     
-    # Update borrow record
-    borrow_record.return_date = timezone.now()
-    borrow_record.status = 'returned'
-    borrow_record.save()
-    
-    # Update available copies
-    book = borrow_record.book
-    book.available_copies += 1
-    book.save()
+    # Marks the loan returned and gives the copy back with F() updates
+    circulation.return_loans(BorrowRecord.objects.filter(pk=borrow_record.pk))
     
-    messages.success(request, f'You have successfully returned "{book.title}"!')
+    messages.success(request, f'You have successfully returned "{borrow_record.book.title}"!')
     return redirect('my_borrowed_books')
 
 
+@login_required
+def place_hold(request, pk):
+    """Join a book's waiting list"""
+    if request.method != 'POST':
+        return redirect('book_detail', pk=pk)
+    book = get_object_or_404(Book.objects.only('pk', 'title'), pk=pk)
+    if BorrowRecord.objects.filter(user=request.user, book=book, status__in=BorrowRecord.ACTIVE_STATUSES).exists():
+        messages.warning(request, 'You already have this book!')
+        return redirect('book_detail', pk=pk)
+    hold, created = holds.place_hold(request.user, book)
+    if hold.status == 'ready':
+        messages.success(request, f'A copy of "{book.title}" is set aside for you. Pick it up soon!')
+    elif created:
+        messages.success(request, f'You joined the queue for "{book.title}".')
+    else:
+        messages.info(request, f'You are already in the queue for "{book.title}".')
+    return redirect('my_holds')
+
+
+@login_required
+def cancel_hold(request, pk):
+    """Leave a waiting list"""
+    hold = get_object_or_404(Hold, pk=pk, user=request.user)
+    if request.method == 'POST' and holds.cancel_hold(hold):
+        messages.success(request, 'Your hold was cancelled.')
+    return redirect('my_holds')
+
+
+@login_required
+def my_holds(request):
+    """The user's holds with their place in each queue"""
+    return render(request, 'library/my_holds.html', {'holds': holds.queue_positions(request.user)})
+
+
+@staff_member_required
+def circulation_desk(request):
+    """
+    Check out or return up to MAX_BATCH_ITEMS books for one patron in one
+    transaction, with a result per scanned item. Answers JSON to clients
+    that ask for it (scanner integrations) and HTML otherwise.
+    """
+    form = BatchCirculationForm(request.POST or None)
+    wants_json = request.accepts('application/json') and not request.accepts('text/html')
+    results = None
+    if request.method == 'POST':
+        if not form.is_valid():
+            if wants_json:
+                return JsonResponse({'errors': form.errors}, status=400)
+        else:
+            patron, items = form.cleaned_data['username'], form.cleaned_data['items']
+            book_ids = [pk for pk in items.values() if pk is not None]
+            if form.cleaned_data['action'] == 'borrow':
+                outcome = circulation.checkout_books(patron, book_ids, actor=request.user)
+            else:
+                outcome = circulation.return_books(patron, book_ids, actor=request.user)
+            titles = dict(Book.objects.filter(pk__in=book_ids).values_list('pk', 'title'))
+            results = []
+            for item, pk in items.items():
+                result = outcome.get(pk, 'not_found')
+                results.append({'item': item, 'book_id': pk, 'title': titles.get(pk), 'result': result,
+                                'label': circulation.RESULT_LABELS[result]})
+            if wants_json:
+                return JsonResponse({'patron': patron.username, 'action': form.cleaned_data['action'],
+                                     'results': results})
+            done = sum(row['result'] in ('borrowed', 'returned') for row in results)
+            messages.info(request, f'{done} of {len(results)} items processed for {patron.username}.')
+            form = BatchCirculationForm(initial={'username': patron.username, 'action': form.cleaned_data['action']})
+    
+    return render(request, 'library/circulation_desk.html', {'form': form, 'results': results})
+
+
+@staff_member_required
+def circulation_reports(request):
+    """
+    Loans per day or week, overdue rates per category and copy utilization
+    per author, all read from rollup tables; ?export=<report> streams CSV
+    """
+    form = ReportRangeForm(request.GET or None)
+    start, end, period = form.range_or_default()
+    export = request.GET.get('export')
+    if export in reports.REPORTS:
+        response = StreamingHttpResponse(
+            reports.csv_rows(export, start, end, period), content_type='text/csv',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export}-{start}-{end}.csv"'
+        return response
+    
+    context = {
+        'form': form,
+        'start': start,
+        'end': end,
+        'period': period,
+        'loans': reports.loans_by_period(start, end, period),
+        'overdue': reports.overdue_by_category(start, end),
+        'utilization': reports.author_utilization()[:REPORT_AUTHORS],
+    }
+    return render(request, 'library/circulation_reports.html', context)
+
+
 def register(request):
     """User registration view"""
     if request.user.is_authenticated:
@@ -257,7 +419,8 @@ def user_logout(request):
 @login_required
 def user_profile(request):
     """User profile view"""
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Created on first save rather than on every visit
+    profile = UserProfile.objects.filter(user=request.user).first() or UserProfile(user=request.user)
     
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
@@ -268,21 +431,20 @@ def user_profile(request):
     else:
         form = UserProfileForm(instance=profile)
     
-    borrow_count = BorrowRecord.objects.filter(user=request.user).count()
-    active_borrows = BorrowRecord.objects.filter(user=request.user, status='borrowed').count()
+    counts = user_loan_counts(request.user, profile)
     
     context = {
         'form': form,
         'profile': profile,
-        'borrow_count': borrow_count,
-        'active_borrows': active_borrows,
+        'borrow_count': counts['total'],
+        'active_borrows': counts['active'],
     }
     return render(request, 'library/user_profile.html', context)
 
 
 def author_list(request):
     """Author list view"""
-    authors = Author.objects.prefetch_related('books').all()
+    authors = Author.objects.only('id', 'name', 'nationality', 'birth_date').annotate(book_count=Count('books'))
     query = request.GET.get('q')
     
     if query:
@@ -297,11 +459,75 @@ def author_list(request):
 
 def author_detail(request, pk):
     """Author detail view"""
-    author = get_object_or_404(Author.objects.prefetch_related('books'), pk=pk)
-    books = author.books.select_related('author').prefetch_related('categories')
+    author = get_object_or_404(Author, pk=pk)
+    books = list(author.books.for_cards())
     
     context = {
         'author': author,
         'books': books,
     }
     return render(request, 'library/author_detail.html', context)
+
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def _autocomplete(request, queryset, search_field, label):
+    """Paginated JSON matches for AutocompleteSelect widgets: {results: [{id, text}], more}"""
+    term = request.GET.get('q', '').strip()
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    if term:
+        queryset = queryset.filter(**{f'{search_field}__icontains': term})
+    offset = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+    # Fetch one extra row to know whether another page exists without a COUNT
+    rows = list(queryset[offset:offset + AUTOCOMPLETE_PAGE_SIZE + 1])
+    return JsonResponse({
+        'results': [{'id': row[0], 'text': label(row)} for row in rows[:AUTOCOMPLETE_PAGE_SIZE]],
+        'more': len(rows) > AUTOCOMPLETE_PAGE_SIZE,
+    })
+
+
+@login_required
+def autocomplete_authors(request):
+    """Author matches for the BookForm author widget"""
+    return _autocomplete(
+        request, Author.objects.order_by('name', 'pk').values_list('pk', 'name'), 'name', lambda row: row[1]
+    )
+
+
+@login_required
+def autocomplete_categories(request):
+    """Category matches for the BookForm categories widget"""
+    return _autocomplete(
+        request, Category.objects.order_by('name').values_list('pk', 'name'), 'name', lambda row: row[1]
+    )
+
+
+@login_required
+def autocomplete_books(request):
+    """Book matches for the BorrowRecordForm book widget"""
+    return _autocomplete(
+        request,
+        Book.objects.order_by('title', 'pk').values_list('pk', 'title', 'author__name'),
+        'title',
+        lambda row: f"{row[1]} by {row[2]}",
+    )
+
+
+SUGGEST_LIMIT = 8
+
+
+def suggest(request):
+    """Title and author-name completions for the book search box, from the per-worker prefix index"""
+    term = request.GET.get('q', '').strip()
+    results = suggester.suggest(term, SUGGEST_LIMIT) if len(term) >= 2 else []
+    response = JsonResponse({
+        'query': term,
+        'suggestions': [{'text': text, 'kind': kind} for text, kind in results],
+    })
+    patch_cache_control(response, public=True, max_age=settings.SUGGEST_REFRESH_SECONDS)
+    return response
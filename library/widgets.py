@@ -0,0 +1,44 @@
+"""
+Form widgets for Library Management System
+"""
+from django import forms
+from django.urls import reverse
+
+
+class AutocompleteMixin:
+    """
+    Render only the selected option(s); the rest are fetched on demand from a
+    JSON autocomplete endpoint (see views.autocomplete_*), so a form render
+    never loads the whole table. Paired with templates/library/includes/autocomplete_js.html.
+    """
+    def __init__(self, url_name, attrs=None, choices=()):
+        self.url_name = url_name
+        super().__init__(attrs, choices)
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse(self.url_name)
+        attrs['class'] = f"{attrs.get('class', '')} autocomplete-select".strip()
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        selected = {str(v) for v in value if v not in ('', None)}
+        options = []
+        if not self.is_required and not self.allow_multiple_selected:
+            options.append(self.create_option(name, '', '---------', not selected, 0))
+        if selected:
+            field = self.choices.field
+            to_field = field.to_field_name or 'pk'
+            queryset = field.queryset.filter(**{f'{to_field}__in': selected})
+            for index, obj in enumerate(queryset, start=len(options)):
+                option_value = field.prepare_value(obj)
+                options.append(self.create_option(name, option_value, field.label_from_instance(obj), True, index))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass